@@ -11,7 +11,7 @@ import argparse
 import sys
 from pathlib import Path
 
-from src.entry import entry_point
+from src.entry import compile_templates, entry_point
 from src.logger import logger
 
 
@@ -69,6 +69,38 @@ def parse_args():
         run again until the template is set.",
     )
 
+    argparser.add_argument(
+        "-w",
+        "--workers",
+        default=1,
+        required=False,
+        type=int,
+        dest="workers",
+        help="Number of worker processes shared by all sub-folders \
+        (0 = one per CPU, default 1 = process in this process).",
+    )
+
+    argparser.add_argument(
+        "-s",
+        "--stream",
+        required=False,
+        dest="stream",
+        action="store_true",
+        help="Stream sheets straight from each directory listing instead of \
+        collecting and sorting them first, to keep memory flat on very large inputs.",
+    )
+
+    argparser.add_argument(
+        "-c",
+        "--compileTemplate",
+        nargs="+",
+        required=False,
+        type=str,
+        dest="compile_template_paths",
+        help="Validate the given template.json files (or directories containing one) \
+        and write compiled .omrc templates next to them, then exit.",
+    )
+
     (
         args,
         unknown,
@@ -91,6 +123,9 @@ def entry_point_for_args(args):
     else:
         # Disable tracebacks
         sys.tracebacklimit = 0
+    if args.get("compile_template_paths"):
+        compile_templates(args["compile_template_paths"])
+        return
     for root in args["input_paths"]:
         entry_point(
             Path(root),
@@ -1,14 +1,98 @@
 import numpy as np
 import pandas as pd
-from itertools import combinations
+import heapq
 import logging
 import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 
 logger = logging.getLogger(__name__)
 
+# Students per tile side; a tile holds a few block_size x block_size count matrices
+DEFAULT_BLOCK_SIZE = 1024
+
+# Pre-filter for persisted reports: a superset of what the UI flags as suspicious
+# (suspicionScore >= 2 needs gbt_z > 2 or a K-index below 0.05), capped by gbt_z
+REPORT_CRITERIA = {"min_gbt_z": 2.0, "max_k_index": 0.05, "top_k": 10000}
+
+PAIR_FIELDS = ("idx_a", "idx_b", "agreements", "w_agreements", "k_index_ab", "k_index_ba", "gbt_z")
+
+# Binomial success probabilities are discretized to this many steps when looking up
+# cached tail tables, so students with (nearly) the same wrong-answer profile share one
+BINOM_P_RESOLUTION = 10000
+
+
+@lru_cache(maxsize=None)
+def _log_factorials(n):
+    """log(i!) for i = 0..n."""
+    return np.array([math.lgamma(i + 1) for i in range(n + 1)])
+
+
+@lru_cache(maxsize=4096)
+def _binom_log_sf_table(n, p_step):
+    """
+    log P(X >= k) for k = 0..n+1, X ~ Binomial(n, p_step / BINOM_P_RESOLUTION).
+
+    Computed in log space so long tails don't underflow term by term.
+    """
+    p = p_step / BINOM_P_RESOLUTION
+    i = np.arange(n + 1)
+    log_factorials = _log_factorials(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_p = np.where(i > 0, i * np.log(p), 0.0)
+        log_q = np.where(i < n, (n - i) * np.log1p(-p), 0.0)
+    log_pmf = log_factorials[n] - log_factorials[i] - log_factorials[n - i] + log_p + log_q
+    # Tail sums from the right: log_sf[k] = logsumexp(log_pmf[k:])
+    log_sf = np.empty(n + 2)
+    log_sf[: n + 1] = np.logaddexp.accumulate(log_pmf[::-1])[::-1]
+    log_sf[0] = 0.0
+    log_sf[n + 1] = -np.inf
+    log_sf.setflags(write=False)
+    return log_sf
+
+
+def binom_sf(k, n, p):
+    """
+    Vectorized binomial survival function P(X >= k) for arrays of (k, n, p).
+
+    Tails are evaluated in log space and cached per discretized (n, p), so
+    repeated (n, p) combinations are table lookups.
+    """
+    k, n, p = np.broadcast_arrays(
+        np.asarray(k, dtype=np.int64), np.asarray(n, dtype=np.int64), np.asarray(p, dtype=np.float64)
+    )
+    p_steps = np.rint(np.clip(p, 0.0, 1.0) * BINOM_P_RESOLUTION).astype(np.int64)
+    k = np.clip(k, 0, n + 1)
+
+    result = np.empty(k.shape, dtype=np.float64)
+    flat_result = result.reshape(-1)
+    stride = BINOM_P_RESOLUTION + 1
+    keys = (n * stride + p_steps).reshape(-1)
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind="stable")
+    flat_k = k.reshape(-1)
+    for key, members in zip(unique_keys.tolist(), np.split(order, np.cumsum(counts)[:-1])):
+        n_value, p_step = divmod(key, stride)
+        flat_result[members] = np.exp(_binom_log_sf_table(n_value, p_step)[flat_k[members]])
+    return result
+
+
+# Detector shared with worker processes (set by _init_worker)
+_worker_detector = None
+
+
+def _init_worker(detector):
+    global _worker_detector
+    _worker_detector = detector
+
+
+def _score_tile_in_worker(tile, criteria):
+    return _worker_detector._score_tile(tile, criteria)
+
 
 class CheatingDetector:
-    def __init__(self, results_df, answer_key, questions_in_order):
+    def __init__(self, results_df, answer_key, questions_in_order, groups=None):
         """
         Initialize the CheatingDetector.
         
@@ -17,10 +101,19 @@ class CheatingDetector:
                                      Must contain a unique identifier column (e.g., 'File Name' or 'Student ID').
             answer_key (dict): Dictionary mapping question IDs to correct answers.
             questions_in_order (list): List of question IDs in the order they appear in the DataFrame.
+            groups (list): Optional provenance label per student (e.g. the session/room it came from).
+                           Reported as group_a/group_b and usable to keep only cross-group pairs.
         """
         self.df = results_df
         self.answer_key = answer_key
         self.questions = questions_in_order
+        self.groups = None
+        if groups is not None:
+            if len(groups) != len(results_df):
+                raise ValueError(f"Expected {len(results_df)} group labels, got {len(groups)}")
+            # Integer codes are what the tiles compare; labels are only needed for reporting
+            group_codes, self.group_labels = pd.factorize(pd.Series(list(groups), dtype=object))
+            self.groups = group_codes
         self.student_ids = self.df.index.tolist() # Assuming index is set to student identifier before passing, or we handle it here
         
         # Precompute correct/incorrect matrices
@@ -58,6 +151,11 @@ class CheatingDetector:
         
         self.option_probs = self._compute_option_probabilities()
 
+        # Question-level chance-agreement expectations are pair-independent
+        self.gbt_expected, self.gbt_var = self._compute_gbt_expectations()
+
+        self._encode_responses()
+
     def _compute_option_probabilities(self):
         """
         Compute empirical probability of each option for each question.
@@ -65,15 +163,108 @@ class CheatingDetector:
             list of dicts: [{option: prob}, ...] per question
         """
         probs = []
+        self._option_values = []
+        self._option_codes = []
         n_students = len(self.df)
         for col_idx in range(self.num_questions):
             col_data = self.response_matrix[:, col_idx]
-            # Unique options and their counts
-            unique, counts = np.unique(col_data, return_counts=True)
+            # Unique options, each student's option code and the option counts
+            unique, inverse, counts = np.unique(col_data, return_inverse=True, return_counts=True)
             prob_map = {val: count/n_students for val, count in zip(unique, counts)}
             probs.append(prob_map)
+            self._option_values.append(unique)
+            self._option_codes.append(inverse.reshape(-1))
         return probs
 
+    def _compute_gbt_expectations(self):
+        """
+        Expected number of chance matches and its variance, summed over questions.
+        P(Match_i) = sum( prob(v)^2 ) for v in options of question i.
+        """
+        expected_matches = 0.0
+        var_matches = 0.0
+        for opts in self.option_probs:
+            p_match_i = sum(p**2 for p in opts.values())
+            expected_matches += p_match_i
+            var_matches += p_match_i * (1 - p_match_i)
+        return expected_matches, var_matches
+
+    def _encode_responses(self):
+        """
+        One-hot encode the response matrix: one column per (question, option) seen.
+
+        With X (students x options), X @ X.T counts identical responses for every
+        pair at once; restricting the columns (non-empty options, wrong options)
+        gives the other agreement counts the same way.
+        """
+        n_students = len(self.df)
+        n_columns = sum(len(values) for values in self._option_values)
+        one_hot = np.zeros((n_students, n_columns), dtype=np.float32)
+        column_empty = np.zeros(n_columns, dtype=bool)
+        column_wrong = np.zeros(n_columns, dtype=bool)
+        column_prob = np.zeros(n_columns, dtype=np.float64)
+
+        rows = np.arange(n_students)
+        offset = 0
+        for q_idx, (values, codes) in enumerate(zip(self._option_values, self._option_codes)):
+            one_hot[rows, offset + codes] = 1.0
+            span = slice(offset, offset + len(values))
+            column_empty[span] = [str(v).strip() in self.empty_values for v in values]
+            column_wrong[span] = np.asarray(values, dtype=object) != self.key_vector[q_idx]
+            column_prob[span] = [self.option_probs[q_idx][v] for v in values]
+            offset += len(values)
+
+        self.one_hot = one_hot
+        self.column_empty = column_empty
+        self.column_wrong = column_wrong
+
+        # Option-column subsets whose products give each agreement count
+        answered = ~column_empty
+        self._one_hot_all = one_hot
+        self._one_hot_answered = one_hot[:, answered]
+        self._one_hot_wrong = one_hot[:, column_wrong]
+        self._one_hot_answered_wrong = one_hot[:, answered & column_wrong]
+
+        # Per-student wrong answer counts and the summed chance of each wrong option,
+        # used by the K-index of anyone copying from that student
+        one_hot_f64 = one_hot.astype(np.float64)
+        self.wrong_counts = np.rint(one_hot_f64 @ column_wrong).astype(np.int64)
+        self.wrong_prob_sums = one_hot_f64 @ np.where(column_wrong, column_prob, 0.0)
+        self._k_index_table = self._build_k_index_table()
+
+    def _build_k_index_table(self):
+        """
+        K-index p-value for every (source student, observed matches k) pair.
+
+        Row s is P(X >= k) with X ~ Binomial(wrong_counts[s], average chance of
+        s's wrong options), so a pair's K-index is a single lookup.
+        """
+        n_students = len(self.wrong_counts)
+        table = np.ones((n_students, self.num_questions + 1), dtype=np.float64)
+        has_wrongs = self.wrong_counts > 0
+        if not has_wrongs.any():
+            return table
+
+        sources = np.nonzero(has_wrongs)[0]
+        n = self.wrong_counts[sources]
+        avg_p = self.wrong_prob_sums[sources] / n
+        k = np.arange(1, self.num_questions + 1)
+        # Cannot copy wrongs if source has no wrongs; k = 0 matches is 1.0 as well
+        table[sources, 1:] = binom_sf(k[None, :], n[:, None], avg_p[:, None])
+        return table
+
+    def __getstate__(self):
+        # Worker processes only need the encoded arrays, not the source frame
+        state = self.__dict__.copy()
+        state["df"] = None
+        state["response_matrix"] = None
+        return state
+
+    @staticmethod
+    def _block_counts(one_hot, rows, cols):
+        """Number of identical responses over the given option columns, rows x cols."""
+        return np.rint(one_hot[rows] @ one_hot[cols].T).astype(np.int32)
+
     def _binom_sf(self, k, n, p):
         """
         Binomial survival function (P(X >= k)).
@@ -81,16 +272,7 @@ class CheatingDetector:
         """
         if k > n:
             return 0.0
-        
-        # for small n, exact sum
-        prob_sum = 0.0
-        # P(X >= k) = sum_{i=k}^n (n choose i) * p^i * (1-p)^(n-i)
-        for i in range(k, n + 1):
-            comb = math.comb(n, i)
-            # Use log exp for stability if needed, but standard pow is fine for n<200
-            term = comb * (p**i) * ((1-p)**(n-i))
-            prob_sum += term
-        return prob_sum
+        return float(binom_sf(k, n, p))
 
     def _z_score_to_prob(self, z):
         """
@@ -99,87 +281,205 @@ class CheatingDetector:
         # Using approximation for error function
         return 0.5 * math.erfc(z / math.sqrt(2))
         
-    def analyze(self):
+    def analyze(
+        self,
+        min_shared_errors=0,
+        min_gbt_z=None,
+        max_k_index=None,
+        top_k=None,
+        rank_by="gbt_z",
+        block_size=DEFAULT_BLOCK_SIZE,
+        workers=None,
+        cross_group_only=False,
+    ):
         """
         Perform all cheating detection analyses on all pairs of students.
-        
+
+        Pairs are scored tile by tile over blocks of students, and only the pairs
+        passing the filters are kept, so peak memory depends on block_size and
+        top_k rather than on the number of pairs.
+
+        Args:
+            min_shared_errors (int): Keep pairs with at least this many identical wrong answers.
+            min_gbt_z (float): Keep pairs with gbt_z above this value.
+            max_k_index (float): Keep pairs with either K-index below this value.
+                When both min_gbt_z and max_k_index are given, passing either one is enough.
+            top_k (int): Keep only the top_k surviving pairs, ranked by `rank_by`.
+            rank_by (str): "gbt_z" (highest first) or "k_index" (lowest K-index first).
+            block_size (int): Students per tile side.
+            workers (int): Spread tiles over this many processes (None/1 = in-process).
+            cross_group_only (bool): With groups, skip pairs from the same group.
+
         Returns:
             list: List of dictionaries, each containing stats for a pair of students.
+                Pairs come in (student_a, student_b) order, or ranked when top_k is set.
         """
-        results = []
-        pairs = list(combinations(range(len(self.df)), 2))
-        
-        for idx_a, idx_b in pairs:
-            # Basic info
-            student_a = self.df.iloc[idx_a]
-            student_b = self.df.iloc[idx_b]
-            id_a = student_a.name # Assuming index is set
-            id_b = student_b.name
-            
-            # Responses
-            resp_a = self.response_matrix[idx_a]
-            resp_b = self.response_matrix[idx_b]
-            
-            # Common Logic
-            # Identical responses (excluding empty answers)
-            # Empty values shouldn't count as agreements
-            empty_values = {'', '-', '*', ' '}
-            not_empty_a = np.array([str(v).strip() not in empty_values for v in resp_a])
-            not_empty_b = np.array([str(v).strip() not in empty_values for v in resp_b])
-            both_answered = not_empty_a & not_empty_b
-            
-            agreements = (resp_a == resp_b) & both_answered
-            num_agreements = np.sum(agreements)
-            
-            # Identical WRONG responses
-            # Both wrong AND equal (which implies equal to each other)
-            # Mask of items where A is wrong
-            wrong_mask_a = (resp_a != self.key_vector)
-            # Mask of items where B is wrong 
-            wrong_mask_b = (resp_b != self.key_vector)
-            
-            # Shared wrongs
-            w_agreements = agreements & wrong_mask_a # Since if equal, both are wrong
-            num_w_agreements = np.sum(w_agreements)
-            
-            # Number of wrongs for each
-            num_wrong_a = np.sum(wrong_mask_a)
-            num_wrong_b = np.sum(wrong_mask_b)
-            
-            pair_stats = {
-                "student_a": str(id_a),
-                "student_b": str(id_b),
-                "agreements": int(num_agreements),
-                "w_agreements": int(num_w_agreements),
-                "score_a": int(self.student_scores[idx_a]),
-                "score_b": int(self.student_scores[idx_b]),
-                "wrongs_a": int(num_wrong_a),
-                "wrongs_b": int(num_wrong_b)
-            }
-            
-            # --- Advanced Indices ---
-            
-            # K-Index (Directional)
-            # K_AB: A copies B (Reference: B's wrongs)
-            k_ab_p = self._compute_k_index(resp_a, resp_b, wrong_mask_b)
-            # K_BA: B copies A (Reference: A's wrongs)
-            k_ba_p = self._compute_k_index(resp_b, resp_a, wrong_mask_a)
-            
-            pair_stats["k_index_ab"] = k_ab_p
-            pair_stats["k_index_ba"] = k_ba_p
-            
-            # S2 / GBT (Symmetric or Directional - here Symmetric Match Probability)
-            # We calculate the probability of the OBSERVED match pattern occurring by chance
-            pair_stats["gbt_z"] = self._compute_gbt_z(resp_a, resp_b)
-            
-            # Wesolowsky (Robust)
-            # Simple implementation: weighted matches
-            pair_stats["wesolowsky"] = self._compute_wesolowsky(resp_a, resp_b)
+        if rank_by not in ("gbt_z", "k_index"):
+            raise ValueError(f"Unknown rank_by '{rank_by}', expected 'gbt_z' or 'k_index'")
 
-            results.append(pair_stats)
-            
+        n_students = len(self.df)
+        self.pairs_checked = n_students * (n_students - 1) // 2
+        if cross_group_only and self.groups is not None:
+            group_sizes = np.bincount(self.groups).astype(np.int64)
+            self.pairs_checked -= int((group_sizes * (group_sizes - 1) // 2).sum())
+        criteria = {
+            "min_shared_errors": min_shared_errors,
+            "min_gbt_z": min_gbt_z,
+            "max_k_index": max_k_index,
+            "top_k": top_k,
+            "rank_by": rank_by,
+            "cross_group_only": bool(cross_group_only and self.groups is not None),
+        }
+        if top_k is not None and top_k <= 0:
+            return []
+
+        block_size = max(1, int(block_size))
+        tiles = [
+            (row_start, min(row_start + block_size, n_students), col_start, min(col_start + block_size, n_students))
+            for row_start in range(0, n_students, block_size)
+            for col_start in range(row_start, n_students, block_size)
+        ]
+
+        if workers and workers > 1 and len(tiles) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(self,)
+            ) as executor:
+                batches = executor.map(_score_tile_in_worker, tiles, repeat(criteria))
+                kept = self._merge_batches(batches, top_k, rank_by)
+        else:
+            batches = (self._score_tile(tile, criteria) for tile in tiles)
+            kept = self._merge_batches(batches, top_k, rank_by)
+
+        return self._pairs_to_dicts(kept)
+
+    def _score_tile(self, tile, criteria):
+        """
+        Compute pair statistics for one tile of students and apply the filters.
+
+        Returns:
+            dict: Arrays keyed by PAIR_FIELDS for the pairs that survived.
+        """
+        row_start, row_end, col_start, col_end = tile
+        rows = slice(row_start, row_end)
+        cols = slice(col_start, col_end)
+
+        # Identical WRONG responses (equal and wrong for one implies wrong for both)
+        w_agreements = self._block_counts(self._one_hot_answered_wrong, rows, cols)
+        keep = w_agreements >= criteria["min_shared_errors"]
+        if row_start == col_start:
+            # Diagonal tile: each pair once, no self-pairs
+            keep &= np.triu(np.ones(keep.shape, dtype=bool), k=1)
+        if criteria["cross_group_only"]:
+            keep &= self.groups[rows, None] != self.groups[None, cols]
+        local_a, local_b = np.nonzero(keep)
+        idx_a = local_a + row_start
+        idx_b = local_b + col_start
+        w_agreements = w_agreements[local_a, local_b]
+
+        # All identical responses: the GBT observation
+        gbt_z = self._compute_gbt_z_all(self._block_counts(self._one_hot_all, rows, cols)[local_a, local_b])
+        # Matches on wrong items, empties included: the K-index observation
+        k_observed = self._block_counts(self._one_hot_wrong, rows, cols)[local_a, local_b]
+        # K_AB: A copies B (Reference: B's wrongs); K_BA: B copies A (Reference: A's wrongs)
+        k_index_ab = self._compute_k_index_all(k_observed, idx_b)
+        k_index_ba = self._compute_k_index_all(k_observed, idx_a)
+
+        if criteria["min_gbt_z"] is not None or criteria["max_k_index"] is not None:
+            passed = np.zeros(len(idx_a), dtype=bool)
+            if criteria["min_gbt_z"] is not None:
+                passed |= gbt_z > criteria["min_gbt_z"]
+            if criteria["max_k_index"] is not None:
+                passed |= np.minimum(k_index_ab, k_index_ba) < criteria["max_k_index"]
+        else:
+            passed = slice(None)
+
+        # Identical responses (excluding empty answers)
+        agreements = self._block_counts(self._one_hot_answered, rows, cols)[local_a, local_b]
+        batch = dict(zip(PAIR_FIELDS, (idx_a, idx_b, agreements, w_agreements, k_index_ab, k_index_ba, gbt_z)))
+        batch = {field: values[passed] for field, values in batch.items()}
+
+        top_k = criteria["top_k"]
+        if top_k is not None and len(batch["idx_a"]) > top_k:
+            # No tile needs to hand over more than the global top_k
+            best = np.argpartition(-self._rank_values(batch, criteria["rank_by"]), top_k - 1)[:top_k]
+            batch = {field: values[best] for field, values in batch.items()}
+        return batch
+
+    @staticmethod
+    def _rank_values(batch, rank_by):
+        """Higher is more suspicious."""
+        if rank_by == "gbt_z":
+            return batch["gbt_z"]
+        return -np.minimum(batch["k_index_ab"], batch["k_index_ba"])
+
+    def _merge_batches(self, batches, top_k, rank_by):
+        """Combine tile results into rows of PAIR_FIELDS values, keeping a top_k heap if requested."""
+        if top_k is None:
+            kept = [
+                row
+                for batch in batches
+                for row in zip(*(batch[field].tolist() for field in PAIR_FIELDS))
+            ]
+            kept.sort(key=lambda row: (row[0], row[1]))
+            return kept
+
+        heap = []
+        for batch in batches:
+            ranks = self._rank_values(batch, rank_by).tolist()
+            rows = zip(*(batch[field].tolist() for field in PAIR_FIELDS))
+            for rank, row in zip(ranks, rows):
+                # Ties go to the earlier pair
+                entry = (rank, -row[0], -row[1], row)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        return [entry[-1] for entry in sorted(heap, reverse=True)]
+
+    def _pairs_to_dicts(self, kept):
+        ids = [str(student_id) for student_id in self.df.index]
+        scores = self.student_scores.tolist()
+        wrongs = self.wrong_counts.tolist()
+
+        results = []
+        for a, b, agree, w_agree, k_ab, k_ba, z in kept:
+            results.append({
+                "student_a": ids[a],
+                "student_b": ids[b],
+                "agreements": agree,
+                "w_agreements": w_agree,
+                "score_a": int(scores[a]),
+                "score_b": int(scores[b]),
+                "wrongs_a": wrongs[a],
+                "wrongs_b": wrongs[b],
+                "k_index_ab": k_ab,
+                "k_index_ba": k_ba,
+                # S2 / GBT: symmetric match probability of the observed pattern
+                "gbt_z": z,
+                # Wesolowsky (Robust) - see _compute_wesolowsky
+                "wesolowsky": z,
+            })
+            if self.groups is not None:
+                results[-1]["group_a"] = self.group_labels[self.groups[a]]
+                results[-1]["group_b"] = self.group_labels[self.groups[b]]
         return results
 
+    def _compute_k_index_all(self, k_observed, source_idx):
+        """
+        Vectorized K-index p-values for many pairs at once.
+
+        Args:
+            k_observed (np.ndarray): Matches on the source's wrong items, per pair.
+            source_idx (np.ndarray): Index of the source (copied-from) student, per pair.
+        """
+        return self._k_index_table[source_idx, k_observed]
+
+    def _compute_gbt_z_all(self, observed_matches):
+        """Vectorized GBT Z-scores from the observed total matches per pair."""
+        if self.gbt_var == 0:
+            return np.zeros(len(observed_matches), dtype=np.float64)
+        return (observed_matches - self.gbt_expected) / math.sqrt(self.gbt_var)
+
     def _compute_k_index(self, copier_resp, source_resp, source_wrong_mask):
         """
         Calculate K-index probability (p-value) that Copier matched Source's wrong answers by chance.
@@ -202,14 +502,9 @@ class CheatingDetector:
             
         # Calculate functional average probability of matching
         # For each item in wrong_indices, what is prob of Random Student picking Source's answer?
-        probs = []
-        for i in wrong_indices:
-            source_ans = source_resp[i]
-            # Empirical prob of choosing 'source_ans' for question 'i'
-            p = self.option_probs[i].get(source_ans, 0.0)
-            probs.append(p)
-            
-        avg_p = sum(probs) / n if n > 0 else 0
+        # (empirical prob of choosing 'source_ans' for question 'i')
+        probs = [self.option_probs[i].get(source_resp[i], 0.0) for i in wrong_indices]
+        avg_p = sum(probs) / n
         
         # Binomial survival function
         return self._binom_sf(k_obs, n, avg_p)
@@ -219,27 +514,11 @@ class CheatingDetector:
         Generalized Binomial Test Z-score.
         Measures if total agreement is higher than expected.
         """
-        expected_matches = 0.0
-        var_matches = 0.0
-        
         observed_matches = np.sum(resp_a == resp_b)
-        
-        for i in range(self.num_questions):
-            # Prob of match by chance on question i
-            # Sum (P(A=v) * P(B=v)) for all v?
-            # Assuming independence and identical distribution (simplification matches empirical)
-            # P(Match_i) = sum( prob(v)^2 ) for v in options
-            
-            opts = self.option_probs[i]
-            p_match_i = sum(p**2 for p in opts.values())
-            
-            expected_matches += p_match_i
-            var_matches += p_match_i * (1 - p_match_i)
-            
-        if var_matches == 0:
+        if self.gbt_var == 0:
             return 0.0
-            
-        z = (observed_matches - expected_matches) / math.sqrt(var_matches)
+
+        z = (observed_matches - self.gbt_expected) / math.sqrt(self.gbt_var)
         return z
 
     def _compute_wesolowsky(self, resp_a, resp_b):
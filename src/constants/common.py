@@ -13,6 +13,17 @@ TEMPLATE_FILENAME = "template.json"
 EVALUATION_FILENAME = "evaluation.json"
 CONFIG_FILENAME = "config.json"
 
+# Input sheet extensions (matched case-insensitively)
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"})
+
+# Compiled template artifact written next to template.json
+COMPILED_TEMPLATE_SUFFIX = ".omrc"
+# Bump when the layout of compiled templates changes
+COMPILED_TEMPLATE_VERSION = 1
+
+# Sheets scored together in one vectorized evaluation call
+EVALUATION_BATCH_SIZE = 256
+
 FIELD_LABEL_NUMBER_REGEX = r"([^\d]+)(\d*)"
 #
 ERROR_CODES = DotMap(
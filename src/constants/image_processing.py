@@ -28,6 +28,11 @@ CANNY_PARAMS = {
     "upper_threshold": 55,
 }
 APPROX_POLY_EPSILON_FACTOR = 0.025
+# Longer side of the proxy the page boundary is searched on (detectionMaxDimension);
+# 0 searches the full resolution image
+DEFAULT_PAGE_DETECTION_MAX_DIMENSION = 0
+# Corners found on the proxy are refined within this many full-resolution pixels
+CORNER_REFINE_MIN_WINDOW = 5
 
 # CropOnMarkers constants
 QUADRANT_DIVISION = {"height_factor": 3, "width_factor": 2}
@@ -39,7 +44,28 @@ EROSION_PARAMS = {"kernel_size": (5, 5), "iterations": 5}
 # FeatureBasedAlignment constants
 DEFAULT_MAX_FEATURES = 500
 DEFAULT_GOOD_MATCH_PERCENT = 0.15
+DEFAULT_RATIO_TEST = 0.75
+# FLANN parameters for binary (ORB) descriptors: algorithm 6 is FLANN_INDEX_LSH
+FLANN_LSH_INDEX_PARAMS = {
+    "algorithm": 6,
+    "table_number": 6,
+    "key_size": 12,
+    "multi_probe_level": 1,
+}
+FLANN_LSH_SEARCH_PARAMS = {"checks": 50}
+# Reference keypoints/descriptors are cached next to the reference image
+FEATURE_CACHE_SUFFIX = ".orb-cache.npz"
+FEATURE_CACHE_VERSION = 1
 
 # Builtin processor constants
 DEFAULT_MEDIAN_BLUR_KERNEL_SIZE = 5
 DEFAULT_GAUSSIAN_BLUR_PARAMS = {"kernel_size": (3, 3), "sigma_x": 0}
+
+# Debug image stacks (outputs.save_image_level)
+# Memory cap for the intermediate images kept for one sheet
+DEBUG_BUFFER_MAX_BYTES = 64 * 1024 * 1024
+
+# Auto alignment
+# Pixels around each field block's search area that its morphology also covers:
+# the vertical open (3 x 10px) and erode (2 x 5px) reach ~34px into their input
+ALIGNMENT_MORPH_MARGIN = 40
@@ -1,9 +1,6 @@
 import os
-from collections import defaultdict
-from typing import Any
 
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 
 from src.constants.common import (
@@ -14,44 +11,215 @@ from src.constants.common import (
     GLOBAL_PAGE_THRESHOLD_WHITE,
     TEXT_SIZE,
 )
+from src.constants.image_processing import ALIGNMENT_MORPH_MARGIN
 from src.logger import logger
-from src.utils.image import CLAHE_HELPER, ImageUtils
+from src.utils.containers import read_sheet
+from src.utils.debug_buffer import DebugImageBuffer
+from src.utils.image import CLAHE_HELPER, ImageUtils, get_pyplot
+from src.utils.image_writer import ImageWriter, get_write_params
 from src.utils.interaction import InteractionUtils
+from src.utils.stage_cache import StageCache
 
 
 class ImageInstanceOps:
     """Class to hold fine-tuned utilities for a group of images. One instance for each processing directory."""
 
-    save_img_list: Any = defaultdict(list)
-
     def __init__(self, tuning_config):
         super().__init__()
         self.tuning_config = tuning_config
         self.save_image_level = tuning_config.outputs.save_image_level
+        # Stacks are drawn from thumbnails at processing resolution
+        self.debug_images = DebugImageBuffer(
+            self.save_image_level, tuning_config.dimensions.processing_height
+        )
+        stage_cache_dir = tuning_config.preprocessing.stage_cache_dir
+        self.stage_cache = StageCache(stage_cache_dir) if stage_cache_dir else None
+        self.batch_size = self.get_batch_size()
+        self.image_writer = ImageWriter(tuning_config.outputs.image_writer_threads)
+
+    def get_batch_size(self):
+        """Number of sheets to preprocess together (1 when batching is not possible)"""
+        config = self.tuning_config
+        if (
+            self.stage_cache is not None
+            or config.preprocessing.single_resample
+            # Debug images are collected per sheet
+            or config.outputs.show_image_level > 0
+            or self.save_image_level > 0
+        ):
+            return 1
+        return max(1, int(config.preprocessing.batch_size))
+
+    def apply_preprocessors_batch(self, file_paths, images, template):
+        """apply_preprocessors for a chunk of sheets, one apply_filter_batch call per
+        preprocessor. Returns a list aligned with `images`, None for failed sheets."""
+        if len(images) == 1 or self.batch_size == 1:
+            return [
+                self.apply_preprocessors(file_path, image, template)
+                for file_path, image in zip(file_paths, images)
+            ]
+
+        dimensions = self.tuning_config.dimensions
+        results = [
+            ImageUtils.resize_util(
+                image, dimensions.processing_width, dimensions.processing_height
+            )
+            for image in images
+        ]
+        for pre_processor in template.pre_processors:
+            # Sheets that failed an earlier preprocessor are not passed on
+            alive = [index for index, image in enumerate(results) if image is not None]
+            if not alive:
+                break
+            outputs = pre_processor.apply_filter_batch(
+                [results[index] for index in alive],
+                [file_paths[index] for index in alive],
+            )
+            for index, output in zip(alive, outputs):
+                results[index] = output
+        return results
 
     def apply_preprocessors(self, file_path, in_omr, template):
+        """Run the template's preprocessors; `in_omr` may be None to read `file_path` lazily"""
+        if self.stage_cache is not None:
+            return self.apply_preprocessors_cached(file_path, in_omr, template)
+        if in_omr is None:
+            in_omr = read_sheet(file_path)
+        return self.run_preprocessors(file_path, in_omr, template)
+
+    def run_preprocessors(self, file_path, in_omr, template, start=0, on_stage=None):
         tuning_config = self.tuning_config
-        # resize to conform to template
-        in_omr = ImageUtils.resize_util(
-            in_omr,
-            tuning_config.dimensions.processing_width,
-            tuning_config.dimensions.processing_height,
-        )
+        if tuning_config.preprocessing.single_resample:
+            return self.apply_preprocessors_single_resample(file_path, in_omr, template)
+
+        if start == 0:
+            # resize to conform to template
+            in_omr = ImageUtils.resize_util(
+                in_omr,
+                tuning_config.dimensions.processing_width,
+                tuning_config.dimensions.processing_height,
+            )
 
         # run pre_processors in sequence
-        for pre_processor in template.pre_processors:
-            in_omr = pre_processor.apply_filter(in_omr, file_path)
+        pre_processors = template.pre_processors
+        for index in range(start, len(pre_processors)):
+            in_omr = pre_processors[index].apply_filter(in_omr, file_path)
+            if in_omr is None:
+                return None
+            if on_stage is not None:
+                on_stage(index, in_omr)
         return in_omr
 
-    def read_omr_response(self, template, image, name, save_dir=None):
+    def apply_preprocessors_cached(self, file_path, in_omr, template):
+        """Resume the preprocessors after the longest prefix found in the stage cache.
+
+        Results are stored after each geometric stage (crop/alignment) and after
+        the last stage, so changing a downstream option reruns only that stage
+        and the ones after it. With single_resample only the final image is cached.
+        """
+        pre_processors = template.pre_processors
+        if not pre_processors:
+            if in_omr is None:
+                in_omr = read_sheet(file_path)
+            return self.run_preprocessors(file_path, in_omr, template)
+
+        stage_cache = self.stage_cache
+        single_resample = self.tuning_config.preprocessing.single_resample
+        keys = stage_cache.stage_keys(
+            file_path,
+            self.tuning_config,
+            pre_processors,
+            extra=[single_resample, template.page_dimensions if single_resample else None],
+        )
+        last = len(pre_processors) - 1
+        if single_resample:
+            # Intermediate images are not in template space, only the result is reusable
+            keys = keys[last:]
+        done, image = stage_cache.longest_prefix(keys)
+        if done == len(keys):
+            return image
+        if in_omr is None and done == 0:
+            in_omr = read_sheet(file_path)
+
+        if single_resample:
+            image = self.run_preprocessors(file_path, in_omr, template)
+            if image is not None:
+                stage_cache.store(keys[0], image)
+            return image
+
+        def on_stage(index, stage_image):
+            if index == last or pre_processors[index].applies_geometry:
+                stage_cache.store(keys[index], stage_image)
+
+        if done:
+            logger.debug(f"Stage cache: resuming '{file_path}' after stage {done}")
+            return self.run_preprocessors(
+                file_path, image, template, start=done, on_stage=on_stage
+            )
+        return self.run_preprocessors(file_path, in_omr, template, on_stage=on_stage)
+
+    def apply_preprocessors_single_resample(self, file_path, in_omr, template):
+        """Run the preprocessors on a working copy, but resample the input only once.
+
+        Geometric preprocessors return transforms which are composed with the
+        resize to processing size and the resize to page_dimensions, then applied
+        to the input image in a single warp. Pixel filters are replayed, in order,
+        on the warped image.
+        """
+        dimensions = self.tuning_config.dimensions
+        size = (int(dimensions.processing_width), int(dimensions.processing_height))
+        transform = ImageUtils.scale_matrix((in_omr.shape[1], in_omr.shape[0]), size)
+        working = cv2.resize(in_omr, size)
+
+        pixel_filters = []
+        pre_processors = template.pre_processors
+        for index, pre_processor in enumerate(pre_processors):
+            if not pre_processor.applies_geometry:
+                working = pre_processor.apply_filter(working, file_path)
+                pixel_filters.append(pre_processor)
+                continue
+
+            step = pre_processor.get_transform(working, file_path)
+            if step is None:
+                return None
+            matrix, size = step
+            transform = matrix @ transform
+            # The working copy only feeds the detection in later preprocessors
+            if index < len(pre_processors) - 1:
+                working = cv2.warpPerspective(working, matrix, size)
+
+        page_size = tuple(int(x) for x in template.page_dimensions)
+        transform = ImageUtils.scale_matrix(size, page_size) @ transform
+        image = cv2.warpPerspective(in_omr, transform, page_size)
+        for pre_processor in pixel_filters:
+            image = pre_processor.apply_filter(image, file_path)
+        return image
+
+    def read_omr_response(
+        self,
+        template,
+        image,
+        name,
+        save_dir=None,
+        auto_align=None,
+        min_confidence=None,
+    ):
+        """Reads the bubbles of a preprocessed sheet. Returns (omr_response,
+        final_marked, multi_marked, multi_roll, field_confidences), where a field's
+        confidence is the gap between its threshold and the nearest bubble value.
+
+        Outputs are not saved when the sheet's confidence is below `min_confidence`:
+        the caller is expected to read it again with heavier preprocessing."""
         config = self.tuning_config
-        auto_align = config.alignment_params.auto_align
+        if auto_align is None:
+            auto_align = config.alignment_params.auto_align
         try:
             img = image.copy()
             # origDim = img.shape[:2]
-            img = ImageUtils.resize_util(
-                img, template.page_dimensions[0], template.page_dimensions[1]
-            )
+            page_width, page_height = template.page_dimensions
+            # Already in template space with preprocessing.single_resample
+            if img.shape[:2] != (page_height, page_width):
+                img = ImageUtils.resize_util(img, page_width, page_height)
             if img.max() > img.min():
                 img = ImageUtils.normalize_util(img)
             # Processing copies
@@ -61,21 +229,6 @@ class ImageInstanceOps:
             morph = img.copy()
             self.append_save_img(3, morph)
 
-            if auto_align:
-                # Note: clahe is good for morphology, bad for thresholding
-                morph = CLAHE_HELPER.apply(morph)
-                self.append_save_img(3, morph)
-                # Remove shadows further, make columns/boxes darker (less gamma)
-                morph = ImageUtils.adjust_gamma(
-                    morph, config.threshold_params.GAMMA_LOW
-                )
-                # TODO: all numbers should come from either constants or config
-                _, morph = cv2.threshold(morph, 220, 220, cv2.THRESH_TRUNC)
-                morph = ImageUtils.normalize_util(morph)
-                self.append_save_img(3, morph)
-                if config.outputs.show_image_level >= 4:
-                    InteractionUtils.show("morph1", morph, 0, 1, config)
-
             # Move them to data class if needed
             # Overlay Transparencies
             alpha = 0.65
@@ -93,58 +246,41 @@ class ImageInstanceOps:
 
             # Find Shifts for the field_blocks --> Before calculating threshold!
             if auto_align:
-                # print("Begin Alignment")
-                # Open : erode then dilate
-                v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 10))
-                morph_v = cv2.morphologyEx(
-                    morph, cv2.MORPH_OPEN, v_kernel, iterations=3
+                match_col, max_steps, align_stride, thk = map(
+                    config.alignment_params.get,
+                    [
+                        "match_col",
+                        "max_steps",
+                        "stride",
+                        "thickness",
+                    ],
                 )
-                _, morph_v = cv2.threshold(morph_v, 200, 200, cv2.THRESH_TRUNC)
-                morph_v = 255 - ImageUtils.normalize_util(morph_v)
-
-                if config.outputs.show_image_level >= 3:
-                    InteractionUtils.show(
-                        "morphed_vertical", morph_v, 0, 1, config=config
-                    )
-
-                # InteractionUtils.show("morph1",morph,0,1,config=config)
-                # InteractionUtils.show("morphed_vertical",morph_v,0,1,config=config)
-
-                self.append_save_img(3, morph_v)
-
-                morph_thr = 60  # for Mobile images, 40 for scanned Images
-                _, morph_v = cv2.threshold(morph_v, morph_thr, 255, cv2.THRESH_BINARY)
-                # kernel best tuned to 5x5 now
-                morph_v = cv2.erode(morph_v, np.ones((5, 5), np.uint8), iterations=2)
-
-                self.append_save_img(3, morph_v)
-                # h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (10, 2))
-                # morph_h = cv2.morphologyEx(morph, cv2.MORPH_OPEN, h_kernel, iterations=3)
-                # ret, morph_h = cv2.threshold(morph_h,200,200,cv2.THRESH_TRUNC)
-                # morph_h = 255 - normalize_util(morph_h)
-                # InteractionUtils.show("morph_h",morph_h,0,1,config=config)
-                # _, morph_h = cv2.threshold(morph_h,morph_thr,255,cv2.THRESH_BINARY)
-                # morph_h = cv2.erode(morph_h,  np.ones((5,5),np.uint8), iterations = 2)
-                if config.outputs.show_image_level >= 3:
-                    InteractionUtils.show(
-                        "morph_thr_eroded", morph_v, 0, 1, config=config
-                    )
-
-                self.append_save_img(6, morph_v)
+                # CLAHE and the normalisation ranges are the whole page's, the rest
+                # is only done on the area each field block can slide over, giving
+                # the whole page's result there. Debug views show these areas
+                is_debug = (
+                    config.outputs.show_image_level >= 3 or self.save_image_level >= 3
+                )
+                # Note: clahe is good for morphology, bad for thresholding
+                clahe = CLAHE_HELPER.apply(morph)
+                value_ranges = self.get_alignment_value_ranges(clahe)
+                morph_v = np.zeros_like(morph)
+                debug_stages = None
 
                 # template relative alignment code
                 for field_block in template.field_blocks:
                     s, d = field_block.origin, field_block.dimensions
-
-                    match_col, max_steps, align_stride, thk = map(
-                        config.alignment_params.get,
-                        [
-                            "match_col",
-                            "max_steps",
-                            "stride",
-                            "thickness",
-                        ],
+                    y0, y1, x0, x1 = self.get_alignment_roi(
+                        field_block, morph.shape, max_steps * align_stride + thk
                     )
+                    stages = self.get_alignment_morph(clahe[y0:y1, x0:x1], value_ranges)
+                    morph_v[y0:y1, x0:x1] = stages[-1]
+                    if is_debug:
+                        if debug_stages is None:
+                            debug_stages = [np.zeros_like(morph) for _ in stages]
+                        for debug_stage, stage in zip(debug_stages, stages):
+                            debug_stage[y0:y1, x0:x1] = stage
+
                     shift, steps = 0, 0
                     while steps < max_steps:
                         left_mean = np.mean(
@@ -196,6 +332,14 @@ class ImageInstanceOps:
                     #   "origin:", field_block.origin,'\n')
                 # print("End Alignment")
 
+                if debug_stages is not None:
+                    self.show_alignment_morph(*debug_stages)
+            else:
+                # Shifts found for an earlier sheet must not move this one's bubbles
+                # (escalation tiers share the field blocks)
+                for field_block in template.field_blocks:
+                    field_block.shift = 0
+
             final_align = None
             if config.outputs.show_image_level >= 2:
                 initial_align = self.draw_template_layout(img, template, shifted=False)
@@ -264,6 +408,9 @@ class ImageInstanceOps:
             #     appendSaveImg(2,hist)
 
             per_omr_threshold_avg, total_q_strip_no = 0, 0
+            # Strips whose threshold had no clear jump to rely on
+            low_confidence_strips = 0
+            field_confidences = {}
             for field_block in template.field_blocks:
                 block_q_strip_no = 1
                 box_w, box_h = field_block.bubble_dimensions
@@ -278,7 +425,7 @@ class ImageInstanceOps:
                     # print(total_q_strip_no, field_block_bubbles[0].field_label,
                     #   all_q_std_vals[total_q_strip_no], "no_outliers:", no_outliers)
                     q_strip_vals = all_q_strip_arrs[total_q_strip_no]
-                    per_q_strip_threshold = self.get_local_threshold(
+                    per_q_strip_threshold, is_confident = self.get_local_threshold(
                         q_strip_vals,
                         global_thr,
                         no_outliers,
@@ -288,6 +435,15 @@ class ImageInstanceOps:
                     # print(field_block_bubbles[0].field_label,key,block_q_strip_no, "THR: ",
                     #   round(per_q_strip_threshold,2))
                     per_omr_threshold_avg += per_q_strip_threshold
+                    low_confidence_strips += not is_confident
+                    strip_confidence = float(
+                        np.min(np.abs(np.asarray(q_strip_vals) - per_q_strip_threshold))
+                    )
+                    strip_label = field_block_bubbles[0].field_label
+                    field_confidences[strip_label] = min(
+                        strip_confidence,
+                        field_confidences.get(strip_label, strip_confidence),
+                    )
 
                     # Note: Little debugging visualization - view the particular Qstrip
                     # if(
@@ -412,6 +568,7 @@ class ImageInstanceOps:
             # Box types
             if config.outputs.show_image_level >= 6:
                 # plt.draw()
+                plt = get_pyplot()
                 f, axes = plt.subplots(len(all_c_box_vals), sharey=True)
                 f.canvas.manager.set_window_title(name)
                 ctr = 0
@@ -443,11 +600,22 @@ class ImageInstanceOps:
                     "Template Alignment Adjustment", final_align, 0, 0, config=config
                 )
 
-            if config.outputs.save_detections and save_dir is not None:
+            if (
+                min_confidence is not None
+                and self.get_sheet_confidence(field_confidences) < min_confidence
+            ):
+                # Read again by a heavier tier, which saves the outputs
+                save_dir = None
+
+            is_flagged = multi_marked or low_confidence_strips > 0
+            if (
+                config.outputs.save_detections
+                and save_dir is not None
+                and (config.outputs.save_detections_for == "all" or is_flagged)
+            ):
                 if multi_roll:
                     save_dir = save_dir.joinpath("_MULTI_")
-                image_path = str(save_dir.joinpath(name))
-                ImageUtils.save_img(image_path, final_marked)
+                self.save_image(save_dir.joinpath(name), final_marked)
 
             self.append_save_img(2, final_marked)
 
@@ -455,11 +623,100 @@ class ImageInstanceOps:
                 for i in range(config.outputs.save_image_level):
                     self.save_image_stacks(i + 1, name, save_dir)
 
-            return omr_response, final_marked, multi_marked, multi_roll
+            return omr_response, final_marked, multi_marked, multi_roll, field_confidences
 
         except Exception as e:
             raise e
 
+    def get_alignment_morph(self, clahe, value_ranges):
+        """Stages of finding the vertical lines of `clahe` (a part of the page after
+        CLAHE) that auto alignment slides the field blocks to; the last is the line
+        mask. `value_ranges` are the page's, from get_alignment_value_ranges"""
+        (low, high), (low_v, high_v) = value_ranges
+        morph = self.get_alignment_contrast(clahe)
+        morph = ImageUtils.normalize_range_util(morph, low, high)
+
+        # Open : erode then dilate
+        v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 10))
+        morph_v = cv2.morphologyEx(morph, cv2.MORPH_OPEN, v_kernel, iterations=3)
+        _, morph_v = cv2.threshold(morph_v, 200, 200, cv2.THRESH_TRUNC)
+        morph_v = 255 - ImageUtils.normalize_range_util(morph_v, low_v, high_v)
+
+        morph_thr = 60  # for Mobile images, 40 for scanned Images
+        _, morph_thr_eroded = cv2.threshold(morph_v, morph_thr, 255, cv2.THRESH_BINARY)
+        # kernel best tuned to 5x5 now
+        morph_thr_eroded = cv2.erode(
+            morph_thr_eroded, np.ones((5, 5), np.uint8), iterations=2
+        )
+        # h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (10, 2))
+        # morph_h = cv2.morphologyEx(morph, cv2.MORPH_OPEN, h_kernel, iterations=3)
+        # ret, morph_h = cv2.threshold(morph_h,200,200,cv2.THRESH_TRUNC)
+        # morph_h = 255 - normalize_util(morph_h)
+        # InteractionUtils.show("morph_h",morph_h,0,1,config=config)
+        # _, morph_h = cv2.threshold(morph_h,morph_thr,255,cv2.THRESH_BINARY)
+        # morph_h = cv2.erode(morph_h,  np.ones((5,5),np.uint8), iterations = 2)
+        return clahe, morph, morph_v, morph_thr_eroded
+
+    def get_alignment_contrast(self, clahe):
+        """The pixel-wise steps of get_alignment_morph before its first normalisation"""
+        config = self.tuning_config
+        # Remove shadows further, make columns/boxes darker (less gamma)
+        morph = ImageUtils.adjust_gamma(clahe, config.threshold_params.GAMMA_LOW)
+        # TODO: all numbers should come from either constants or config
+        _, morph = cv2.threshold(morph, 220, 220, cv2.THRESH_TRUNC)
+        return morph
+
+    def get_alignment_value_ranges(self, clahe):
+        """The (low, high) ranges the two normalisations of get_alignment_morph
+        stretch on the whole page's `clahe`, without morphing all of it"""
+        # Both normalisations follow non-decreasing pixel-wise steps, so the ends
+        # of a range are those steps applied to the page's extremes. The open
+        # never raises a pixel, keeping the normalised 0, and its brightest pixel
+        # is the brightest of its erosion, which commutes with those steps
+        v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 10))
+        eroded = cv2.erode(clahe, v_kernel, iterations=3)
+        extremes = np.array([[clahe.min(), clahe.max(), eroded.max()]], np.uint8)
+        extremes = self.get_alignment_contrast(extremes)
+        low, high = int(extremes[0, 0]), int(extremes[0, 1])
+        opened_high = ImageUtils.normalize_range_util(extremes, low, high)[0, 2]
+        return (low, high), (0, min(200, int(opened_high)))
+
+    def show_alignment_morph(self, clahe, morph, morph_v, morph_thr_eroded):
+        config = self.tuning_config
+        self.append_save_img(3, clahe)
+        self.append_save_img(3, morph)
+        if config.outputs.show_image_level >= 4:
+            InteractionUtils.show("morph1", morph, 0, 1, config=config)
+        if config.outputs.show_image_level >= 3:
+            InteractionUtils.show("morphed_vertical", morph_v, 0, 1, config=config)
+        self.append_save_img(3, morph_v)
+        self.append_save_img(3, morph_thr_eroded)
+        if config.outputs.show_image_level >= 3:
+            InteractionUtils.show(
+                "morph_thr_eroded", morph_thr_eroded, 0, 1, config=config
+            )
+        self.append_save_img(6, morph_thr_eroded)
+
+    @staticmethod
+    def get_alignment_roi(field_block, page_shape, max_shift):
+        """(y0, y1, x0, x1) of the page area that aligning `field_block` reads:
+        its bounding box widened by the largest shift, plus a margin so the
+        morphology at the edges of that area matches the whole page's"""
+        s, d = field_block.origin, field_block.dimensions
+        page_height, page_width = page_shape[:2]
+        margin = ALIGNMENT_MORPH_MARGIN
+        return (
+            max(0, s[1] - margin),
+            min(page_height, s[1] + d[1] + margin),
+            max(0, s[0] - max_shift - margin),
+            min(page_width, s[0] + d[0] + max_shift + margin),
+        )
+
+    @staticmethod
+    def get_sheet_confidence(field_confidences):
+        """Confidence of the least certain field"""
+        return min(field_confidences.values(), default=float("inf"))
+
     @staticmethod
     def draw_template_layout(img, template, shifted=True, draw_qvals=False, border=-1):
         img = ImageUtils.resize_util(
@@ -605,6 +862,7 @@ class ImageInstanceOps:
         #     global_thr, j_low, j_high = thr2, thr2 - max2//2, thr2 + max2//2
 
         if plot_title:
+            plt = get_pyplot()
             _, ax = plt.subplots()
             ax.bar(range(len(q_vals_orig)), q_vals if sort_in_plot else q_vals_orig)
             ax.set_title(plot_title)
@@ -651,10 +909,13 @@ class ImageInstanceOps:
             ....||||||
             ||||||||||
 
+        Returns the threshold and whether it is confident, i.e. backed by a clear
+        jump or by the global threshold.
         """
         config = self.tuning_config
         # Sort the Q bubbleValues
         q_vals = sorted(q_vals)
+        is_confident = True
 
         # Small no of pts cases:
         # base case: 1 or 2 pts
@@ -703,13 +964,14 @@ class ImageInstanceOps:
                     thr1 = global_thr
                 else:
                     # TODO: Low confidence parameters here
-                    pass
+                    is_confident = False
 
             # if(thr1 == 255):
             #     print("Warning: threshold is unexpectedly 255! (Outlier Delta issue?)",plot_title)
 
         # Make a common plot function to show local and global thresholds
         if plot_show and plot_title is not None:
+            plt = get_pyplot()
             _, ax = plt.subplots()
             ax.bar(range(len(q_vals)), q_vals)
             thrline = ax.axhline(thr1, color="green", ls=("-."), linewidth=3)
@@ -724,34 +986,54 @@ class ImageInstanceOps:
             # appendSaveImg(6,getPlotImg())
             if plot_show:
                 plt.show()
-        return thr1
+        return thr1, is_confident
 
     def append_save_img(self, key, img):
-        if self.save_image_level >= int(key):
-            self.save_img_list[key].append(img.copy())
+        self.debug_images.append(key, img)
 
     def save_image_stacks(self, key, filename, save_dir):
         config = self.tuning_config
-        if self.save_image_level >= int(key) and self.save_img_list[key] != []:
+        images = self.debug_images.get(key)
+        if self.save_image_level >= int(key) and images:
             name = os.path.splitext(filename)[0]
+            stack_height = min(img.shape[0] for img in images)
             result = np.hstack(
                 tuple(
                     [
-                        ImageUtils.resize_util_h(img, config.dimensions.display_height)
-                        for img in self.save_img_list[key]
+                        img
+                        if img.shape[0] == stack_height
+                        else ImageUtils.resize_util_h(img, stack_height)
+                        for img in images
                     ]
                 )
             )
             result = ImageUtils.resize_util(
                 result,
                 min(
-                    len(self.save_img_list[key]) * config.dimensions.display_width // 3,
+                    len(images) * config.dimensions.display_width // 3,
                     int(config.dimensions.display_width * 2.5),
                 ),
             )
             stack_path = save_dir.joinpath("stack", f"{name}_{str(key)}_stack.jpg")
-            ImageUtils.save_img(str(stack_path), result)
+            self.save_image(stack_path, result)
+
+    def save_image(self, image_path, image):
+        """Queue an output image for writing, in the configured format, quality and size"""
+        outputs = self.tuning_config.outputs
+        if outputs.save_image_format:
+            image_path = image_path.with_suffix(f".{outputs.save_image_format}")
+        max_dimension = outputs.save_image_max_dimension
+        if max_dimension and max(image.shape[:2]) > max_dimension:
+            scale = max_dimension / max(image.shape[:2])
+            image = cv2.resize(
+                image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        logger.info(f"Saving Image to '{image_path}'")
+        self.image_writer.submit(
+            str(image_path),
+            image,
+            get_write_params(image_path.suffix, outputs.save_image_quality),
+        )
 
     def reset_all_save_img(self):
-        for i in range(self.save_image_level):
-            self.save_img_list[i + 1] = []
+        self.debug_images.reset()
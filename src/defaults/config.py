@@ -24,10 +24,32 @@ CONFIG_DEFAULTS = DotMap(
             "stride": 1,
             "thickness": 3,
         },
+        "preprocessing": {
+            # Compose crops/alignment into one warp from the input image into template space
+            "single_resample": False,
+            # Folder for cached intermediate images; empty disables the cache
+            "stage_cache_dir": "",
+            # Sheets preprocessed together through apply_filter_batch
+            "batch_size": 1,
+            # Read sheets without the heavy steps first and escalate when a field's
+            # threshold-to-bubble gap is below this; 0 always runs every step
+            "escalation_min_confidence": 0,
+            # Pre-processors skipped on the first, fast read
+            "escalation_heavy_processors": ["CropOnMarkers", "FeatureBasedAlignment"],
+        },
         "outputs": {
             "show_image_level": 0,
             "save_image_level": 0,
             "save_detections": True,
+            # "flagged": save marked sheets only when multi-marked or read with low confidence
+            "save_detections_for": "all",
+            # Output images (marked sheets, stacks): "" keeps the sheet's own extension
+            "save_image_format": "",
+            "save_image_quality": 95,
+            # Longest side of output images in pixels, 0 keeps their size
+            "save_image_max_dimension": 0,
+            # Background threads writing output images, 0 writes them inline
+            "image_writer_threads": 2,
             "filter_out_multimarked_files": False,
         },
     },
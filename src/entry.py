@@ -6,26 +6,45 @@
  Github: https://github.com/Udayraj123
 
 """
+import hashlib
+import json
 import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from csv import QUOTE_NONNUMERIC
+from dataclasses import dataclass
+from itertools import chain, groupby, islice
+from operator import itemgetter
 from pathlib import Path
 from time import time
+from typing import Iterable, Optional
 
-import cv2
 import pandas as pd
-from rich.table import Table
+from dotmap import DotMap
 
 from src.constants.common import (
     CONFIG_FILENAME,
     ERROR_CODES,
+    EVALUATION_BATCH_SIZE,
     EVALUATION_FILENAME,
     TEMPLATE_FILENAME,
 )
 from src.defaults import CONFIG_DEFAULTS
-from src.evaluation import EvaluationConfig, evaluate_concatenated_response
+from src.escalation import ESCALATION_TIER_NAMES, get_escalation_tiers
+from src.evaluation import EvaluationConfig, evaluate_concatenated_responses
+from src.item_statistics import register_live_statistics
 from src.logger import console, logger
-from src.template import Template
-from src.utils.file import Paths, setup_dirs_for_paths, setup_outputs_for_template
+from src.template import Template, compile_template
+from src.utils.containers import expand_sheet_file, get_output_name, read_sheet
+from src.utils.file import (
+    DirectoryImages,
+    Paths,
+    iter_csv_rows,
+    scan_directory,
+    setup_dirs_for_paths,
+    setup_outputs_for_template,
+    write_rows_to_xlsx,
+)
 from src.utils.image import ImageUtils
 from src.utils.interaction import InteractionUtils, Stats
 from src.utils.parsing import get_concatenated_response_grouped, open_config_with_defaults
@@ -41,6 +60,22 @@ def entry_point(input_dir, args):
     return process_dir(input_dir, curr_dir, args)
 
 
+def compile_templates(template_paths):
+    for template_path in map(Path, template_paths):
+        if template_path.is_dir():
+            template_path = template_path.joinpath(TEMPLATE_FILENAME)
+        if not template_path.exists():
+            raise Exception(f"Given template file does not exist: '{template_path}'")
+        # Use the directory's config, as when processing it
+        config_path = template_path.parent.joinpath(CONFIG_FILENAME)
+        tuning_config = (
+            open_config_with_defaults(config_path)
+            if config_path.exists()
+            else CONFIG_DEFAULTS
+        )
+        compile_template(template_path, tuning_config)
+
+
 def print_config_summary(
     curr_dir,
     omr_files,
@@ -50,12 +85,17 @@ def print_config_summary(
     evaluation_config,
     args,
 ):
+    from rich.table import Table
+
     logger.info("")
     table = Table(title="Current Configurations", show_header=False, show_lines=False)
     table.add_column("Key", style="cyan", no_wrap=True)
     table.add_column("Value", style="magenta")
     table.add_row("Directory Path", f"{curr_dir}")
-    table.add_row("Count of Images", f"{len(omr_files)}")
+    table.add_row(
+        "Count of Images",
+        f"{len(omr_files)}" if isinstance(omr_files, list) else "streamed",
+    )
     table.add_row("Set Layout Mode ", "ON" if args["setLayout"] else "OFF")
     pre_processor_names = [pp.__class__.__name__ for pp in template.pre_processors]
     table.add_row(
@@ -76,14 +116,96 @@ def print_config_summary(
     console.print(table, justify="center")
 
 
-def process_dir(
+@dataclass
+class WorkUnit:
+    """A directory of sheets with the template, config and evaluation that apply to it"""
+
+    directory: Path
+    # A list of paths, or DirectoryImages when streaming
+    omr_files: Iterable
+    template: Template
+    template_index: int
+    tuning_config: DotMap
+    local_config_path: Optional[Path]
+    evaluation_config: Optional[EvaluationConfig]
+    paths: Paths
+
+
+class TemplateCache:
+    """Shares one Template between directories with identical template.json, config
+    and referenced files (markers, reference images)"""
+
+    def __init__(self):
+        self.templates = []
+        self.specs = []
+        self.indices_by_key = {}
+
+    @staticmethod
+    def file_digest(path):
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @staticmethod
+    def exclude_files(template, template_dir):
+        """Files referenced by `template`'s pre-processors, as seen from `template_dir`.
+        A reused template points at the files of the directory it was built from."""
+        source_dir = Path(template.path).parent
+        exclude_files = []
+        for pre_processor in template.pre_processors:
+            for resource in map(Path, pre_processor.exclude_files()):
+                try:
+                    relative = resource.relative_to(source_dir)
+                except ValueError:
+                    # Outside the template directory: the same file either way
+                    exclude_files.append((resource, resource))
+                    continue
+                exclude_files.append((resource, template_dir.joinpath(relative)))
+        return exclude_files
+
+    def has_same_resources(self, template, template_dir):
+        """Whether the files referenced by `template` are identical in `template_dir`"""
+        for resource, candidate in self.exclude_files(template, template_dir):
+            if candidate == resource:
+                continue
+            if not candidate.exists() or self.file_digest(
+                candidate
+            ) != self.file_digest(resource):
+                return False
+        return True
+
+    def get(self, template_path, tuning_config):
+        """(index, Template) for the template file under this config"""
+        key = (
+            self.file_digest(template_path),
+            json.dumps(tuning_config.toDict(), sort_keys=True, default=str),
+        )
+        for index in self.indices_by_key.get(key, []):
+            if self.has_same_resources(self.templates[index], template_path.parent):
+                logger.info(
+                    f"Reusing template '{self.templates[index]}' for '{template_path}'"
+                )
+                return index, self.templates[index]
+
+        index = len(self.templates)
+        self.templates.append(Template(template_path, tuning_config))
+        self.specs.append((str(template_path), tuning_config.toDict()))
+        self.indices_by_key.setdefault(key, []).append(index)
+        return index, self.templates[index]
+
+
+def discover_work_units(
     root_dir,
     curr_dir,
     args,
+    template_cache,
+    work_units,
     template=None,
+    template_index=None,
     tuning_config=CONFIG_DEFAULTS,
     evaluation_config=None,
+    template_dir=None,
 ):
+    """Walk the directory tree depth-first and collect a WorkUnit per directory with sheets"""
     # Update local tuning_config (in current recursion stack)
     local_config_path = curr_dir.joinpath(CONFIG_FILENAME)
     local_config_exists = os.path.exists(local_config_path)
@@ -98,32 +220,22 @@ def process_dir(
     local_template_path = curr_dir.joinpath(TEMPLATE_FILENAME)
     local_template_exists = os.path.exists(local_template_path)
     if local_template_exists:
-        template = Template(
+        template_index, template = template_cache.get(
             local_template_path,
             tuning_config,
         )
-    # Look for subdirectories for processing
-    subdirs = [d for d in curr_dir.iterdir() if d.is_dir()]
+        template_dir = curr_dir
 
     output_dir = Path(args["output_dir"], curr_dir.relative_to(root_dir))
     paths = Paths(output_dir)
 
-    # look for images in current dir to process
-    exts = (
-        "*.[pP][nN][gG]",
-        "*.[jJ][pP][gG]",
-        "*.[jJ][pP][eE][gG]",
-        "*.[bB][mM][pP]",
-        "*.[tT][iI][fF]",
-        "*.[tT][iI][fF][fF]",
-    )
-    omr_files = sorted([f for ext in exts for f in curr_dir.glob(ext)])
-
     # Exclude images (take union over all pre_processors)
-    excluded_files = []
+    excluded_files = set()
     if template:
-        for pp in template.pre_processors:
-            excluded_files.extend(Path(p) for p in pp.exclude_files())
+        excluded_files.update(
+            exclude_file
+            for _, exclude_file in template_cache.exclude_files(template, template_dir)
+        )
 
     local_evaluation_path = curr_dir.joinpath(EVALUATION_FILENAME)
     if not args["setLayout"] and os.path.exists(local_evaluation_path):
@@ -138,11 +250,26 @@ def process_dir(
             tuning_config,
         )
 
-        excluded_files.extend(
+        excluded_files.update(
             Path(exclude_file) for exclude_file in evaluation_config.get_exclude_files()
         )
 
-    omr_files = [f for f in omr_files if f not in excluded_files]
+    # look for images and subdirectories in current dir to process
+    subdirs, omr_files = [], []
+    stream = args.get("stream")
+    for kind, path in scan_directory(curr_dir, excluded_files):
+        if kind == "dir":
+            subdirs.append(path)
+        elif stream:
+            # Streamed sheets are re-scanned when processed, not held in memory
+            omr_files = DirectoryImages(curr_dir, excluded_files)
+        else:
+            omr_files.append(path)
+    if not stream:
+        # Multi-page TIFFs, PDFs and ZIPs contribute one sheet per page
+        omr_files = [
+            sheet for path in sorted(omr_files) for sheet in expand_sheet_file(path)
+        ]
 
     if omr_files:
         if not template:
@@ -155,29 +282,18 @@ def process_dir(
                 f"No template file found in the directory tree of {curr_dir.as_posix()}"
             )
 
-        setup_dirs_for_paths(paths)
-        outputs_namespace = setup_outputs_for_template(paths, template)
-
-        print_config_summary(
-            curr_dir,
-            omr_files,
-            template,
-            tuning_config,
-            local_config_path if local_config_exists else None,
-            evaluation_config,
-            args,
-        )
-        if args["setLayout"]:
-            show_template_layouts(omr_files, template, tuning_config)
-        else:
-            process_files(
+        work_units.append(
+            WorkUnit(
+                curr_dir,
                 omr_files,
                 template,
+                template_index,
                 tuning_config,
+                local_config_path if local_config_exists else None,
                 evaluation_config,
-                outputs_namespace,
+                paths,
             )
-            export_excel_results(outputs_namespace.files_obj.get("Results"))
+        )
 
     elif not subdirs:
         # Each subdirectory should have images or should be non-leaf
@@ -186,23 +302,174 @@ def process_dir(
             Empty directories not allowed."
         )
 
-    # recursively process sub-folders
+    # recursively discover sub-folders
     for d in subdirs:
-        process_dir(
+        discover_work_units(
             root_dir,
             d,
             args,
+            template_cache,
+            work_units,
             template,
+            template_index,
             tuning_config,
             evaluation_config,
+            template_dir,
         )
 
 
+def process_dir(root_dir, curr_dir, args):
+    """Discover the whole tree below `curr_dir`, then process its sheets"""
+    template_cache = TemplateCache()
+    work_units = []
+    discover_work_units(root_dir, curr_dir, args, template_cache, work_units)
+    run_work_units(work_units, template_cache, args)
+
+
+def start_work_unit(work_unit, args):
+    outputs_namespace = setup_outputs_for_template(work_unit.paths, work_unit.template)
+    print_config_summary(
+        work_unit.directory,
+        work_unit.omr_files,
+        work_unit.template,
+        work_unit.tuning_config,
+        work_unit.local_config_path,
+        work_unit.evaluation_config,
+        args,
+    )
+    return outputs_namespace
+
+
+def get_worker_count(work_units, args):
+    workers = int(args.get("workers") or 1)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers > 1 and any(
+        work_unit.tuning_config.outputs.show_image_level > 0 for work_unit in work_units
+    ):
+        logger.warning("Showing images needs a single process, ignoring --workers")
+        return 1
+    return workers
+
+
+def run_work_units(work_units, template_cache, args):
+    # Up front, as workers may write marked images for any folder
+    for work_unit in work_units:
+        setup_dirs_for_paths(work_unit.paths)
+
+    if args["setLayout"]:
+        for work_unit in work_units:
+            start_work_unit(work_unit, args)
+            show_template_layouts(
+                work_unit.omr_files, work_unit.template, work_unit.tuning_config
+            )
+        return
+
+    workers = get_worker_count(work_units, args)
+    if workers == 1:
+        for work_unit in work_units:
+            run_work_unit(work_unit, args)
+        return
+
+    # Sheets of all directories go through one pool, in chunks of batch_size files.
+    # Results come back in submission order and are routed to their directory.
+    logger.info(
+        f"Processing {len(work_units)} folder(s) with {len(template_cache.templates)} template(s) on {workers} workers"
+    )
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(template_cache.specs,),
+    ) as executor:
+        results = map_bounded(
+            executor,
+            read_omr_files_in_worker,
+            iter_work_unit_tasks(work_units),
+            max_pending=2 * workers,
+        )
+        for unit_index, unit_results in groupby(results, key=itemgetter(0)):
+            read_results = chain.from_iterable(
+                chunk_results for _, chunk_results in unit_results
+            )
+            run_work_unit(work_units[unit_index], args, read_results)
+
+
+def iter_work_unit_tasks(work_units):
+    """Yields (work unit index, worker task) for each chunk of batch_size files"""
+    for unit_index, work_unit in enumerate(work_units):
+        batch_size = max(1, int(work_unit.tuning_config.preprocessing.batch_size))
+        files = iter(work_unit.omr_files)
+        for chunk in iter(lambda: list(islice(files, batch_size)), []):
+            yield unit_index, (
+                work_unit.template_index,
+                chunk,
+                work_unit.paths.save_marked_dir,
+            )
+
+
+def map_bounded(executor, fn, tagged_tasks, max_pending):
+    """Like executor.map over (tag, task) pairs, yielding (tag, result) in order, but
+    submitting at most `max_pending` tasks ahead of the consumer"""
+    pending = deque()
+    for tag, task in tagged_tasks:
+        pending.append((tag, executor.submit(fn, task)))
+        if len(pending) >= max_pending:
+            tag, future = pending.popleft()
+            yield tag, future.result()
+    while pending:
+        tag, future = pending.popleft()
+        yield tag, future.result()
+
+
+def run_work_unit(work_unit, args, read_results=None):
+    outputs_namespace = start_work_unit(work_unit, args)
+    process_files(
+        work_unit.omr_files,
+        work_unit.template,
+        work_unit.tuning_config,
+        work_unit.evaluation_config,
+        outputs_namespace,
+        read_results,
+    )
+    export_excel_results(outputs_namespace.files_obj.get("Results"))
+
+
+# Per worker process: template specs and the templates built from them so far
+WORKER_TEMPLATE_SPECS = []
+WORKER_TEMPLATES = {}
+
+
+def init_worker(template_specs):
+    WORKER_TEMPLATE_SPECS[:] = template_specs
+    WORKER_TEMPLATES.clear()
+
+
+def read_omr_files_in_worker(task):
+    template_index, omr_files, save_dir = task
+    template = WORKER_TEMPLATES.get(template_index)
+    if template is None:
+        template_path, tuning_config = WORKER_TEMPLATE_SPECS[template_index]
+        template = Template(Path(template_path), DotMap(tuning_config, _dynamic=False))
+        WORKER_TEMPLATES[template_index] = template
+    # The marked image is only needed for showing, which workers never do
+    results = [
+        (file_path, omr_response, None, multi_marked, tier)
+        for (
+            file_path,
+            omr_response,
+            _final_marked,
+            multi_marked,
+            tier,
+        ) in read_omr_files(omr_files, template, save_dir)
+    ]
+    template.image_instance_ops.image_writer.close()
+    return results
+
+
 def show_template_layouts(omr_files, template, tuning_config):
     for file_path in omr_files:
         file_name = file_path.name
-        file_path = str(file_path)
-        in_omr = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+        in_omr = read_sheet(file_path)
         in_omr = template.image_instance_ops.apply_preprocessors(
             file_path, in_omr, template
         )
@@ -220,36 +487,160 @@ def process_files(
     tuning_config,
     evaluation_config,
     outputs_namespace,
+    read_results=None,
 ):
     start_time = int(time())
-    files_counter = 0
     STATS.files_not_moved = 0
+    STATS.tier_counts = Counter()
 
-    for file_path in omr_files:
-        files_counter += 1
-        file_name = file_path.name
-
-        in_omr = cv2.imread(str(file_path), cv2.IMREAD_GRAYSCALE)
+    if evaluation_config is not None:
+        # Fresh item statistics for this directory, readable while the batch runs
+        register_live_statistics(
+            outputs_namespace.paths.output_dir,
+            evaluation_config.reset_item_statistics(),
+        )
 
-        logger.info("")
-        logger.info(
-            f"({files_counter}) Opening image: \t'{file_path}'\tResolution: {in_omr.shape}"
+    explanation_writer = None
+    if evaluation_config is not None and evaluation_config.enable_evaluation_table_to_csv:
+        explanation_writer = evaluation_config.get_explanation_writer(
+            outputs_namespace.paths.evaluation_dir
         )
+    try:
+        if read_results is None:
+            read_results = read_omr_files(
+                omr_files, template, outputs_namespace.paths.save_marked_dir
+            )
+        files_counter = process_omr_files(
+            read_results,
+            template,
+            tuning_config,
+            evaluation_config,
+            outputs_namespace,
+            explanation_writer,
+        )
+    finally:
+        if explanation_writer is not None:
+            explanation_writer.close()
+        # Marked images are written in the background
+        template.image_instance_ops.image_writer.close()
 
-        template.image_instance_ops.reset_all_save_img()
+    print_stats(start_time, files_counter, tuning_config)
 
-        template.image_instance_ops.append_save_img(1, in_omr)
 
-        in_omr = template.image_instance_ops.apply_preprocessors(
-            file_path, in_omr, template
+def preprocess_omr_files(omr_files, template):
+    """Yields (file_path, preprocessed image or None) for each file, preprocessing
+    `batch_size` files at a time"""
+    image_instance_ops = template.image_instance_ops
+    files = iter(omr_files)
+    files_counter = 0
+    while True:
+        chunk = list(islice(files, image_instance_ops.batch_size))
+        if not chunk:
+            return
+        images = []
+        for file_path in chunk:
+            files_counter += 1
+            image_instance_ops.reset_all_save_img()
+
+            logger.info("")
+            if (
+                image_instance_ops.stage_cache is not None
+                and image_instance_ops.save_image_level < 1
+            ):
+                # Decoded later, only if no preprocessed image is cached
+                in_omr = None
+                logger.info(f"({files_counter}) Opening image: \t'{file_path}'")
+            else:
+                in_omr = read_sheet(file_path)
+                logger.info(
+                    f"({files_counter}) Opening image: \t'{file_path}'\tResolution: {in_omr.shape}"
+                )
+                image_instance_ops.append_save_img(1, in_omr)
+            images.append(in_omr)
+
+        yield from zip(
+            chunk,
+            image_instance_ops.apply_preprocessors_batch(chunk, images, template),
         )
 
-        if in_omr is None:
+
+def read_omr_files(omr_files, template, save_dir):
+    """Yields (file_path, omr_response, final_marked, multi_marked, tier) for each
+    file, with a None response when preprocessing failed. With escalation enabled,
+    sheets below escalation_min_confidence are read again by the next tier."""
+    image_instance_ops = template.image_instance_ops
+    config = image_instance_ops.tuning_config
+    min_confidence = config.preprocessing.escalation_min_confidence
+    tiers = get_escalation_tiers(template)
+    for file_path, in_omr in preprocess_omr_files(omr_files, tiers[0].template):
+        for tier_index, tier in enumerate(tiers):
+            is_last_tier = tier_index == len(tiers) - 1
+            if tier_index > 0 and tier.template is not tiers[tier_index - 1].template:
+                logger.info(f"Escalating '{file_path}' to the '{tier.name}' tier")
+                image_instance_ops.reset_all_save_img()
+                in_omr = image_instance_ops.apply_preprocessors(
+                    file_path, None, tier.template
+                )
+            if in_omr is None:
+                if is_last_tier:
+                    yield file_path, None, None, None, tier.name
+                continue
+            (
+                response_dict,
+                final_marked,
+                multi_marked,
+                _,
+                field_confidences,
+            ) = image_instance_ops.read_omr_response(
+                tier.template,
+                image=in_omr,
+                name=get_output_name(file_path),
+                save_dir=save_dir,
+                auto_align=tier.auto_align,
+                min_confidence=None if is_last_tier else min_confidence,
+            )
+            if (
+                not is_last_tier
+                and image_instance_ops.get_sheet_confidence(field_confidences)
+                < min_confidence
+            ):
+                continue
+            # concatenate roll nos, set unmarked responses, etc
+            omr_response = get_concatenated_response_grouped(response_dict, template)
+            yield file_path, omr_response, final_marked, multi_marked, tier.name
+            break
+
+
+def process_omr_files(
+    read_results,
+    template,
+    tuning_config,
+    evaluation_config,
+    outputs_namespace,
+    explanation_writer,
+):
+    files_counter = 0
+    for (
+        file_path,
+        omr_response,
+        final_marked,
+        multi_marked,
+        tier,
+        score,
+    ) in score_read_results(
+        read_results,
+        tuning_config,
+        evaluation_config,
+        outputs_namespace,
+        explanation_writer,
+    ):
+        files_counter += 1
+        STATS.tier_counts[tier] += 1
+        file_name = file_path.name
+
+        if omr_response is None:
             # Error OMR case
             new_file_path = outputs_namespace.paths.errors_dir.joinpath(file_name)
-            outputs_namespace.OUTPUT_SET.append(
-                [file_name] + outputs_namespace.empty_resp
-            )
             if check_and_move(ERROR_CODES.NO_MARKER_ERR, file_path, new_file_path):
                 err_line = [
                     file_name,
@@ -267,18 +658,6 @@ def process_files(
         # uniquify
         file_id = str(file_name)
         save_dir = outputs_namespace.paths.save_marked_dir
-        (
-            response_dict,
-            final_marked,
-            multi_marked,
-            _,
-        ) = template.image_instance_ops.read_omr_response(
-            template, image=in_omr, name=file_id, save_dir=save_dir
-        )
-
-        # TODO: move inner try catch here
-        # concatenate roll nos, set unmarked responses, etc
-        omr_response = get_concatenated_response_grouped(response_dict, template)
 
         if (
             evaluation_config is None
@@ -286,21 +665,14 @@ def process_files(
         ):
             logger.info(f"Read Response: \n{omr_response}")
 
-        score = 0
         if evaluation_config is not None:
-            score = evaluate_concatenated_response(
-                omr_response,
-                evaluation_config,
-                file_path,
-                outputs_namespace.paths.evaluation_dir,
-            )
             logger.info(
                 f"(/{files_counter}) Graded with score: {round(score, 2)}\t for file: '{file_id}'"
             )
         else:
             logger.info(f"(/{files_counter}) Processed file: '{file_id}'")
 
-        if tuning_config.outputs.show_image_level >= 2:
+        if tuning_config.outputs.show_image_level >= 2 and final_marked is not None:
             InteractionUtils.show(
                 f"Final Marked Bubbles : '{file_id}'",
                 ImageUtils.resize_util_h(
@@ -315,8 +687,6 @@ def process_files(
         for k in template.grouped_output_columns:
             resp_array.append(omr_response.get(k, ""))
 
-        outputs_namespace.OUTPUT_SET.append([file_name] + resp_array)
-
         if multi_marked == 0 or not tuning_config.outputs.filter_out_multimarked_files:
             STATS.files_not_moved += 1
             new_file_path = save_dir.joinpath(file_id)
@@ -353,7 +723,49 @@ def process_files(
             #     TODO:  Add appropriate record handling here
             #     pass
 
-    print_stats(start_time, files_counter, tuning_config)
+    return files_counter
+
+
+def score_read_results(
+    read_results,
+    tuning_config,
+    evaluation_config,
+    outputs_namespace,
+    explanation_writer,
+):
+    """Yields each read result with the sheet's score appended (0 without an
+    evaluation or a response). Sheets are scored a chunk at a time, in one
+    vectorized call per chunk."""
+    if tuning_config.outputs.show_image_level >= 2:
+        chunk_size = 1
+    else:
+        # Marked images are only kept for showing
+        read_results = (
+            (file_path, omr_response, None, multi_marked, tier)
+            for file_path, omr_response, _final_marked, multi_marked, tier in read_results
+        )
+        chunk_size = EVALUATION_BATCH_SIZE
+    read_results = iter(read_results)
+    for chunk in iter(lambda: list(islice(read_results, chunk_size)), []):
+        scores = [0] * len(chunk)
+        graded = [
+            (index, file_path, omr_response)
+            for index, (file_path, omr_response, *_rest) in enumerate(chunk)
+            if omr_response is not None
+        ]
+        if evaluation_config is not None and graded:
+            indices, file_paths, omr_responses = zip(*graded)
+            graded_scores = evaluate_concatenated_responses(
+                omr_responses,
+                evaluation_config,
+                file_paths,
+                outputs_namespace.paths.evaluation_dir,
+                explanation_writer,
+            )
+            for index, score in zip(indices, graded_scores):
+                scores[index] = score
+        for read_result, score in zip(chunk, scores):
+            yield (*read_result, score)
 
 
 def check_and_move(error_code, file_path, filepath2):
@@ -372,6 +784,10 @@ def print_stats(start_time, files_counter, tuning_config):
     log(
         f"{'Total file(s) processed': <27}: {files_counter} ({'Sum Tallied!' if files_counter == (STATS.files_moved + STATS.files_not_moved) else 'Not Tallying!'})"
     )
+    if tuning_config.preprocessing.escalation_min_confidence > 0:
+        for tier in ESCALATION_TIER_NAMES:
+            if tier in STATS.tier_counts:
+                log(f"{'Read in ' + tier + ' tier': <27}: {STATS.tier_counts[tier]}")
 
     if tuning_config.outputs.show_image_level <= 0:
         log(
@@ -405,8 +821,8 @@ def export_excel_results(results_csv_path):
 
     try:
         xlsx_path = str(results_csv_path).rsplit(".", 1)[0] + ".xlsx"
-        df = pd.read_csv(results_csv_path, dtype=str, na_filter=False)
-        df.to_excel(xlsx_path, index=False, engine="openpyxl")
+        # Stream rows from the CSV into a write-only workbook to keep memory flat
+        write_rows_to_xlsx(xlsx_path, [("Sheet1", iter_csv_rows(results_csv_path))])
         logger.info(f"Excel export created: '{xlsx_path}'")
     except Exception as e:
         logger.warning(f"Failed to export Excel: {e}")
@@ -0,0 +1,48 @@
+"""
+Confidence-based escalation: sheets are read with the cheapest processing first
+and read again with the heavier pre-processors or auto alignment only when the
+confidence of a field falls below preprocessing.escalation_min_confidence.
+"""
+import copy
+from dataclasses import dataclass
+
+from src.template import Template
+
+# In the order they are tried
+ESCALATION_TIER_NAMES = ("fast", "preprocessed", "aligned")
+
+
+@dataclass
+class EscalationTier:
+    name: str
+    # The template, with only the pre-processors of this tier
+    template: Template
+    auto_align: bool
+
+
+def get_escalation_tiers(template):
+    """Tiers to read the template's sheets with. Without escalation, a single
+    tier running every pre-processor and auto alignment as configured."""
+    config = template.image_instance_ops.tuning_config
+    auto_align = config.alignment_params.auto_align
+    last_tier = EscalationTier(
+        "aligned" if auto_align else "preprocessed", template, auto_align
+    )
+    if config.preprocessing.escalation_min_confidence <= 0:
+        return [last_tier]
+
+    tiers = []
+    heavy_processors = set(config.preprocessing.escalation_heavy_processors)
+    light_pre_processors = [
+        pre_processor
+        for pre_processor in template.pre_processors
+        if pre_processor.__class__.__name__ not in heavy_processors
+    ]
+    if len(light_pre_processors) < len(template.pre_processors):
+        fast_template = copy.copy(template)
+        fast_template.pre_processors = light_pre_processors
+        tiers.append(EscalationTier("fast", fast_template, False))
+    if auto_align:
+        tiers.append(EscalationTier("preprocessed", template, False))
+    tiers.append(last_tier)
+    return tiers
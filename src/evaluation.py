@@ -1,13 +1,16 @@
 import ast
+import csv
 import os
 import re
 from copy import deepcopy
 from csv import QUOTE_NONNUMERIC
+from fnmatch import fnmatch
 
 import cv2
+import numpy as np
 import pandas as pd
-from rich.table import Table
 
+from src.item_statistics import ItemStatistics
 from src.logger import console, logger
 from src.schemas.constants import (
     BONUS_SECTION_PREFIX,
@@ -102,6 +105,18 @@ class AnswerMatcher:
         elif answer_type == "multiple-correct-weighted":
             return f"Custom: {self.marking}"
 
+    def get_answer_explanation(self):
+        answer_type = self.answer_type
+        if answer_type == "standard":
+            return self.answer_item
+        elif answer_type == "multiple-correct":
+            return ", ".join(self.answer_item)
+        elif answer_type == "multiple-correct-weighted":
+            return ", ".join(
+                f"{allowed_answer}: {answer_score}"
+                for allowed_answer, answer_score in self.answer_item
+            )
+
     def get_verdict_marking(self, marked_answer):
         answer_type = self.answer_type
         question_verdict = "incorrect"
@@ -186,6 +201,204 @@ class SectionMarkingScheme:
         return verdict_marking, question_verdict
 
 
+class CompiledEvaluation:
+    """Dense lookup tables (question x answer code -> verdict, delta) for scoring many responses at once.
+
+    Every marked answer string that appears in some answer key (or is an empty value)
+    gets its own code; code 0 stands for any other answer, which is "incorrect" for
+    every question.
+    """
+
+    VERDICT_INCORRECT, VERDICT_UNMARKED, VERDICT_CORRECT = 0, 1, 2
+
+    def __init__(self, questions, answer_markings, default_markings):
+        """
+        questions: question keys in scoring order
+        answer_markings: per question, {marked_answer: (verdict, delta)}
+        default_markings: per question, (verdict, delta) for any other marked answer
+        """
+        self.questions = list(questions)
+        self.vocabulary = {}
+        for markings in answer_markings:
+            for marked_answer in markings:
+                self.vocabulary.setdefault(marked_answer, len(self.vocabulary) + 1)
+
+        shape = (len(self.questions), len(self.vocabulary) + 1)
+        self.delta_table = np.empty(shape, dtype=np.float64)
+        self.verdict_table = np.empty(shape, dtype=object)
+        for question_index, (markings, (verdict, delta)) in enumerate(
+            zip(answer_markings, default_markings)
+        ):
+            self.delta_table[question_index, :] = delta
+            self.verdict_table[question_index, :] = verdict
+            for marked_answer, (verdict, delta) in markings.items():
+                code = self.vocabulary[marked_answer]
+                self.delta_table[question_index, code] = delta
+                self.verdict_table[question_index, code] = verdict
+
+        self.verdict_kind_table = np.full(shape, self.VERDICT_INCORRECT, dtype=np.int8)
+        self.verdict_kind_table[
+            self.verdict_table == "unmarked"
+        ] = self.VERDICT_UNMARKED
+        is_correct = np.vectorize(
+            lambda verdict: verdict.startswith("correct"), otypes=[bool]
+        )
+        if self.verdict_table.size > 0:
+            self.verdict_kind_table[
+                is_correct(self.verdict_table)
+            ] = self.VERDICT_CORRECT
+
+    @classmethod
+    def from_answer_matchers(cls, questions, question_to_answer_matcher):
+        answer_markings, default_markings = [], []
+        for question in questions:
+            answer_matcher = question_to_answer_matcher[question]
+            marking = answer_matcher.marking
+            # Same precedence as AnswerMatcher: the empty value is checked first
+            markings = {answer_matcher.empty_val: ("unmarked", marking["unmarked"])}
+            if answer_matcher.answer_type == "standard":
+                markings.setdefault(
+                    answer_matcher.answer_item, ("correct", marking["correct"])
+                )
+            else:
+                allowed_answers = (
+                    answer_matcher.answer_item
+                    if answer_matcher.answer_type == "multiple-correct"
+                    else [allowed for allowed, _score in answer_matcher.answer_item]
+                )
+                for allowed_answer in allowed_answers:
+                    verdict = f"correct-{allowed_answer}"
+                    markings.setdefault(allowed_answer, (verdict, marking[verdict]))
+            answer_markings.append(markings)
+            default_markings.append(("incorrect", marking["incorrect"]))
+        return cls(questions, answer_markings, default_markings)
+
+    @classmethod
+    def from_answer_key(cls, questions, answers, marking, empty_values=("",)):
+        """Single-correct answer key with one marking for all questions (e.g. web scoring)."""
+        answer_markings = []
+        for answer in answers:
+            markings = {
+                empty_value: ("unmarked", marking["unmarked"])
+                for empty_value in empty_values
+            }
+            if answer not in markings and answer != "":
+                markings[answer] = ("correct", marking["correct"])
+            answer_markings.append(markings)
+        default_markings = [("incorrect", marking["incorrect"])] * len(answer_markings)
+        return cls(questions, answer_markings, default_markings)
+
+    def encode(self, responses):
+        """Map a (sheets x questions) matrix of marked answers to answer codes."""
+        responses = np.asarray(responses, dtype=object)
+        responses = responses.reshape(len(responses), len(self.questions))
+        unique_answers, inverse = np.unique(responses.astype(str), return_inverse=True)
+        unique_codes = np.array(
+            [self.vocabulary.get(answer, 0) for answer in unique_answers.tolist()],
+            dtype=np.int64,
+        )
+        return unique_codes[inverse.reshape(responses.shape)]
+
+    def score(self, responses):
+        """Score a (sheets x questions) matrix of marked answers in one call.
+
+        Returns (scores, deltas, codes); scores accumulate deltas in question order,
+        exactly like scoring one question at a time.
+        """
+        codes = self.encode(responses)
+        question_indices = np.arange(len(self.questions))
+        deltas = self.delta_table[question_indices, codes]
+        if deltas.shape[1] == 0:
+            return np.zeros(len(deltas)), deltas, codes
+        scores = np.cumsum(deltas, axis=1)[:, -1]
+        return scores, deltas, codes
+
+    def verdicts(self, codes):
+        return self.verdict_table[np.arange(len(self.questions)), codes]
+
+    def verdict_kinds(self, codes):
+        return self.verdict_kind_table[np.arange(len(self.questions)), codes]
+
+
+class ExplanationWriter:
+    """Buffered sink for the evaluation explanations of a whole run.
+
+    Rows of every sheet go into one long-format file keyed by file and question
+    instead of one small csv per sheet. Rows are buffered and flushed in batches.
+    """
+
+    COLUMNS = [
+        "file_id",
+        "question",
+        "marked",
+        "answer",
+        "verdict",
+        "delta",
+        "score",
+        "section",
+    ]
+
+    def __init__(self, output_dir, output_format="csv", buffer_size=5000):
+        if output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                logger.warning(
+                    "pyarrow is not installed; writing evaluation explanations as csv"
+                )
+                output_format = "csv"
+        self.output_format = output_format
+        self.path = os.path.join(output_dir, f"Explanation.{output_format}")
+        self.buffer_size = buffer_size
+        self.rows = []
+        self.parquet_writer = None
+        if output_format == "csv" and not os.path.exists(self.path):
+            self.write_csv_rows([self.COLUMNS])
+
+    def add_rows(self, file_id, explanation_rows):
+        self.rows.extend([file_id, *row] for row in explanation_rows)
+        if len(self.rows) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.output_format == "parquet":
+            self.write_parquet_rows(self.rows)
+        else:
+            self.write_csv_rows(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+    def write_csv_rows(self, rows):
+        with open(self.path, "a", encoding="utf-8", newline="") as f:
+            csv.writer(f, quoting=QUOTE_NONNUMERIC).writerows(rows)
+
+    def write_parquet_rows(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*rows))
+        table = pa.table(
+            {
+                name: pa.array(
+                    values,
+                    type=pa.float64() if name in ("delta", "score") else pa.string(),
+                )
+                for name, values in zip(self.COLUMNS, columns)
+            }
+        )
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self.parquet_writer.write_table(table)
+
+
 class EvaluationConfig:
     """Note: this instance will be reused for multiple omr sheets"""
 
@@ -201,6 +414,10 @@ class EvaluationConfig:
         self.enable_evaluation_table_to_csv = options.get(
             "enable_evaluation_table_to_csv", False
         )
+        self.explanation_output_format = options.get("explanation_output_format", "csv")
+        self.explanation_console_limit = options.get("explanation_console_limit", 10)
+        self.explanation_console_filter = options.get("explanation_console_filter", "*")
+        self.explanations_rendered = 0
 
         if source_type == "csv":
             csv_path = curr_dir.joinpath(options["answer_key_csv_path"])
@@ -245,6 +462,7 @@ class EvaluationConfig:
                     _final_marked,
                     _multi_marked,
                     _multi_roll,
+                    _field_confidences,
                 ) = template.image_instance_ops.read_omr_response(
                     template,
                     image=in_omr,
@@ -315,14 +533,20 @@ class EvaluationConfig:
             answers_in_order
         )
         self.validate_answers(answers_in_order, tuning_config)
+        self.compiled = CompiledEvaluation.from_answer_matchers(
+            self.questions_in_order, self.question_to_answer_matcher
+        )
+        self.reset_item_statistics()
 
     def __str__(self):
         return str(self.path)
 
-    # Externally called methods have higher abstraction level.
-    def prepare_and_validate_omr_response(self, omr_response):
-        self.reset_explanation_table()
+    def reset_item_statistics(self):
+        self.item_statistics = ItemStatistics(self.questions_in_order)
+        return self.item_statistics
 
+    # Externally called methods have higher abstraction level.
+    def validate_omr_response_questions(self, omr_response):
         omr_response_questions = set(omr_response.keys())
         all_questions = set(self.questions_in_order)
         missing_questions = sorted(all_questions.difference(omr_response_questions))
@@ -343,39 +567,66 @@ class EvaluationConfig:
                 f"No answer given for potential questions in OMR response: {missing_prefixed_questions}"
             )
 
-    def match_answer_for_question(self, current_score, question, marked_answer):
-        answer_matcher = self.question_to_answer_matcher[question]
-        question_verdict, delta = answer_matcher.get_verdict_marking(marked_answer)
-        self.conditionally_add_explanation(
-            answer_matcher,
-            delta,
-            marked_answer,
-            question_verdict,
-            question,
-            current_score,
-        )
-        return delta
-
-    def conditionally_print_explanation(self):
-        if self.should_explain_scoring:
-            console.print(self.explanation_table, justify="center")
+    def evaluate_responses(self, omr_responses):
+        """Score many concatenated OMR responses (dicts) in one vectorized call.
+
+        Returns the marked answers of each response, in questions_in_order, and
+        the (scores, deltas, codes) of CompiledEvaluation.score.
+        """
+        for omr_response in omr_responses:
+            self.validate_omr_response_questions(omr_response)
+        marked_answers = [
+            [omr_response[question] for question in self.questions_in_order]
+            for omr_response in omr_responses
+        ]
+        return marked_answers, self.compiled.score(marked_answers)
 
-    # Explanation Table to CSV
-    def conditionally_save_explanation_csv(self, file_path, evaluation_output_dir):
-        if self.enable_evaluation_table_to_csv:
-            data = {col.header: col._cells for col in self.explanation_table.columns}
+    def should_collect_explanation(self):
+        return self.should_explain_scoring or self.enable_evaluation_table_to_csv
 
-            output_path = os.path.join(
-                evaluation_output_dir,
-                f"{file_path.stem}_evaluation.csv",
+    def should_render_explanation(self, file_path):
+        if not self.should_explain_scoring:
+            return False
+        if self.explanations_rendered >= self.explanation_console_limit:
+            return False
+        return fnmatch(file_path.name, self.explanation_console_filter)
+
+    def get_explanation_rows(self, marked_answers, deltas, codes):
+        verdicts = self.compiled.verdicts(codes)
+        scores = np.cumsum(deltas)
+        return [
+            [
+                question,
+                marked_answer,
+                self.question_to_answer_matcher[question].get_answer_explanation(),
+                str.title(question_verdict),
+                round(delta, 2),
+                round(score, 2),
+                self.question_to_answer_matcher[question].get_section_explanation(),
+            ]
+            for question, marked_answer, question_verdict, delta, score in zip(
+                self.questions_in_order,
+                marked_answers,
+                verdicts,
+                deltas.tolist(),
+                scores.tolist(),
             )
+        ]
 
-            pd.DataFrame(data, dtype=str).to_csv(
-                output_path,
-                mode="a",
-                quoting=QUOTE_NONNUMERIC,
-                index=False,
-            )
+    def conditionally_print_explanation(self, file_path, explanation_rows):
+        if not self.should_render_explanation(file_path):
+            return
+        self.explanations_rendered += 1
+        self.prepare_explanation_table()
+        for *cells, section in explanation_rows:
+            row = [str(cell) for cell in cells]
+            if self.has_non_default_section:
+                row.append(section)
+            self.explanation_table.add_row(*row)
+        console.print(self.explanation_table, justify="center")
+
+    def get_explanation_writer(self, evaluation_output_dir):
+        return ExplanationWriter(evaluation_output_dir, self.explanation_output_format)
 
     def get_should_explain_scoring(self):
         return self.should_explain_scoring
@@ -473,14 +724,12 @@ class EvaluationConfig:
         return question_to_answer_matcher
 
     # Then unfolding lower abstraction levels
-    def reset_explanation_table(self):
-        self.explanation_table = None
-        self.prepare_explanation_table()
-
     def prepare_explanation_table(self):
         # TODO: provide a way to export this as csv/pdf
         if not self.should_explain_scoring:
             return
+        from rich.table import Table
+
         table = Table(title="Evaluation Explanation Table", show_lines=True)
         table.add_column("Question")
         table.add_column("Marked")
@@ -496,51 +745,61 @@ class EvaluationConfig:
     def get_marking_scheme_for_question(self, question):
         return self.question_to_scheme.get(question, self.default_marking_scheme)
 
-    def conditionally_add_explanation(
-        self,
-        answer_matcher,
-        delta,
-        marked_answer,
-        question_verdict,
-        question,
-        current_score,
-    ):
-        if self.should_explain_scoring:
-            next_score = current_score + delta
-            # Conditionally add cells
-            row = [
-                item
-                for item in [
-                    question,
-                    marked_answer,
-                    str(answer_matcher),
-                    str.title(question_verdict),
-                    str(round(delta, 2)),
-                    str(round(next_score, 2)),
-                    (
-                        answer_matcher.get_section_explanation()
-                        if self.has_non_default_section
-                        else None
-                    ),
-                ]
-                if item is not None
-            ]
-            self.explanation_table.add_row(*row)
-
 
 def evaluate_concatenated_response(
-    concatenated_response, evaluation_config, file_path, evaluation_output_dir
+    concatenated_response,
+    evaluation_config,
+    file_path,
+    evaluation_output_dir,
+    explanation_writer=None,
 ):
-    evaluation_config.prepare_and_validate_omr_response(concatenated_response)
-    current_score = 0.0
-    for question in evaluation_config.questions_in_order:
-        marked_answer = concatenated_response[question]
-        delta = evaluation_config.match_answer_for_question(
-            current_score, question, marked_answer
-        )
-        current_score += delta
-
-    evaluation_config.conditionally_print_explanation()
-    evaluation_config.conditionally_save_explanation_csv(file_path, evaluation_output_dir)
+    return evaluate_concatenated_responses(
+        [concatenated_response],
+        evaluation_config,
+        [file_path],
+        evaluation_output_dir,
+        explanation_writer,
+    )[0]
+
+
+def evaluate_concatenated_responses(
+    concatenated_responses,
+    evaluation_config,
+    file_paths,
+    evaluation_output_dir,
+    explanation_writer=None,
+):
+    """Scores of many sheets, scored together in one vectorized call"""
+    marked_answers, (scores, deltas, codes) = evaluation_config.evaluate_responses(
+        concatenated_responses
+    )
+    verdict_kinds = evaluation_config.compiled.verdict_kinds(codes)
+    evaluation_config.item_statistics.update_batch(
+        marked_answers,
+        scores,
+        verdict_kinds == CompiledEvaluation.VERDICT_CORRECT,
+        verdict_kinds == CompiledEvaluation.VERDICT_UNMARKED,
+    )
+
+    if evaluation_config.should_collect_explanation():
+        # Callers outside a run get a writer that is closed right away
+        writer = None
+        if evaluation_config.enable_evaluation_table_to_csv:
+            writer = explanation_writer or evaluation_config.get_explanation_writer(
+                evaluation_output_dir
+            )
+        for file_path, sheet_answers, sheet_deltas, sheet_codes in zip(
+            file_paths, marked_answers, deltas, codes
+        ):
+            explanation_rows = evaluation_config.get_explanation_rows(
+                sheet_answers, sheet_deltas, sheet_codes
+            )
+            evaluation_config.conditionally_print_explanation(
+                file_path, explanation_rows
+            )
+            if writer is not None:
+                writer.add_rows(file_path.name, explanation_rows)
+        if writer is not None and explanation_writer is None:
+            writer.close()
 
-    return current_score
+    return scores.tolist()
@@ -0,0 +1,166 @@
+"""
+Online item analysis: difficulty, discrimination and distractor counts.
+
+The aggregates are updated as each sheet is graded, so item statistics of a
+running (or finished) batch can be read in O(questions) time without rereading
+the results.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class ItemStatistics:
+    """Running per-question aggregates over graded sheets.
+
+    Keeps option counts per question, the running mean and variance of the
+    total score (Welford / Chan et al.) and, per question, the number and score
+    sum of the students who answered it correctly. Point-biserial
+    discrimination follows from these sums without revisiting any sheet.
+    """
+
+    def __init__(self, questions):
+        self.questions = list(questions)
+        n_questions = len(self.questions)
+        self.sheets = 0
+        self.score_mean = 0.0
+        self.score_m2 = 0.0
+        self.correct_counts = np.zeros(n_questions, dtype=np.int64)
+        self.unmarked_counts = np.zeros(n_questions, dtype=np.int64)
+        self.correct_score_sums = np.zeros(n_questions, dtype=np.float64)
+        self.option_counts = [Counter() for _ in range(n_questions)]
+        self.correct_options = [set() for _ in range(n_questions)]
+        self.lock = threading.Lock()
+
+    def update(self, answers, score, correct, unmarked):
+        """Add one graded sheet; arguments are aligned with `questions`."""
+        self.update_batch([answers], [score], [correct], [unmarked])
+
+    def update_batch(self, answers, scores, correct, unmarked):
+        """Add many graded sheets given as (sheets, questions) arrays."""
+        answers = np.asarray(answers, dtype=str)
+        scores = np.asarray(scores, dtype=np.float64)
+        correct = np.asarray(correct, dtype=bool)
+        unmarked = np.asarray(unmarked, dtype=bool)
+        if len(scores) == 0:
+            return
+
+        with self.lock:
+            # Chan et al. parallel update of the running mean and M2
+            batch_count = len(scores)
+            batch_mean = float(scores.mean())
+            batch_m2 = float(((scores - batch_mean) ** 2).sum())
+            total = self.sheets + batch_count
+            delta = batch_mean - self.score_mean
+            self.score_mean += delta * batch_count / total
+            self.score_m2 += (
+                batch_m2 + delta * delta * self.sheets * batch_count / total
+            )
+            self.sheets = total
+
+            self.correct_counts += correct.sum(axis=0)
+            self.unmarked_counts += unmarked.sum(axis=0)
+            self.correct_score_sums += (correct * scores[:, None]).sum(axis=0)
+
+            for index, (column, correct_column, unmarked_column) in enumerate(
+                zip(answers.T, correct.T, unmarked.T)
+            ):
+                self.option_counts[index].update(column[~unmarked_column].tolist())
+                self.correct_options[index].update(column[correct_column].tolist())
+
+    def snapshot(self):
+        """Current statistics as a JSON-serialisable dict."""
+        with self.lock:
+            sheets = self.sheets
+            mean = self.score_mean
+            variance = self.score_m2 / sheets if sheets else 0.0
+            correct_counts = self.correct_counts.copy()
+            unmarked_counts = self.unmarked_counts.copy()
+            correct_score_sums = self.correct_score_sums.copy()
+            option_counts = [dict(counts) for counts in self.option_counts]
+            correct_options = [set(options) for options in self.correct_options]
+
+        std = variance**0.5
+        items = []
+        for index, question in enumerate(self.questions):
+            correct_count = int(correct_counts[index])
+            difficulty = correct_count / sheets if sheets else None
+            discrimination = None
+            if std > 0 and 0 < correct_count < sheets:
+                correct_mean = correct_score_sums[index] / correct_count
+                discrimination = float(
+                    (correct_mean - mean) / std * (difficulty / (1 - difficulty)) ** 0.5
+                )
+            distractors = sorted(
+                (
+                    {
+                        "option": option,
+                        "count": count,
+                        "proportion": count / sheets,
+                    }
+                    for option, count in option_counts[index].items()
+                    if option not in correct_options[index]
+                ),
+                key=lambda distractor: (-distractor["count"], distractor["option"]),
+            )
+            items.append(
+                {
+                    "question": question,
+                    "difficulty": difficulty,
+                    "discrimination": discrimination,
+                    "omit_rate": int(unmarked_counts[index]) / sheets
+                    if sheets
+                    else None,
+                    "option_counts": option_counts[index],
+                    "distractors": distractors,
+                }
+            )
+
+        return {
+            "sheets": sheets,
+            "mean_score": mean if sheets else None,
+            "score_variance": variance if sheets else None,
+            "items": items,
+        }
+
+
+# Statistics of the batches run in this process, keyed by their output directory.
+# Finished batches stay readable until MAX_LIVE_ITEM_STATISTICS newer ones replace them.
+LIVE_ITEM_STATISTICS = OrderedDict()
+MAX_LIVE_ITEM_STATISTICS = 256
+_live_lock = threading.Lock()
+
+
+def register_live_statistics(output_dir, item_statistics):
+    key = Path(output_dir).resolve().as_posix()
+    with _live_lock:
+        LIVE_ITEM_STATISTICS.pop(key, None)
+        LIVE_ITEM_STATISTICS[key] = item_statistics
+        while len(LIVE_ITEM_STATISTICS) > MAX_LIVE_ITEM_STATISTICS:
+            LIVE_ITEM_STATISTICS.popitem(last=False)
+
+
+def unregister_live_statistics_under(root_dir):
+    """Forget the statistics registered at or below `root_dir`"""
+    root = Path(root_dir).resolve()
+    with _live_lock:
+        for output_dir in list(LIVE_ITEM_STATISTICS):
+            path = Path(output_dir)
+            if path == root or root in path.parents:
+                del LIVE_ITEM_STATISTICS[output_dir]
+
+
+def live_statistics_under(root_dir):
+    """Map of directory (relative to `root_dir`) to the ItemStatistics registered below it."""
+    root = Path(root_dir).resolve()
+    with _live_lock:
+        entries = list(LIVE_ITEM_STATISTICS.items())
+    found = {}
+    for output_dir, item_statistics in entries:
+        path = Path(output_dir)
+        if path == root or root in path.parents:
+            found[path.relative_to(root).as_posix()] = item_statistics
+    return found
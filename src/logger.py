@@ -1,17 +1,36 @@
 import logging
+import os
 from typing import Union
 
-from rich.console import Console
-from rich.logging import RichHandler
-
 FORMAT = "%(message)s"
 
+# Headless workers and short CLI runs can skip importing rich entirely
+FAST_STARTUP = os.environ.get("OMR_FAST_STARTUP", "0").lower() in {
+    "1",
+    "true",
+    "yes",
+    "on",
+}
+
+
+def get_log_handler():
+    if FAST_STARTUP:
+        handler = logging.StreamHandler()
+        handler.setFormatter(
+            logging.Formatter("[%(asctime)s] %(levelname)-8s %(message)s", "%X")
+        )
+        return handler
+    from rich.logging import RichHandler
+
+    return RichHandler(rich_tracebacks=True)
+
+
 # TODO: set logging level from config.json dynamically
 logging.basicConfig(
     level=logging.INFO,
     format="%(message)s",
     datefmt="[%X]",
-    handlers=[RichHandler(rich_tracebacks=True)],
+    handlers=[get_log_handler()],
 )
 
 
@@ -64,5 +83,18 @@ class Logger:
         return func(sep.join(msg), stacklevel=4)
 
 
+class LazyConsole:
+    """rich Console created on first use, so that importing the logger stays cheap"""
+
+    _console = None
+
+    def __getattr__(self, name):
+        if LazyConsole._console is None:
+            from rich.console import Console
+
+            LazyConsole._console = Console()
+        return getattr(LazyConsole._console, name)
+
+
 logger = Logger(__name__)
-console = Console()
+console = LazyConsole()
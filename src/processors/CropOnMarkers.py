@@ -27,7 +27,6 @@ class CropOnMarkers(ImagePreprocessor):
         super().__init__(*args, **kwargs)
         config = self.tuning_config
         marker_ops = self.options
-        self.threshold_circles = []
         # img_utils = ImageUtils()
 
         # options with defaults
@@ -49,7 +48,63 @@ class CropOnMarkers(ImagePreprocessor):
     def exclude_files(self):
         return [self.marker_path]
 
-    def apply_filter(self, image, file_path):
+    applies_geometry = True
+
+    def get_transform(self, image, file_path):
+        found = self.find_marker_centres(image, file_path)
+        if found is None:
+            return None
+        centres, _image_eroded_sub = found
+        return ImageUtils.four_point_transform_matrix(np.array(centres))
+
+    def apply_filter_batch(self, images, file_paths):
+        # The rescaled markers are the same for every sheet, make them once per chunk
+        rescaled_markers = self.get_rescaled_markers()
+        return [
+            self.apply_filter(image, file_path, rescaled_markers)
+            for image, file_path in zip(images, file_paths)
+        ]
+
+    def apply_filter(self, image, file_path, rescaled_markers=None):
+        config = self.tuning_config
+        found = self.find_marker_centres(image, file_path, rescaled_markers)
+        if found is None:
+            return None
+        centres, image_eroded_sub = found
+
+        image = ImageUtils.four_point_transform(image, np.array(centres))
+        # appendSaveImg(1,image_eroded_sub)
+        # appendSaveImg(1,image_norm)
+
+        # Debugging image -
+        # res = cv2.matchTemplate(image_eroded_sub,optimal_marker,cv2.TM_CCOEFF_NORMED)
+        # res[ : , midw:midw+2] = 255
+        # res[ midh:midh+2, : ] = 255
+        # show("Markers Matching",res)
+        if config.outputs.show_image_level >= 2 and config.outputs.show_image_level < 4:
+            image_eroded_sub = ImageUtils.resize_util_h(
+                image_eroded_sub, image.shape[0]
+            )
+            image_eroded_sub[:, -DEFAULT_BORDER_REMOVE:] = DEFAULT_BLACK_COLOR
+            h_stack = np.hstack((image_eroded_sub, image))
+            InteractionUtils.show(
+                f"Warped: {file_path}",
+                ImageUtils.resize_util(
+                    h_stack, int(config.dimensions.display_width * 1.6)
+                ),
+                0,
+                0,
+                [0, 0],
+                config=config,
+            )
+        # iterations : Tuned to 2.
+        # image_eroded_sub = image_norm - cv2.erode(image_norm, kernel=np.ones((5,5)),iterations=2)
+        return image
+
+    def find_marker_centres(self, image, file_path, rescaled_markers=None):
+        """Centres of the four corner markers and the matching debug image, or None"""
+        if rescaled_markers is None:
+            rescaled_markers = self.get_rescaled_markers()
         config = self.tuning_config
         image_instance_ops = self.image_instance_ops
         image_eroded_sub = ImageUtils.normalize_util(
@@ -81,15 +136,13 @@ class CropOnMarkers(ImagePreprocessor):
         image_eroded_sub[:, midw : midw + 2] = DEFAULT_WHITE_COLOR
         image_eroded_sub[midh : midh + 2, :] = DEFAULT_WHITE_COLOR
 
-        best_scale, all_max_t = self.getBestMatch(image_eroded_sub)
+        best_scale, all_max_t = self.getBestMatch(image_eroded_sub, rescaled_markers)
         if best_scale is None:
             if config.outputs.show_image_level >= 1:
                 InteractionUtils.show("Quads", image_eroded_sub, config=config)
             return None
 
-        optimal_marker = ImageUtils.resize_util_h(
-            self.marker, u_height=int(self.marker.shape[0] * best_scale)
-        )
+        optimal_marker = rescaled_markers[best_scale]
         _h, w = optimal_marker.shape[:2]
         centres = []
         sum_t, max_t = 0, 0
@@ -155,38 +208,10 @@ class CropOnMarkers(ImagePreprocessor):
 
         logger.info(quarter_match_log)
         logger.info(f"Optimal Scale: {best_scale}")
-        # analysis data
-        self.threshold_circles.append(sum_t / 4)
-
-        image = ImageUtils.four_point_transform(image, np.array(centres))
-        # appendSaveImg(1,image_eroded_sub)
-        # appendSaveImg(1,image_norm)
+        logger.debug(f"Mean marker match: {round(sum_t / 4, 3)}")
 
         image_instance_ops.append_save_img(2, image_eroded_sub)
-        # Debugging image -
-        # res = cv2.matchTemplate(image_eroded_sub,optimal_marker,cv2.TM_CCOEFF_NORMED)
-        # res[ : , midw:midw+2] = 255
-        # res[ midh:midh+2, : ] = 255
-        # show("Markers Matching",res)
-        if config.outputs.show_image_level >= 2 and config.outputs.show_image_level < 4:
-            image_eroded_sub = ImageUtils.resize_util_h(
-                image_eroded_sub, image.shape[0]
-            )
-            image_eroded_sub[:, -DEFAULT_BORDER_REMOVE:] = DEFAULT_BLACK_COLOR
-            h_stack = np.hstack((image_eroded_sub, image))
-            InteractionUtils.show(
-                f"Warped: {file_path}",
-                ImageUtils.resize_util(
-                    h_stack, int(config.dimensions.display_width * 1.6)
-                ),
-                0,
-                0,
-                [0, 0],
-                config=config,
-            )
-        # iterations : Tuned to 2.
-        # image_eroded_sub = image_norm - cv2.erode(image_norm, kernel=np.ones((5,5)),iterations=2)
-        return image
+        return centres, image_eroded_sub
 
     def load_marker(self, marker_ops, config):
         if not os.path.exists(self.marker_path):
@@ -226,17 +251,13 @@ class CropOnMarkers(ImagePreprocessor):
 
         return marker
 
-    # Resizing the marker within scaleRange at rate of descent_per_step to
-    # find the best match.
-    def getBestMatch(self, image_eroded_sub):
-        config = self.tuning_config
+    def get_rescaled_markers(self):
+        """Marker resized to each scale of marker_rescale_range, by scale (largest first)"""
         descent_per_step = (
             self.marker_rescale_range[1] - self.marker_rescale_range[0]
         ) // self.marker_rescale_steps
         _h, _w = self.marker.shape[:2]
-        res, best_scale = None, None
-        all_max_t = 0
-
+        rescaled_markers = {}
         for r0 in np.arange(
             self.marker_rescale_range[1],
             self.marker_rescale_range[0],
@@ -245,9 +266,21 @@ class CropOnMarkers(ImagePreprocessor):
             s = float(r0 * 1 / 100)
             if s == 0.0:
                 continue
-            rescaled_marker = ImageUtils.resize_util_h(
+            rescaled_markers[s] = ImageUtils.resize_util_h(
                 self.marker, u_height=int(_h * s)
             )
+        return rescaled_markers
+
+    # Resizing the marker within scaleRange at rate of descent_per_step to
+    # find the best match.
+    def getBestMatch(self, image_eroded_sub, rescaled_markers=None):
+        config = self.tuning_config
+        if rescaled_markers is None:
+            rescaled_markers = self.get_rescaled_markers()
+        res, best_scale = None, None
+        all_max_t = 0
+
+        for s, rescaled_marker in rescaled_markers.items():
             # res is the black image with white dots
             res = cv2.matchTemplate(
                 image_eroded_sub, rescaled_marker, cv2.TM_CCOEFF_NORMED
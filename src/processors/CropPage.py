@@ -7,11 +7,13 @@ import numpy as np
 from src.constants.image_processing import (
     APPROX_POLY_EPSILON_FACTOR,
     CANNY_PARAMS,
+    CORNER_REFINE_MIN_WINDOW,
     DEFAULT_CONTOUR_COLOR,
     DEFAULT_CONTOUR_FILL_COLOR,
     DEFAULT_CONTOUR_FILL_WIDTH,
     DEFAULT_CONTOUR_LINE_WIDTH,
     DEFAULT_GAUSSIAN_BLUR_KERNEL,
+    DEFAULT_PAGE_DETECTION_MAX_DIMENSION,
     MAX_COSINE_THRESHOLD,
     MIN_PAGE_AREA_THRESHOLD,
     PAGE_THRESHOLD_PARAMS,
@@ -62,12 +64,32 @@ class CropPage(ImagePreprocessor):
         self.morph_kernel = tuple(
             int(x) for x in cropping_ops.get("morphKernel", [10, 10])
         )
+        self.detection_max_dimension = int(
+            cropping_ops.get(
+                "detectionMaxDimension", DEFAULT_PAGE_DETECTION_MAX_DIMENSION
+            )
+        )
+
+    applies_geometry = True
+
+    def get_transform(self, image, file_path):
+        image = normalize(cv2.GaussianBlur(image, DEFAULT_GAUSSIAN_BLUR_KERNEL, 0))
+        sheet = self.find_page_corners(image, file_path)
+        if len(sheet) == 0:
+            logger.warning(
+                f"\tWarning: Paper boundary not found for: '{file_path}'. "
+                "Skipping CropPage and continuing with the original image."
+            )
+            return np.eye(3), (image.shape[1], image.shape[0])
+
+        logger.info(f"Found page corners: \t {sheet.tolist()}")
+        return ImageUtils.four_point_transform_matrix(sheet)
 
     def apply_filter(self, image, file_path):
         image = normalize(cv2.GaussianBlur(image, DEFAULT_GAUSSIAN_BLUR_KERNEL, 0))
 
         # Resize should be done with another preprocessor is needed
-        sheet = self.find_page(image, file_path)
+        sheet = self.find_page_corners(image, file_path)
         if len(sheet) == 0:
             logger.warning(
                 f"\tWarning: Paper boundary not found for: '{file_path}'. "
@@ -83,7 +105,41 @@ class CropPage(ImagePreprocessor):
         # Return preprocessed image
         return image
 
-    def find_page(self, image, file_path):
+    def find_page_corners(self, image, file_path):
+        """Detect the page on a downscaled proxy, then refine its corners at full resolution"""
+        if self.detection_max_dimension <= 0:
+            return self.find_page(image, file_path)
+        # Integer factors keep INTER_AREA on its fast block-averaging path
+        factor = int(np.ceil(max(image.shape[:2]) / self.detection_max_dimension))
+        if factor <= 1:
+            return self.find_page(image, file_path)
+
+        scale = 1.0 / factor
+        proxy = cv2.resize(
+            image,
+            (image.shape[1] // factor, image.shape[0] // factor),
+            interpolation=cv2.INTER_AREA,
+        )
+        sheet = self.find_page(proxy, file_path, scale=scale)
+        if len(sheet) == 0:
+            return sheet
+
+        corners = (sheet.astype(np.float32) + 0.5) / scale - 0.5
+        # Polygon vertices on the proxy can be off by a couple of proxy pixels
+        half_window = max(CORNER_REFINE_MIN_WINDOW, int(np.ceil(3 / scale)))
+        refined = cv2.cornerSubPix(
+            image,
+            corners.reshape(-1, 1, 2).copy(),
+            (half_window, half_window),
+            (-1, -1),
+            (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01),
+        ).reshape(4, 2)
+        # Keep the proxy estimate where the search wandered off (e.g. a rounded corner)
+        drift = np.linalg.norm(refined - corners, axis=1)
+        refined[drift > half_window] = corners[drift > half_window]
+        return refined
+
+    def find_page(self, image, file_path, scale=1.0):
         config = self.tuning_config
 
         image = normalize(image)
@@ -96,7 +152,8 @@ class CropPage(ImagePreprocessor):
         )
         image = normalize(image)
 
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, self.morph_kernel)
+        morph_kernel = tuple(max(1, round(size * scale)) for size in self.morph_kernel)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, morph_kernel)
 
         # Close the small holes, i.e. Complete the edges on canny image
         closed = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
@@ -117,7 +174,7 @@ class CropPage(ImagePreprocessor):
         cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:5]
         sheet = []
         for c in cnts:
-            if cv2.contourArea(c) < MIN_PAGE_AREA_THRESHOLD:
+            if cv2.contourArea(c) < MIN_PAGE_AREA_THRESHOLD * scale * scale:
                 continue
             peri = cv2.arcLength(c, True)
             approx = cv2.approxPolyDP(
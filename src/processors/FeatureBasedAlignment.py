@@ -2,16 +2,44 @@
 Image based feature alignment
 Credits: https://www.learnopencv.com/image-alignment-feature-based-using-opencv-c-python/
 """
+import hashlib
+
 import cv2
 import numpy as np
 
-from src.processors.interfaces.ImagePreprocessor import ImagePreprocessor
-from src.utils.image import ImageUtils
-from src.utils.interaction import InteractionUtils
 from src.constants.image_processing import (
+    DEFAULT_GOOD_MATCH_PERCENT,
     DEFAULT_MAX_FEATURES,
-    DEFAULT_GOOD_MATCH_PERCENT
+    DEFAULT_RATIO_TEST,
+    FEATURE_CACHE_SUFFIX,
+    FEATURE_CACHE_VERSION,
+    FLANN_LSH_INDEX_PARAMS,
+    FLANN_LSH_SEARCH_PARAMS,
 )
+from src.logger import logger
+from src.processors.interfaces.ImagePreprocessor import ImagePreprocessor
+from src.utils.image import ImageUtils
+from src.utils.interaction import InteractionUtils
+
+# cv2.KeyPoint fields persisted in the reference feature cache
+KEYPOINT_FIELDS = ["x", "y", "size", "angle", "response", "octave", "class_id"]
+
+
+def keypoints_to_array(keypoints):
+    return np.array(
+        [
+            (*kp.pt, kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+            for kp in keypoints
+        ],
+        dtype=np.float32,
+    ).reshape(-1, len(KEYPOINT_FIELDS))
+
+
+def array_to_keypoints(array):
+    return [
+        cv2.KeyPoint(x, y, size, angle, response, int(octave), int(class_id))
+        for x, y, size, angle, response, octave, class_id in array.tolist()
+    ]
 
 
 class FeatureBasedAlignment(ImagePreprocessor):
@@ -32,11 +60,18 @@ class FeatureBasedAlignment(ImagePreprocessor):
         self.max_features = int(options.get("maxFeatures", DEFAULT_MAX_FEATURES))
         self.good_match_percent = options.get("goodMatchPercent", DEFAULT_GOOD_MATCH_PERCENT)
         self.transform_2_d = options.get("2d", False)
-        # Extract keypoints and description of source image
+        # "bruteforce" keeps the best goodMatchPercent of all matches,
+        # "knn" and "flann" keep matches passing Lowe's ratio test
+        self.matcher_type = options.get("matcher", "bruteforce")
+        self.ratio_test = options.get("ratioTest", DEFAULT_RATIO_TEST)
+        # Detect features on a downscaled copy (1.0 = processing resolution)
+        self.detection_scale = float(options.get("detectionScale", 1.0))
+
         self.orb = cv2.ORB_create(self.max_features)
-        self.to_keypoints, self.to_descriptors = self.orb.detectAndCompute(
-            self.ref_img, None
-        )
+        # Extract keypoints and description of source image (or load them from cache)
+        self.to_keypoints, self.to_descriptors = self.load_reference_features()
+        self.to_points = keypoints_to_array(self.to_keypoints)[:, :2]
+        self.matcher = self.create_matcher()
 
     def __str__(self):
         return self.ref_path.name
@@ -44,33 +79,145 @@ class FeatureBasedAlignment(ImagePreprocessor):
     def exclude_files(self):
         return [self.ref_path]
 
-    def apply_filter(self, image, _file_path):
-        config = self.tuning_config
-        # Convert images to grayscale
-        # im1Gray = cv2.cvtColor(im1, cv2.COLOR_BGR2GRAY)
-        # im2Gray = cv2.cvtColor(im2, cv2.COLOR_BGR2GRAY)
+    def create_matcher(self):
+        if self.matcher_type == "flann":
+            matcher = cv2.FlannBasedMatcher(
+                FLANN_LSH_INDEX_PARAMS, FLANN_LSH_SEARCH_PARAMS
+            )
+        else:
+            matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        # Train once on the reference descriptors, reused for every sheet
+        if self.to_descriptors is not None:
+            matcher.add([self.to_descriptors])
+            matcher.train()
+        return matcher
 
-        image = cv2.normalize(image, 0, 255, norm_type=cv2.NORM_MINMAX)
+    def detect_features(self, image):
+        """ORB keypoints (in processing-resolution coordinates) and descriptors"""
+        scale = self.detection_scale
+        if scale == 1.0:
+            return self.orb.detectAndCompute(image, None)
+        small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        keypoints, descriptors = self.orb.detectAndCompute(small, None)
+        for keypoint in keypoints:
+            keypoint.pt = (keypoint.pt[0] / scale, keypoint.pt[1] / scale)
+            keypoint.size /= scale
+        return keypoints, descriptors
 
-        # Detect ORB features and compute descriptors.
-        from_keypoints, from_descriptors = self.orb.detectAndCompute(image, None)
+    def get_feature_cache_path(self):
+        return self.ref_path.with_name(f".{self.ref_path.name}{FEATURE_CACHE_SUFFIX}")
 
-        # Match features.
-        matcher = cv2.DescriptorMatcher_create(
-            cv2.DESCRIPTOR_MATCHER_BRUTEFORCE_HAMMING
+    def get_feature_cache_key(self):
+        with open(self.ref_path, "rb") as f:
+            ref_hash = hashlib.sha1(f.read()).hexdigest()
+        return "|".join(
+            str(part)
+            for part in [
+                FEATURE_CACHE_VERSION,
+                cv2.__version__,
+                ref_hash,
+                self.ref_img.shape,
+                self.max_features,
+                self.detection_scale,
+            ]
         )
 
-        # create BFMatcher object (alternate matcher)
-        # matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+    def load_reference_features(self):
+        cache_path = self.get_feature_cache_path()
+        cache_key = self.get_feature_cache_key()
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if str(cached["key"]) == cache_key:
+                    descriptors = cached["descriptors"]
+                    return (
+                        array_to_keypoints(cached["keypoints"]),
+                        descriptors if len(descriptors) else None,
+                    )
+        except (OSError, KeyError, ValueError):
+            pass
+
+        keypoints, descriptors = self.detect_features(self.ref_img)
+        try:
+            with open(cache_path, "wb") as f:
+                np.savez(
+                    f,
+                    key=np.array(cache_key),
+                    keypoints=keypoints_to_array(keypoints),
+                    descriptors=(
+                        descriptors
+                        if descriptors is not None
+                        else np.zeros((0, 32), dtype=np.uint8)
+                    ),
+                )
+        except OSError as error:
+            logger.warning(f"Could not write feature cache '{cache_path}': {error}")
+        return keypoints, descriptors
+
+    def query_matcher(self, from_descriptors):
+        """Raw matches, one entry (a match or a k=2 pair) per descriptor in order"""
+        if self.matcher_type == "bruteforce":
+            return self.matcher.match(from_descriptors)
+        return self.matcher.knnMatch(from_descriptors, k=2)
 
-        matches = np.array(matcher.match(from_descriptors, self.to_descriptors, None))
+    def match_features(self, from_descriptors):
+        return self.select_matches(self.query_matcher(from_descriptors))
 
-        # Sort matches by score
-        matches = sorted(matches, key=lambda x: x.distance, reverse=False)
+    def match_features_batch(self, descriptors_list):
+        """match_features for several images with a single matcher call"""
+        selected = [[] for _ in descriptors_list]
+        present = [i for i, d in enumerate(descriptors_list) if d is not None]
+        if not present or self.to_descriptors is None:
+            return selected
 
-        # Remove not so good matches
-        num_good_matches = int(len(matches) * self.good_match_percent)
-        matches = matches[:num_good_matches]
+        offsets = np.cumsum([0] + [len(descriptors_list[i]) for i in present])
+        raw_matches = self.query_matcher(
+            np.vstack([descriptors_list[i] for i in present])
+        )
+        for position, index in enumerate(present):
+            start, end = offsets[position], offsets[position + 1]
+            image_matches = raw_matches[start:end]
+            # Make queryIdx relative to this image's keypoints again
+            for entry in image_matches:
+                for match in entry if isinstance(entry, (list, tuple)) else [entry]:
+                    match.queryIdx -= int(start)
+            selected[index] = self.select_matches(image_matches)
+        return selected
+
+    def select_matches(self, matches):
+        if self.matcher_type == "bruteforce":
+            # Keep the best goodMatchPercent of matches by distance
+            distances = np.fromiter(
+                (match.distance for match in matches), np.float32, len(matches)
+            )
+            num_good_matches = int(len(matches) * self.good_match_percent)
+            order = np.argsort(distances, kind="stable")[:num_good_matches]
+            return [matches[i] for i in order.tolist()]
+
+        ratio = self.ratio_test
+        return [
+            pair[0]
+            for pair in matches
+            if len(pair) == 2 and pair[0].distance < ratio * pair[1].distance
+        ]
+
+    def find_alignment(self, image, file_path, features=None, matches=None):
+        """Affine (2x3, with "2d") or homography (3x3) matrix onto the reference, or None"""
+        config = self.tuning_config
+        # Detect ORB features and compute descriptors.
+        if features is None:
+            features = self.detect_features(image)
+        from_keypoints, from_descriptors = features
+
+        if matches is None:
+            matches = []
+            if from_descriptors is not None and self.to_descriptors is not None:
+                matches = self.match_features(from_descriptors)
+        if len(matches) < 4:
+            logger.warning(
+                f"\tWarning: Not enough feature matches ({len(matches)}) for: '{file_path}'. "
+                "Skipping FeatureBasedAlignment and continuing with the original image."
+            )
+            return None
 
         # Draw top matches
         if config.outputs.show_image_level > 2:
@@ -80,19 +227,63 @@ class FeatureBasedAlignment(ImagePreprocessor):
             InteractionUtils.show("Aligning", im_matches, resize=True, config=config)
 
         # Extract location of good matches
-        points1 = np.zeros((len(matches), 2), dtype=np.float32)
-        points2 = np.zeros((len(matches), 2), dtype=np.float32)
-
-        for i, match in enumerate(matches):
-            points1[i, :] = from_keypoints[match.queryIdx].pt
-            points2[i, :] = self.to_keypoints[match.trainIdx].pt
+        query_idx = np.fromiter((m.queryIdx for m in matches), np.int32, len(matches))
+        train_idx = np.fromiter((m.trainIdx for m in matches), np.int32, len(matches))
+        from_points = np.float32([kp.pt for kp in from_keypoints])
+        points1 = from_points[query_idx]
+        points2 = self.to_points[train_idx]
 
         # Find homography
-        height, width = self.ref_img.shape
         if self.transform_2_d:
             m, _inliers = cv2.estimateAffine2D(points1, points2)
-            return cv2.warpAffine(image, m, (width, height))
+            return m
 
         # Use homography
         h, _mask = cv2.findHomography(points1, points2, cv2.RANSAC)
-        return cv2.warpPerspective(image, h, (width, height))
+        return h
+
+    applies_geometry = True
+
+    def get_transform(self, image, file_path):
+        image = cv2.normalize(image, 0, 255, norm_type=cv2.NORM_MINMAX)
+        matrix = self.find_alignment(image, file_path)
+        if matrix is None:
+            return np.eye(3), (image.shape[1], image.shape[0])
+        if matrix.shape[0] == 2:
+            matrix = np.vstack([matrix, [0, 0, 1]])
+        height, width = self.ref_img.shape
+        return matrix, (width, height)
+
+    def apply_filter_batch(self, images, file_paths):
+        images = [
+            cv2.normalize(image, 0, 255, norm_type=cv2.NORM_MINMAX) for image in images
+        ]
+        features = [self.detect_features(image) for image in images]
+        # One query against the trained matcher for the whole chunk
+        matches = self.match_features_batch([descriptors for _, descriptors in features])
+        return [
+            self.warp_to_reference(
+                image,
+                self.find_alignment(image, file_path, image_features, image_matches),
+            )
+            for image, file_path, image_features, image_matches in zip(
+                images, file_paths, features, matches
+            )
+        ]
+
+    def apply_filter(self, image, file_path):
+        # Convert images to grayscale
+        # im1Gray = cv2.cvtColor(im1, cv2.COLOR_BGR2GRAY)
+        # im2Gray = cv2.cvtColor(im2, cv2.COLOR_BGR2GRAY)
+
+        image = cv2.normalize(image, 0, 255, norm_type=cv2.NORM_MINMAX)
+        return self.warp_to_reference(image, self.find_alignment(image, file_path))
+
+    def warp_to_reference(self, image, matrix):
+        if matrix is None:
+            return image
+
+        height, width = self.ref_img.shape
+        if self.transform_2_d:
+            return cv2.warpAffine(image, matrix, (width, height))
+        return cv2.warpPerspective(image, matrix, (width, height))
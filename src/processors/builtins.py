@@ -36,6 +36,10 @@ class Levels(ImagePreprocessor):
     def apply_filter(self, image, _file_path):
         return cv2.LUT(image, self.gamma)
 
+    def apply_filter_batch(self, images, _file_paths):
+        # In place: skips allocating an output image per sheet
+        return [cv2.LUT(image, self.gamma, dst=image) for image in images]
+
 
 class MedianBlur(ImagePreprocessor):
     def __init__(self, *args, **kwargs):
@@ -46,6 +50,9 @@ class MedianBlur(ImagePreprocessor):
     def apply_filter(self, image, _file_path):
         return cv2.medianBlur(image, self.kSize)
 
+    def apply_filter_batch(self, images, _file_paths):
+        return [cv2.medianBlur(image, self.kSize, dst=image) for image in images]
+
 
 class GaussianBlur(ImagePreprocessor):
     def __init__(self, *args, **kwargs):
@@ -56,3 +63,9 @@ class GaussianBlur(ImagePreprocessor):
 
     def apply_filter(self, image, _file_path):
         return cv2.GaussianBlur(image, self.kSize, self.sigmaX)
+
+    def apply_filter_batch(self, images, _file_paths):
+        return [
+            cv2.GaussianBlur(image, self.kSize, self.sigmaX, dst=image)
+            for image in images
+        ]
@@ -12,6 +12,23 @@ class ImagePreprocessor(Processor):
         """Apply filter to the image and returns modified image"""
         raise NotImplementedError
 
+    def apply_filter_batch(self, images, filenames):
+        """Apply filter to a chunk of images; returns a list aligned with `images`
+        (None for images that failed). The images belong to the runner, so an
+        override may modify them in place or share precomputation across the chunk."""
+        return [
+            self.apply_filter(image, filename)
+            for image, filename in zip(images, filenames)
+        ]
+
+    # Geometric preprocessors (crops, alignment) set this and implement get_transform
+    applies_geometry = False
+
+    def get_transform(self, image, filename):
+        """Returns (3x3 matrix, (width, height)) mapping the image to this step's output,
+        or None if the step failed. Used to resample the input image only once."""
+        raise NotImplementedError
+
     @staticmethod
     def exclude_files():
         """Returns a list of file paths that should be excluded from processing"""
@@ -2,8 +2,8 @@
 Processor/Extension framework
 Adapated from https://github.com/gdiepen/python_processor_example
 """
+import importlib
 import inspect
-import pkgutil
 
 from src.logger import logger
 
@@ -24,56 +24,75 @@ class Processor:
         self.description = "UNKNOWN"
 
 
+# Built-in processors: name -> module defining a class of that name.
+# Modules are imported only when a template uses the processor.
+BUILTIN_PROCESSORS = {
+    "CropOnMarkers": "src.processors.CropOnMarkers",
+    "CropPage": "src.processors.CropPage",
+    "FeatureBasedAlignment": "src.processors.FeatureBasedAlignment",
+    "GaussianBlur": "src.processors.builtins",
+    "Levels": "src.processors.builtins",
+    "MedianBlur": "src.processors.builtins",
+}
+
+# Third-party packages register processors as `Name = "package.module:ClassName"`
+PROCESSOR_ENTRY_POINT_GROUP = "omr_optic.processors"
+
+
 class ProcessorManager:
-    """Upon creation, this class will read the processors package for modules
-    that contain a class definition that is inheriting from the Processor class
+    """Registry of processor names, resolving each to its class on first use.
+
+    Built-in names come from BUILTIN_PROCESSORS; installed packages can add
+    more through the PROCESSOR_ENTRY_POINT_GROUP entry points, which are only
+    scanned when a name is not built in.
     """
 
-    def __init__(self, processors_dir="src.processors"):
-        """Constructor that initiates the reading of all available processors
-        when an instance of the ProcessorCollection object is created
-        """
-        self.processors_dir = processors_dir
-        self.reload_processors()
+    def __init__(self, builtin_processors=None):
+        self.manifest = dict(
+            BUILTIN_PROCESSORS if builtin_processors is None else builtin_processors
+        )
+        self.entry_points = None
+        # Resolved processor classes by name
+        self.processors = {}
 
-    @staticmethod
-    def get_name_filter(processor_name):
-        def filter_function(member):
-            return inspect.isclass(member) and member.__module__ == processor_name
+    def load_entry_points(self):
+        if self.entry_points is None:
+            from importlib.metadata import entry_points
 
-        return filter_function
+            self.entry_points = {
+                entry_point.name: entry_point
+                for entry_point in entry_points(group=PROCESSOR_ENTRY_POINT_GROUP)
+            }
+        return self.entry_points
 
-    def reload_processors(self):
-        """Reset the list of all processors and initiate the walk over the main
-        provided processor package to load all available processors
-        """
-        self.processors = {}
-        self.seen_paths = []
+    def available_processors(self):
+        return sorted({*self.manifest, *self.load_entry_points()})
+
+    def get_processor(self, processor_name):
+        """Class of the named processor, importing its module on first use"""
+        if processor_name in self.processors:
+            return self.processors[processor_name]
 
-        logger.info(f'Loading processors from "{self.processors_dir}"...')
-        self.walk_package(self.processors_dir)
+        if processor_name in self.manifest:
+            module = importlib.import_module(self.manifest[processor_name])
+            processor_class = getattr(module, processor_name)
+        elif processor_name in self.load_entry_points():
+            processor_class = self.entry_points[processor_name].load()
+        else:
+            logger.critical(
+                f"Unknown pre-processor '{processor_name}'. Available: {self.available_processors()}"
+            )
+            raise Exception(f"Unknown pre-processor '{processor_name}'")
 
-    def walk_package(self, package):
-        """walk the supplied package to retrieve all processors"""
-        imported_package = __import__(package, fromlist=["blah"])
-        loaded_packages = []
-        for _, processor_name, ispkg in pkgutil.walk_packages(
-            imported_package.__path__, imported_package.__name__ + "."
+        if not (
+            inspect.isclass(processor_class) and issubclass(processor_class, Processor)
         ):
-            if not ispkg and processor_name != __name__:
-                processor_module = __import__(processor_name, fromlist=["blah"])
-                # https://stackoverflow.com/a/46206754/6242649
-                clsmembers = inspect.getmembers(
-                    processor_module,
-                    ProcessorManager.get_name_filter(processor_name),
-                )
-                for _, c in clsmembers:
-                    # Only add classes that are a sub class of Processor, but NOT Processor itself
-                    if issubclass(c, Processor) & (c is not Processor):
-                        self.processors[c.__name__] = c
-                        loaded_packages.append(c.__name__)
-
-        logger.info(f"Loaded processors: {loaded_packages}")
+            raise Exception(
+                f"Pre-processor '{processor_name}' is not a subclass of Processor"
+            )
+        logger.debug(f"Loaded processor: {processor_name}")
+        self.processors[processor_name] = processor_class
+        return processor_class
 
 
 # Singleton export
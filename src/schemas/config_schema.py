@@ -42,6 +42,20 @@ CONFIG_SCHEMA = {
                 "thickness": {"type": "integer", "minimum": 1, "maximum": 10},
             },
         },
+        "preprocessing": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "single_resample": {"type": "boolean"},
+                "stage_cache_dir": {"type": "string"},
+                "batch_size": {"type": "integer", "minimum": 1},
+                "escalation_min_confidence": {"type": "number", "minimum": 0},
+                "escalation_heavy_processors": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                },
+            },
+        },
         "outputs": {
             "type": "object",
             "additionalProperties": False,
@@ -49,6 +63,14 @@ CONFIG_SCHEMA = {
                 "show_image_level": {"type": "integer", "minimum": 0, "maximum": 6},
                 "save_image_level": {"type": "integer", "minimum": 0, "maximum": 6},
                 "save_detections": {"type": "boolean"},
+                "save_detections_for": {"type": "string", "enum": ["all", "flagged"]},
+                "save_image_format": {
+                    "type": "string",
+                    "enum": ["", "jpg", "png", "webp"],
+                },
+                "save_image_quality": {"type": "integer", "minimum": 1, "maximum": 100},
+                "save_image_max_dimension": {"type": "integer", "minimum": 0},
+                "image_writer_threads": {"type": "integer", "minimum": 0},
                 # This option moves multimarked files into a separate folder for manual checking, skipping evaluation
                 "filter_out_multimarked_files": {"type": "boolean"},
             },
@@ -25,6 +25,16 @@ marking_object_properties = {
     },
 }
 
+explanation_options = {
+    "enable_evaluation_table_to_csv": {"type": "boolean", "default": False},
+    # Format of the single long-format explanation file written for the whole run
+    "explanation_output_format": {"type": "string", "enum": ["csv", "parquet"]},
+    # Render the explanation table on the console only for the first N (matching) sheets
+    "explanation_console_limit": {"type": "integer", "minimum": 0},
+    # Glob on the file name of sheets whose explanation should be rendered
+    "explanation_console_filter": {"type": "string"},
+}
+
 EVALUATION_SCHEMA = {
     "$schema": "https://json-schema.org/draft/2020-12/schema",
     "$id": "https://github.com/Udayraj123/OMRChecker/tree/master/src/schemas/evaluation-schema.json",
@@ -82,6 +92,7 @@ EVALUATION_SCHEMA = {
                             "answer_key_csv_path": {"type": "string"},
                             "answer_key_image_path": {"type": "string"},
                             "questions_in_order": ARRAY_OF_STRINGS,
+                            **explanation_options,
                         },
                     }
                 }
@@ -138,10 +149,7 @@ EVALUATION_SCHEMA = {
                                 ]
                             },
                             "questions_in_order": ARRAY_OF_STRINGS,
-                            "enable_evaluation_table_to_csv": {
-                                "type": "boolean",
-                                "default": False,
-                            },
+                            **explanation_options,
                         },
                     }
                 }
@@ -69,14 +69,7 @@ TEMPLATE_SCHEMA = {
                 "properties": {
                     "name": {
                         "type": "string",
-                        "enum": [
-                            "CropOnMarkers",
-                            "CropPage",
-                            "FeatureBasedAlignment",
-                            "GaussianBlur",
-                            "Levels",
-                            "MedianBlur",
-                        ],
+                        "description": "A built-in pre-processor (CropOnMarkers, CropPage, FeatureBasedAlignment, GaussianBlur, Levels, MedianBlur) or one registered under the 'omr_optic.processors' entry point group",
                     },
                 },
                 "required": ["name", "options"],
@@ -113,8 +106,22 @@ TEMPLATE_SCHEMA = {
                                     "additionalProperties": False,
                                     "properties": {
                                         "2d": {"type": "boolean"},
+                                        "detectionScale": {
+                                            "type": "number",
+                                            "exclusiveMinimum": 0,
+                                            "maximum": 1,
+                                        },
                                         "goodMatchPercent": {"type": "number"},
+                                        "matcher": {
+                                            "type": "string",
+                                            "enum": ["bruteforce", "knn", "flann"],
+                                        },
                                         "maxFeatures": {"type": "integer"},
+                                        "ratioTest": {
+                                            "type": "number",
+                                            "exclusiveMinimum": 0,
+                                            "maximum": 1,
+                                        },
                                         "reference": {"type": "string"},
                                     },
                                     "required": ["reference"],
@@ -173,7 +180,9 @@ TEMPLATE_SCHEMA = {
                                     "type": "object",
                                     "additionalProperties": False,
                                     "properties": {
-                                        "morphKernel": two_positive_integers
+                                        "morphKernel": two_positive_integers,
+                                        # 0 disables the downscaled detection
+                                        "detectionMaxDimension": positive_integer,
                                     },
                                 }
                             }
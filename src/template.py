@@ -6,10 +6,20 @@
  Github: https://github.com/Udayraj123
 
 """
+import hashlib
+import json
 import re
+from pathlib import Path
 
-from src.constants.common import FIELD_TYPES
+import numpy as np
+
+from src.constants.common import (
+    COMPILED_TEMPLATE_SUFFIX,
+    COMPILED_TEMPLATE_VERSION,
+    FIELD_TYPES,
+)
 from src.core import ImageInstanceOps
+from src.defaults import TEMPLATE_DEFAULTS
 from src.logger import logger
 from src.processors.manager import PROCESSOR_MANAGER
 from src.utils.parsing import (
@@ -20,11 +30,19 @@ from src.utils.parsing import (
 
 
 class Template:
-    def __init__(self, template_path, tuning_config):
+    def __init__(self, template_path, tuning_config, use_compiled=True):
         self.path = template_path
         self.image_instance_ops = ImageInstanceOps(tuning_config)
 
-        json_object = open_template_with_defaults(template_path)
+        compiled = load_compiled_template(template_path) if use_compiled else None
+        if compiled is not None:
+            # Validated and parsed by compile_template, see setup_compiled_layout
+            self.setup_compiled_layout(*compiled)
+        else:
+            self.setup_layout(open_template_with_defaults(template_path))
+        self.setup_pre_processors(self.pre_processors_object, template_path.parent)
+
+    def setup_layout(self, json_object):
         (
             custom_labels_object,
             field_blocks_object,
@@ -47,9 +65,9 @@ class Template:
                 "pageDimensions",
             ],
         )
+        self.pre_processors_object = pre_processors_object
 
         self.parse_output_columns(output_columns_array)
-        self.setup_pre_processors(pre_processors_object, template_path.parent)
         self.setup_field_blocks(field_blocks_object)
         self.parse_custom_labels(custom_labels_object)
 
@@ -100,6 +118,43 @@ class Template:
         
         return grouped_columns
 
+    def to_compiled(self):
+        """Header (JSON-serialisable) and bubble coordinate arrays of the parsed layout"""
+        header = {
+            "page_dimensions": self.page_dimensions,
+            "bubble_dimensions": self.bubble_dimensions,
+            "empty_value": self.global_empty_val,
+            "options": self.options,
+            "pre_processors": self.pre_processors_object,
+            "output_columns": self.output_columns,
+            "grouped_output_columns": self.grouped_output_columns,
+            "custom_labels": self.custom_labels,
+            "non_custom_labels": sorted(self.non_custom_labels),
+            "all_parsed_labels": sorted(self.all_parsed_labels),
+            "field_blocks": [],
+        }
+        arrays = {}
+        for index, block in enumerate(self.field_blocks):
+            block_header, arrays[f"block_{index}_points"] = block.to_compiled()
+            header["field_blocks"].append(block_header)
+        return header, arrays
+
+    def setup_compiled_layout(self, header, arrays):
+        self.page_dimensions = header["page_dimensions"]
+        self.bubble_dimensions = header["bubble_dimensions"]
+        self.global_empty_val = header["empty_value"]
+        self.options = header["options"]
+        self.pre_processors_object = header["pre_processors"]
+        self.output_columns = header["output_columns"]
+        self.grouped_output_columns = header["grouped_output_columns"]
+        self.custom_labels = header["custom_labels"]
+        self.non_custom_labels = set(header["non_custom_labels"])
+        self.all_parsed_labels = set(header["all_parsed_labels"])
+        self.field_blocks = [
+            FieldBlock.from_compiled(block_header, arrays[f"block_{index}_points"])
+            for index, block_header in enumerate(header["field_blocks"])
+        ]
+
     def parse_output_columns(self, output_columns_array):
         self.output_columns = parse_fields(f"Output Columns", output_columns_array)
 
@@ -107,7 +162,7 @@ class Template:
         # load image pre_processors
         self.pre_processors = []
         for pre_processor in pre_processors_object:
-            ProcessorClass = PROCESSOR_MANAGER.processors[pre_processor["name"]]
+            ProcessorClass = PROCESSOR_MANAGER.get_processor(pre_processor["name"])
             pre_processor_instance = ProcessorClass(
                 options=pre_processor["options"],
                 relative_dir=relative_dir,
@@ -254,6 +309,47 @@ class FieldBlock:
         self.shift = 0
         self.setup_field_block(field_block_object)
 
+    def to_compiled(self):
+        """Block attributes and its (fields, values, 2) array of bubble x, y"""
+        first_field = self.traverse_bubbles[0]
+        header = {
+            "name": self.name,
+            "origin": self.origin,
+            "dimensions": self.dimensions,
+            "bubble_dimensions": self.bubble_dimensions,
+            "empty_value": self.empty_val,
+            "field_labels": self.parsed_field_labels,
+            "field_type": first_field[0].field_type,
+            "bubble_values": [bubble.field_value for bubble in first_field],
+        }
+        points = np.array(
+            [[[bubble.x, bubble.y] for bubble in field] for field in self.traverse_bubbles],
+            dtype=np.int32,
+        ).reshape(len(self.traverse_bubbles), len(first_field), 2)
+        return header, points
+
+    @classmethod
+    def from_compiled(cls, header, points):
+        block = cls.__new__(cls)
+        block.name = header["name"]
+        block.shift = 0
+        block.origin = header["origin"]
+        block.dimensions = header["dimensions"]
+        block.bubble_dimensions = header["bubble_dimensions"]
+        block.empty_val = header["empty_value"]
+        block.parsed_field_labels = header["field_labels"]
+        field_type, bubble_values = header["field_type"], header["bubble_values"]
+        block.traverse_bubbles = [
+            [
+                Bubble(point, field_label, field_type, bubble_value)
+                for point, bubble_value in zip(field_points, bubble_values)
+            ]
+            for field_label, field_points in zip(
+                block.parsed_field_labels, points.tolist()
+            )
+        ]
+        return block
+
     def setup_field_block(self, field_block_object):
         # case mapping
         (
@@ -364,3 +460,56 @@ class Bubble:
 
     def __str__(self):
         return str([self.x, self.y])
+
+
+def get_compiled_template_path(template_path):
+    return Path(template_path).with_suffix(COMPILED_TEMPLATE_SUFFIX)
+
+
+def get_template_source_key(template_path):
+    """Hash of everything the compiled layout depends on"""
+    digest = hashlib.sha1(
+        json.dumps(
+            [COMPILED_TEMPLATE_VERSION, TEMPLATE_DEFAULTS, FIELD_TYPES], sort_keys=True
+        ).encode()
+    )
+    with open(template_path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def compile_template(template_path, tuning_config):
+    """Validate and parse the template once, then write its compiled artifact"""
+    template = Template(Path(template_path), tuning_config, use_compiled=False)
+    header, arrays = template.to_compiled()
+    compiled_path = get_compiled_template_path(template_path)
+    with open(compiled_path, "wb") as f:
+        np.savez(
+            f,
+            key=np.array(get_template_source_key(template_path)),
+            header=np.array(json.dumps(header)),
+            **arrays,
+        )
+    logger.info(f"Compiled template: '{compiled_path}'")
+    return compiled_path
+
+
+def load_compiled_template(template_path):
+    """(header, arrays) of the compiled template, or None if missing or stale"""
+    compiled_path = get_compiled_template_path(template_path)
+    if not compiled_path.exists():
+        return None
+    try:
+        with np.load(compiled_path, allow_pickle=False) as compiled:
+            if str(compiled["key"]) != get_template_source_key(template_path):
+                logger.warning(
+                    f"Ignoring outdated compiled template: '{compiled_path}'"
+                )
+                return None
+            header = json.loads(str(compiled["header"]))
+            arrays = {name: compiled[name] for name in compiled.files}
+    except (OSError, KeyError, ValueError) as error:
+        logger.warning(f"Could not read compiled template '{compiled_path}': {error}")
+        return None
+    logger.info(f"Loading compiled template: '{compiled_path}'")
+    return header, arrays
@@ -0,0 +1,68 @@
+import json
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.constants.image_processing import ALIGNMENT_MORPH_MARGIN
+from src.core import ImageInstanceOps
+from src.entry import preprocess_omr_files
+from src.template import Template
+from src.utils.parsing import open_config_with_defaults
+
+
+def test_alignment_roi_covers_the_search_range_within_the_page():
+    field_block = SimpleNamespace(origin=[100, 200], dimensions=[300, 150])
+    margin = ALIGNMENT_MORPH_MARGIN
+
+    y0, y1, x0, x1 = ImageInstanceOps.get_alignment_roi(
+        field_block, (1000, 800), max_shift=50
+    )
+    assert (y0, y1) == (200 - margin, 350 + margin)
+    assert (x0, x1) == (100 - 50 - margin, 400 + 50 + margin)
+
+    # Clipped to the page
+    assert ImageInstanceOps.get_alignment_roi(field_block, (300, 420), 50) == (
+        200 - margin,
+        300,
+        10,
+        420,
+    )
+
+
+def read_aligned(directory, save_image_level=0):
+    shutil.copytree(Path("samples", "sample6"), directory)
+    config_path = directory.joinpath("config.json")
+    config = json.loads(config_path.read_text())
+    config["outputs"] = {
+        "show_image_level": 0,
+        "save_image_level": save_image_level,
+    }
+    config["alignment_params"] = {"auto_align": True}
+    config_path.write_text(json.dumps(config))
+    template = Template(
+        directory.joinpath("template.json"), open_config_with_defaults(config_path)
+    )
+    sheet = directory.joinpath("doc-scans", "sample_roll_02.jpg")
+    [(_, image)] = preprocess_omr_files([sheet], template)
+    ops = template.image_instance_ops
+    response, *_rest = ops.read_omr_response(template, image, sheet.name)
+    return response, [field_block.shift for field_block in template.field_blocks]
+
+
+def test_debug_images_do_not_change_the_alignment(tmp_path):
+    response, shifts = read_aligned(tmp_path / "plain")
+    assert any(shifts)
+    assert read_aligned(tmp_path / "debug", save_image_level=3) == (response, shifts)
+
+
+def test_alignment_matches_aligning_on_the_whole_page(tmp_path, monkeypatch):
+    response, shifts = read_aligned(tmp_path / "roi")
+    assert any(shifts)
+
+    def get_whole_page(field_block, page_shape, max_shift):
+        return 0, page_shape[0], 0, page_shape[1]
+
+    monkeypatch.setattr(
+        ImageInstanceOps, "get_alignment_roi", staticmethod(get_whole_page)
+    )
+    assert read_aligned(tmp_path / "page") == (response, shifts)
@@ -0,0 +1,160 @@
+import math
+from fractions import Fraction
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cheating_analysis import CheatingDetector, binom_sf
+
+EMPTY_VALUES = {"", "-", "*", " "}
+
+
+def make_detector(n_students=40, n_questions=25, seed=7):
+    rng = np.random.default_rng(seed)
+    questions = [f"q{i}" for i in range(1, n_questions + 1)]
+    options = np.array(["A", "B", "C", "D", "", "*"])
+    responses = rng.choice(
+        options, size=(n_students, n_questions), p=[0.3, 0.2, 0.2, 0.2, 0.07, 0.03]
+    )
+    # A few copied pairs so shared wrong answers actually show up
+    if n_students >= 4:
+        responses[1] = responses[0]
+        responses[3, :15] = responses[2, :15]
+    df = pd.DataFrame(
+        responses, columns=questions, index=[f"S{i}" for i in range(n_students)]
+    )
+    answer_key = {q: rng.choice(options[:4]) for q in questions}
+    # Questions without a key still take part in the agreement counts
+    answer_key[questions[-1]] = ""
+    return CheatingDetector(df, answer_key, questions)
+
+
+def reference_pairs(detector):
+    """The straightforward per-pair computation analyze() must agree with."""
+    results = []
+    for idx_a, idx_b in combinations(range(len(detector.df)), 2):
+        resp_a = detector.response_matrix[idx_a]
+        resp_b = detector.response_matrix[idx_b]
+        not_empty_a = np.array([str(v).strip() not in EMPTY_VALUES for v in resp_a])
+        not_empty_b = np.array([str(v).strip() not in EMPTY_VALUES for v in resp_b])
+        agreements = (resp_a == resp_b) & not_empty_a & not_empty_b
+        wrong_mask_a = resp_a != detector.key_vector
+        wrong_mask_b = resp_b != detector.key_vector
+        gbt_z = detector._compute_gbt_z(resp_a, resp_b)
+        results.append(
+            {
+                "student_a": str(detector.df.index[idx_a]),
+                "student_b": str(detector.df.index[idx_b]),
+                "agreements": int(np.sum(agreements)),
+                "w_agreements": int(np.sum(agreements & wrong_mask_a)),
+                "score_a": int(detector.student_scores[idx_a]),
+                "score_b": int(detector.student_scores[idx_b]),
+                "wrongs_a": int(np.sum(wrong_mask_a)),
+                "wrongs_b": int(np.sum(wrong_mask_b)),
+                "k_index_ab": detector._compute_k_index(resp_a, resp_b, wrong_mask_b),
+                "k_index_ba": detector._compute_k_index(resp_b, resp_a, wrong_mask_a),
+                "gbt_z": gbt_z,
+                "wesolowsky": gbt_z,
+            }
+        )
+    return results
+
+
+def test_analyze_matches_pairwise_reference():
+    detector = make_detector()
+    actual = detector.analyze()
+    expected = reference_pairs(detector)
+
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got.keys() == want.keys()
+        for key, value in want.items():
+            if isinstance(value, str) or isinstance(value, int):
+                assert got[key] == value, key
+            elif key.startswith("k_index"):
+                # Both paths discretize p, but their sums may round to neighbouring steps
+                assert got[key] == pytest.approx(value, rel=5e-3), key
+            else:
+                assert got[key] == pytest.approx(value, rel=1e-9, abs=1e-12), key
+
+
+def test_analyze_small_inputs():
+    assert make_detector(n_students=1).analyze() == []
+    assert len(make_detector(n_students=2).analyze()) == 1
+
+
+def test_analyze_tiles_and_workers_match_single_block():
+    detector = make_detector()
+    assert detector.analyze(block_size=7) == detector.analyze()
+    assert detector.analyze(block_size=7, workers=2) == detector.analyze()
+    assert detector.pairs_checked == 40 * 39 // 2
+
+
+def test_analyze_filters_and_top_k():
+    detector = make_detector()
+    all_pairs = detector.analyze()
+
+    filtered = detector.analyze(
+        min_shared_errors=3, min_gbt_z=1.0, max_k_index=0.05, block_size=9
+    )
+    expected = [
+        pair
+        for pair in all_pairs
+        if pair["w_agreements"] >= 3
+        and (pair["gbt_z"] > 1.0 or min(pair["k_index_ab"], pair["k_index_ba"]) < 0.05)
+    ]
+    assert filtered == expected
+
+    top = detector.analyze(top_k=5, block_size=9)
+    by_z = sorted(all_pairs, key=lambda pair: pair["gbt_z"], reverse=True)
+    assert [pair["gbt_z"] for pair in top] == [pair["gbt_z"] for pair in by_z[:5]]
+    assert (top[0]["student_a"], top[0]["student_b"]) == ("S0", "S1")
+
+    top_k_index = detector.analyze(top_k=3, rank_by="k_index", block_size=9)
+    lowest = sorted(min(p["k_index_ab"], p["k_index_ba"]) for p in all_pairs)[:3]
+    assert [min(p["k_index_ab"], p["k_index_ba"]) for p in top_k_index] == lowest
+
+
+def exact_binom_sf(k, n, p):
+    return sum(math.comb(n, i) * p**i * (1 - p) ** (n - i) for i in range(k, n + 1))
+
+
+def test_binom_sf_matches_exact_sum():
+    for n, p in [(1, 0.5), (10, 0.25), (37, 0.0731), (120, 0.4)]:
+        k = np.arange(n + 2)
+        expected = [exact_binom_sf(int(i), n, p) for i in k]
+        assert binom_sf(k, n, p) == pytest.approx(expected, rel=1e-9, abs=1e-300)
+
+    assert binom_sf([0, 1, 3], 3, 0.0).tolist() == [1.0, 0.0, 0.0]
+    assert binom_sf([0, 3, 4], 3, 1.0).tolist() == [1.0, 1.0, 0.0]
+
+
+def test_binom_sf_does_not_underflow_for_long_tails():
+    # comb(2000, i) overflows a float and p**i underflows; the log-space tail is still exact
+    n, k, p = 2000, 300, Fraction(1, 10)
+    expected = float(
+        sum(math.comb(n, i) * p**i * (1 - p) ** (n - i) for i in range(k, n + 1))
+    )
+    assert 0.0 < expected < 1e-5
+    assert binom_sf(k, n, 0.1) == pytest.approx(expected, rel=1e-9)
+
+
+def test_analyze_reports_groups_and_cross_group_pairs():
+    detector = make_detector()
+    groups = ["room-1"] * 20 + ["room-2"] * 20
+    grouped = CheatingDetector(
+        detector.df, detector.answer_key, detector.questions, groups=groups
+    )
+
+    all_pairs = grouped.analyze(block_size=8)
+    assert len(all_pairs) == 40 * 39 // 2
+    assert all(pair["group_a"] in ("room-1", "room-2") for pair in all_pairs)
+
+    cross = grouped.analyze(block_size=8, cross_group_only=True)
+    assert len(cross) == grouped.pairs_checked == 20 * 20
+    assert all(
+        pair["group_a"] == "room-1" and pair["group_b"] == "room-2" for pair in cross
+    )
+    assert cross == [pair for pair in all_pairs if pair["group_a"] != pair["group_b"]]
@@ -0,0 +1,52 @@
+import shutil
+from pathlib import Path
+
+from src.defaults import CONFIG_DEFAULTS
+from src.template import (
+    Template,
+    compile_template,
+    get_compiled_template_path,
+    load_compiled_template,
+)
+
+
+def layout_of(template):
+    return (
+        template.output_columns,
+        template.grouped_output_columns,
+        template.custom_labels,
+        sorted(template.non_custom_labels),
+        [
+            (
+                block.name,
+                list(block.origin),
+                list(block.dimensions),
+                block.parsed_field_labels,
+                [
+                    [
+                        (b.x, b.y, b.field_label, b.field_type, b.field_value)
+                        for b in field
+                    ]
+                    for field in block.traverse_bubbles
+                ],
+            )
+            for block in template.field_blocks
+        ],
+        [type(pre_processor).__name__ for pre_processor in template.pre_processors],
+    )
+
+
+def test_compiled_template_matches_json_and_goes_stale_with_it(tmp_path):
+    template_dir = tmp_path / "sample2"
+    shutil.copytree(Path("samples", "sample2"), template_dir)
+    template_path = template_dir / "template.json"
+    parsed = Template(template_path, CONFIG_DEFAULTS)
+
+    compiled_path = compile_template(template_path, CONFIG_DEFAULTS)
+    assert compiled_path == get_compiled_template_path(template_path)
+    assert load_compiled_template(template_path) is not None
+    assert layout_of(Template(template_path, CONFIG_DEFAULTS)) == layout_of(parsed)
+
+    # Editing the JSON invalidates the artifact
+    template_path.write_text(template_path.read_text() + "\n")
+    assert load_compiled_template(template_path) is None
@@ -0,0 +1,45 @@
+import shutil
+import zipfile
+from pathlib import Path
+
+import cv2
+import pandas as pd
+
+from src.tests.utils import run_entry_point, setup_mocker_patches
+from src.utils.containers import ContainerPage, expand_sheet_file
+
+SAMPLE_DIR = Path("samples", "sample1")
+
+
+def test_container_pages_are_read_like_sheet_files(mocker, tmp_path):
+    setup_mocker_patches(mocker)
+    for file_name in ["template.json", "config.json", "omr_marker.jpg"]:
+        shutil.copy(SAMPLE_DIR.joinpath(file_name), tmp_path)
+    sheet_path = SAMPLE_DIR.joinpath("MobileCamera", "sheet1.jpg")
+    shutil.copy(sheet_path, tmp_path)
+    sheet = cv2.imread(str(sheet_path), cv2.IMREAD_GRAYSCALE)
+    cv2.imwritemulti(str(tmp_path.joinpath("scans.tif")), [sheet, sheet])
+    with zipfile.ZipFile(tmp_path.joinpath("uploads.zip"), "w") as archive:
+        archive.write(sheet_path, "class/sheet1.jpg")
+        archive.writestr("class/notes.txt", "not a sheet")
+
+    pages = list(expand_sheet_file(tmp_path.joinpath("scans.tif")))
+    assert [page.name for page in pages] == ["scans.tif#1", "scans.tif#2"]
+    assert (pages[1].read() == sheet).all()
+
+    output_dir = tmp_path.joinpath("outputs")
+    run_entry_point(tmp_path, output_dir)
+
+    results = pd.read_csv(
+        next(output_dir.joinpath("Results").glob("*.csv")), keep_default_na=False
+    ).set_index("file_id")
+    assert list(results.index) == [
+        "scans.tif#1",
+        "scans.tif#2",
+        "sheet1.jpg",
+        "uploads.zip#class/sheet1.jpg",
+    ]
+    # Every page holds the same sheet
+    assert (results == results.loc["sheet1.jpg"]).all(axis=None)
+    assert output_dir.joinpath("CheckedOMRs", "uploads.zip#class_sheet1.jpg").exists()
+    assert ContainerPage(tmp_path / "scans.tif", 2) in pages
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+from dotmap import DotMap
+
+from src.defaults import CONFIG_DEFAULTS
+from src.processors.CropPage import CropPage
+from src.utils.image import ImageUtils
+
+
+def make_crop_page(detection_max_dimension=None):
+    options = {}
+    if detection_max_dimension is not None:
+        options["detectionMaxDimension"] = detection_max_dimension
+    return CropPage(
+        options=options,
+        relative_dir=".",
+        image_instance_ops=DotMap({"tuning_config": CONFIG_DEFAULTS}),
+    )
+
+
+def test_downscaled_detection_refines_corners_at_full_resolution():
+    page = np.float32(
+        [[310.4, 260.7], [1460.2, 330.1], [1390.6, 2130.3], [240.8, 2060.9]]
+    )
+    # Draw the page 8x larger and average down to get anti-aliased, sub-pixel edges
+    supersampled = np.full((2400 * 8, 1800 * 8), 30, dtype=np.uint8)
+    cv2.fillPoly(supersampled, [np.int32(np.round((page + 0.5) * 8 - 0.5))], 230)
+    image = cv2.resize(supersampled, (1800, 2400), interpolation=cv2.INTER_AREA)
+
+    corners = make_crop_page(512).find_page_corners(image, "synthetic.jpg")
+
+    assert len(corners) == 4
+    error = np.abs(ImageUtils.order_points(np.float32(corners)) - page).max()
+    assert error < 1.0
+    full_resolution = make_crop_page(0).find_page_corners(image, "synthetic.jpg")
+    assert len(full_resolution) == 4
+
+
+def test_page_is_detected_on_a_proxy_only_when_configured(monkeypatch):
+    dimensions = CONFIG_DEFAULTS.dimensions
+    width, height = dimensions.processing_width, dimensions.processing_height
+    page = np.float32([[60, 50], [600, 70], [590, 770], [50, 750]])
+    image = np.full((height, width), 30, dtype=np.uint8)
+    cv2.fillPoly(image, [np.int32(page)], 230)
+
+    def detection_scales(crop_page):
+        find_page, scales = crop_page.find_page, []
+
+        def record_scale(image, file_path, scale=1.0):
+            scales.append(scale)
+            return find_page(image, file_path, scale=scale)
+
+        monkeypatch.setattr(crop_page, "find_page", record_scale)
+        corners = crop_page.find_page_corners(image, "synthetic.jpg")
+        assert np.abs(ImageUtils.order_points(np.float32(corners)) - page).max() < 3
+        return scales
+
+    assert detection_scales(make_crop_page()) == [1.0]
+    assert detection_scales(make_crop_page(height // 2)) == [0.5]
+
+
+def test_single_resample_warps_once_into_template_space():
+    from argparse import Namespace
+    from copy import deepcopy
+
+    from src.core import ImageInstanceOps
+
+    page = np.float32([[80, 60], [560, 90], [540, 760], [70, 730]])
+    image = np.full((1000, 800), 30, dtype=np.uint8)
+    cv2.fillPoly(image, [np.int32(page)], 230)
+    cv2.circle(image, (300, 400), 40, 0, -1)
+
+    results = {}
+    for single_resample in (False, True):
+        config = deepcopy(CONFIG_DEFAULTS)
+        config.preprocessing.single_resample = single_resample
+        ops = ImageInstanceOps(config)
+        crop_page = CropPage(
+            options={},
+            relative_dir=".",
+            image_instance_ops=DotMap({"tuning_config": config}),
+        )
+        template = Namespace(pre_processors=[crop_page], page_dimensions=[400, 500])
+        results[single_resample] = ops.apply_preprocessors(
+            "synthetic.jpg", image, template
+        )
+
+    assert results[True].shape == (500, 400)
+    # read_omr_response resizes and normalizes both the same way
+    multi_step = ImageUtils.normalize_util(cv2.resize(results[False], (400, 500)))
+    single_step = ImageUtils.normalize_util(results[True])
+    # Same page content; only the resampling (and CropPage's blur) differs
+    assert np.abs(multi_step.astype(int) - single_step.astype(int)).mean() < 3
@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.utils.debug_buffer import DebugImageBuffer
+
+
+def test_debug_images_are_thumbnails_within_the_memory_cap():
+    image = np.zeros((1000, 800), dtype=np.uint8)
+
+    disabled = DebugImageBuffer(level=0, thumbnail_height=100)
+    disabled.append(1, image)
+    assert disabled.size == 0 and not disabled.images
+
+    buffer = DebugImageBuffer(level=2, thumbnail_height=100, max_bytes=3 * 80 * 100)
+    for key in [1, 2, 3, 1, 2]:
+        buffer.append(key, image)
+    assert [img.shape for img in buffer.get(1)] == [(100, 80), (100, 80)]
+    # Level 3 is above the buffer level, the last image is over the cap
+    assert len(buffer.get(2)) == 1 and buffer.get(3) == []
+
+    buffer.reset()
+    assert buffer.size == 0 and buffer.get(1) == []
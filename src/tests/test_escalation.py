@@ -0,0 +1,75 @@
+import json
+import shutil
+from pathlib import Path
+
+from src.entry import read_omr_files
+from src.escalation import get_escalation_tiers
+from src.template import Template
+from src.utils.parsing import open_config_with_defaults
+
+
+def make_template(tmp_path, **preprocessing):
+    shutil.copytree(Path("samples", "sample1"), tmp_path, dirs_exist_ok=True)
+    config_path = tmp_path.joinpath("config.json")
+    config = json.loads(config_path.read_text())
+    config.setdefault("preprocessing", {}).update(preprocessing)
+    config_path.write_text(json.dumps(config))
+    return Template(
+        tmp_path.joinpath("template.json"), open_config_with_defaults(config_path)
+    )
+
+
+def test_low_confidence_sheets_escalate_to_the_full_pipeline(tmp_path):
+    sheet = tmp_path.joinpath("MobileCamera", "sheet1.jpg")
+    baseline = make_template(tmp_path / "baseline")
+    [(_, expected, *_rest, tier)] = read_omr_files(
+        [tmp_path.joinpath("baseline", "MobileCamera", "sheet1.jpg")], baseline, None
+    )
+    assert tier == "preprocessed"
+
+    template = make_template(tmp_path, escalation_min_confidence=10)
+    fast, full = get_escalation_tiers(template)
+    assert [pp.__class__.__name__ for pp in fast.template.pre_processors] == [
+        "CropPage"
+    ]
+    assert full.template is template
+
+    # Without CropOnMarkers the photo is misaligned, so the fast read is not trusted
+    [(_, omr_response, *_rest, tier)] = read_omr_files([sheet], template, None)
+    assert tier == "preprocessed"
+    assert omr_response == expected
+
+
+def test_field_block_shifts_do_not_leak_into_later_sheets(tmp_path):
+    def make_sample6_template(directory):
+        shutil.copytree(Path("samples", "sample6"), directory)
+        config_path = directory.joinpath("config.json")
+        config = json.loads(config_path.read_text())
+        config["outputs"]["show_image_level"] = 0
+        config["alignment_params"] = {"auto_align": True}
+        config["preprocessing"] = {
+            "escalation_min_confidence": 10,
+            "escalation_heavy_processors": ["GaussianBlur"],
+        }
+        config_path.write_text(json.dumps(config))
+        return Template(
+            directory.joinpath("template.json"),
+            open_config_with_defaults(config_path),
+        )
+
+    template = make_sample6_template(tmp_path / "sequence")
+    sheets = [
+        tmp_path.joinpath("sequence", "doc-scans", f"sample_roll_0{roll}.jpg")
+        for roll in (2, 3)
+    ]
+    results = list(read_omr_files(sheets, template, None))
+    # The first sheet is aligned, shifting its field blocks
+    assert [result[-1] for result in results] == ["aligned", "fast"]
+    # The fast tier shares the field blocks but must not reuse their shifts
+    assert [field_block.shift for field_block in template.field_blocks] == [0] * 4
+
+    alone = make_sample6_template(tmp_path / "alone")
+    [expected] = read_omr_files(
+        [tmp_path.joinpath("alone", "doc-scans", "sample_roll_03.jpg")], alone, None
+    )
+    assert results[1][1] == expected[1] and expected[-1] == "fast"
@@ -0,0 +1,148 @@
+import itertools
+from pathlib import Path
+
+import pytest
+
+from src.defaults import CONFIG_DEFAULTS
+from src.entry import score_read_results
+from src.evaluation import (
+    AnswerMatcher,
+    CompiledEvaluation,
+    EvaluationConfig,
+    ExplanationWriter,
+    SectionMarkingScheme,
+    evaluate_concatenated_response,
+    evaluate_concatenated_responses,
+)
+from src.schemas.constants import DEFAULT_SECTION_KEY
+from src.template import Template
+
+ANSWER_ITEMS = {
+    "q1": "C",
+    "q2": ["A", "C"],
+    "q3": [["B", 2], ["C", "3/2"], ["AB", 1]],
+    "q4": "AB",
+}
+MARKED_ANSWERS = ["", "A", "B", "C", "D", "AB", "BC"]
+
+
+def build_matchers(empty_val=""):
+    scheme = SectionMarkingScheme(
+        DEFAULT_SECTION_KEY,
+        {"correct": "3", "incorrect": "-1", "unmarked": "0"},
+        empty_val,
+    )
+    return {
+        question: AnswerMatcher(answer_item, scheme)
+        for question, answer_item in ANSWER_ITEMS.items()
+    }
+
+
+def test_compiled_tables_match_answer_matchers():
+    matchers = build_matchers()
+    questions = list(ANSWER_ITEMS)
+    compiled = CompiledEvaluation.from_answer_matchers(questions, matchers)
+
+    responses = [
+        list(response)
+        for response in itertools.product(MARKED_ANSWERS, repeat=len(questions))
+    ]
+    scores, deltas, codes = compiled.score(responses)
+
+    for response, score, row_deltas, row_codes in zip(responses, scores, deltas, codes):
+        expected_score = 0.0
+        for question_index, (question, marked_answer) in enumerate(
+            zip(questions, response)
+        ):
+            verdict, delta = matchers[question].get_verdict_marking(marked_answer)
+            assert row_deltas[question_index] == delta
+            assert compiled.verdicts(row_codes)[question_index] == verdict
+            expected_score += delta
+        assert score == expected_score
+
+
+def test_compiled_answer_key_with_several_empty_values():
+    compiled = CompiledEvaluation.from_answer_key(
+        ["q1", "q2", "q3"],
+        ["A", "", "-"],
+        {"correct": 4, "incorrect": -1, "unmarked": 0},
+        empty_values=("", "*", "-"),
+    )
+    scores, deltas, codes = compiled.score([["A", "B", "-"], ["*", "", "C"]])
+
+    assert scores.tolist() == [3.0, -1.0]
+    assert deltas.tolist() == [[4, -1, 0], [0, 0, -1]]
+    assert compiled.verdict_kinds(codes[0]).tolist() == [
+        CompiledEvaluation.VERDICT_CORRECT,
+        CompiledEvaluation.VERDICT_INCORRECT,
+        CompiledEvaluation.VERDICT_UNMARKED,
+    ]
+
+
+def test_explanation_writer_appends_buffered_rows(tmp_path):
+    row = ["q1", "A", "C", "Incorrect", -1.0, -1.0, DEFAULT_SECTION_KEY]
+    writer = ExplanationWriter(tmp_path, buffer_size=3)
+    writer.add_rows("a.jpg", [row, row])
+    assert len(writer.rows) == 2
+    writer.add_rows("b.jpg", [row])
+    assert writer.rows == []
+    writer.close()
+
+    # A second run appends to the same file without repeating the header
+    writer = ExplanationWriter(tmp_path)
+    writer.add_rows("c.jpg", [row])
+    writer.close()
+
+    lines = (tmp_path / "Explanation.csv").read_text().splitlines()
+    assert lines[0].startswith('"file_id","question"')
+    assert [line.split(",")[0] for line in lines[1:]] == [
+        '"a.jpg"',
+        '"a.jpg"',
+        '"b.jpg"',
+        '"c.jpg"',
+    ]
+
+
+def test_answer_explanations_are_readable():
+    matchers = build_matchers()
+    assert [matcher.get_answer_explanation() for matcher in matchers.values()] == [
+        "C",
+        "A, C",
+        "B: 2, C: 3/2, AB: 1",
+        "AB",
+    ]
+
+
+def test_batch_scoring_matches_scoring_one_sheet_at_a_time(tmp_path):
+    sample_dir = Path("samples", "answer-key", "weighted-answers")
+    tuning_config = CONFIG_DEFAULTS
+    template = Template(sample_dir.joinpath("template.json"), tuning_config)
+
+    def make_evaluation_config():
+        return EvaluationConfig(
+            sample_dir, sample_dir.joinpath("evaluation.json"), template, tuning_config
+        )
+
+    responses = [
+        {"q1": q1, "q2": q2, "q3": q3, "q4": "B", "q5": "C"}
+        for q1, q2, q3 in itertools.product(["", "A", "C"], ["E", "B"], ["A", "AC"])
+    ]
+    file_paths = [Path(f"sheet{index}.jpg") for index in range(len(responses))]
+
+    one_at_a_time = make_evaluation_config()
+    expected = [
+        evaluate_concatenated_response(response, one_at_a_time, file_path, tmp_path)
+        for response, file_path in zip(responses, file_paths)
+    ]
+    batch = make_evaluation_config()
+    scores = evaluate_concatenated_responses(responses, batch, file_paths, tmp_path)
+    assert scores == expected
+    batch_statistics = batch.item_statistics.snapshot()
+    assert batch_statistics["sheets"] == len(responses)
+    assert batch_statistics["mean_score"] == pytest.approx(
+        sum(expected) / len(expected)
+    )
+
+
+def test_scoring_no_read_results_yields_nothing():
+    assert list(score_read_results(iter([]), CONFIG_DEFAULTS, None, None, None)) == []
@@ -0,0 +1,68 @@
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+from dotmap import DotMap
+
+from src.processors.FeatureBasedAlignment import FeatureBasedAlignment
+from src.utils.parsing import open_config_with_defaults
+
+SAMPLE_DIR = Path("samples", "sample6")
+
+
+def make_aligner(template_dir, **options):
+    config = open_config_with_defaults(SAMPLE_DIR.joinpath("config.json"))
+    config.outputs.show_image_level = 0
+    return FeatureBasedAlignment(
+        options={"reference": "reference.png", "maxFeatures": 1000, **options},
+        relative_dir=template_dir,
+        image_instance_ops=DotMap({"tuning_config": config}),
+    )
+
+
+def test_reference_features_are_cached_next_to_the_reference(tmp_path):
+    shutil.copy(SAMPLE_DIR.joinpath("reference.png"), tmp_path)
+    first = make_aligner(tmp_path)
+    cache_path = tmp_path.joinpath(".reference.png.orb-cache.npz")
+    assert cache_path.exists()
+
+    cached = make_aligner(tmp_path)
+    np.testing.assert_array_equal(cached.to_descriptors, first.to_descriptors)
+    np.testing.assert_array_equal(cached.to_points, first.to_points)
+
+    # Different detection settings must not reuse the cached features
+    rescaled = make_aligner(tmp_path, detectionScale=0.5)
+    assert not np.array_equal(rescaled.to_points, first.to_points)
+
+
+def test_ratio_test_matcher_recovers_a_shift(tmp_path):
+    shutil.copy(SAMPLE_DIR.joinpath("reference.png"), tmp_path)
+    for matcher in ["bruteforce", "knn", "flann"]:
+        aligner = make_aligner(tmp_path, matcher=matcher, detectionScale=0.5)
+        reference = aligner.ref_img
+        shifted = cv2.warpAffine(
+            reference, np.float32([[1, 0, 12], [0, 1, -9]]), reference.shape[::-1]
+        )
+        aligned = aligner.apply_filter(shifted, "shifted.png")
+        inner = (slice(50, -50), slice(50, -50))
+        error = np.abs(aligned[inner].astype(int) - reference[inner].astype(int))
+        assert error.mean() < 3, matcher
+
+
+def test_batch_matches_sheet_by_sheet_alignment(tmp_path):
+    shutil.copy(SAMPLE_DIR.joinpath("reference.png"), tmp_path)
+    for matcher in ["bruteforce", "knn"]:
+        aligner = make_aligner(tmp_path, matcher=matcher, detectionScale=0.5)
+        reference = aligner.ref_img
+        sheets = [
+            cv2.warpAffine(
+                reference, np.float32([[1, 0, dx], [0, 1, dy]]), reference.shape[::-1]
+            )
+            for dx, dy in [(12, -9), (-5, 7), (0, 15)]
+        ]
+        names = [f"sheet{i}.png" for i in range(len(sheets))]
+        expected = [aligner.apply_filter(s, n) for s, n in zip(sheets, names)]
+        batched = aligner.apply_filter_batch(sheets, names)
+        for one, many in zip(expected, batched):
+            np.testing.assert_array_equal(one, many)
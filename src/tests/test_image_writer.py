@@ -0,0 +1,43 @@
+import json
+
+import cv2
+import numpy as np
+
+from src.core import ImageInstanceOps
+from src.utils.parsing import open_config_with_defaults
+
+
+def test_output_images_use_the_configured_format_and_size(tmp_path):
+    config_path = tmp_path.joinpath("config.json")
+    config_path.write_text(
+        json.dumps(
+            {
+                "outputs": {
+                    "save_image_format": "jpg",
+                    "save_image_max_dimension": 100,
+                    "image_writer_threads": 2,
+                }
+            }
+        )
+    )
+    image_instance_ops = ImageInstanceOps(open_config_with_defaults(config_path))
+    output_dir = tmp_path.joinpath("CheckedOMRs")
+    output_dir.mkdir()
+
+    image = np.random.default_rng(0).integers(0, 255, (400, 200), dtype=np.uint8)
+    for index in range(10):
+        image_instance_ops.save_image(output_dir.joinpath(f"sheet{index}.png"), image)
+    image_writer = image_instance_ops.image_writer
+    image_writer.flush()
+    assert len(image_writer.workers) == 2
+
+    saved = sorted(output_dir.iterdir())
+    assert [path.name for path in saved] == [f"sheet{i}.jpg" for i in range(10)]
+    assert cv2.imread(str(saved[0]), cv2.IMREAD_GRAYSCALE).shape == (100, 50)
+
+    # Closing stops the threads, a later image starts them again
+    image_writer.close()
+    assert image_writer.workers == []
+    image_instance_ops.save_image(output_dir.joinpath("sheet10.png"), image)
+    image_writer.close()
+    assert output_dir.joinpath("sheet10.jpg").exists()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import src.item_statistics
+from src.item_statistics import (
+    ItemStatistics,
+    live_statistics_under,
+    register_live_statistics,
+    unregister_live_statistics_under,
+)
+
+
+def make_sheets(n_sheets=60, n_questions=8, seed=3):
+    rng = np.random.default_rng(seed)
+    answers = rng.choice(["A", "B", "C", "D", ""], size=(n_sheets, n_questions))
+    key = np.array(["A", "B", "C", "D"] * (n_questions // 4))
+    unmarked = answers == ""
+    correct = answers == key
+    scores = correct.sum(axis=1) * 4.0 - (~correct & ~unmarked).sum(axis=1)
+    return answers, scores, correct, unmarked
+
+
+def test_per_sheet_updates_match_full_recomputation():
+    answers, scores, correct, unmarked = make_sheets()
+    questions = [f"q{i}" for i in range(1, answers.shape[1] + 1)]
+
+    online = ItemStatistics(questions)
+    for row in range(len(scores)):
+        online.update(answers[row], scores[row], correct[row], unmarked[row])
+    batch = ItemStatistics(questions)
+    batch.update_batch(answers[:25], scores[:25], correct[:25], unmarked[:25])
+    batch.update_batch(answers[25:], scores[25:], correct[25:], unmarked[25:])
+
+    for snapshot in (online.snapshot(), batch.snapshot()):
+        assert snapshot["sheets"] == len(scores)
+        assert snapshot["mean_score"] == pytest.approx(scores.mean())
+        assert snapshot["score_variance"] == pytest.approx(scores.var())
+        for index, item in enumerate(snapshot["items"]):
+            assert item["difficulty"] == pytest.approx(correct[:, index].mean())
+            assert item["omit_rate"] == pytest.approx(unmarked[:, index].mean())
+            expected_r = np.corrcoef(correct[:, index], scores)[0, 1]
+            assert item["discrimination"] == pytest.approx(expected_r)
+            marked = answers[:, index][~unmarked[:, index]]
+            assert item["option_counts"] == {
+                option: int((marked == option).sum()) for option in set(marked.tolist())
+            }
+            assert [d["option"] for d in item["distractors"]] == sorted(
+                set(marked.tolist()) - set(answers[correct[:, index], index].tolist()),
+                key=lambda option: (-int((marked == option).sum()), option),
+            )
+
+
+def test_live_statistics_are_found_below_a_session_folder(tmp_path):
+    item_statistics = ItemStatistics(["q1"])
+    register_live_statistics(tmp_path / "session" / "batch-1", item_statistics)
+    assert live_statistics_under(tmp_path / "session") == {"batch-1": item_statistics}
+    assert live_statistics_under(tmp_path / "other") == {}
+
+
+def test_live_statistics_are_bounded_and_unregistered(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.item_statistics, "MAX_LIVE_ITEM_STATISTICS", 2)
+    for batch in range(3):
+        register_live_statistics(tmp_path / f"batch-{batch}", ItemStatistics(["q1"]))
+    # The oldest batch made room for the newest
+    assert sorted(live_statistics_under(tmp_path)) == ["batch-1", "batch-2"]
+
+    unregister_live_statistics_under(tmp_path / "batch-1")
+    assert sorted(live_statistics_under(tmp_path)) == ["batch-2"]
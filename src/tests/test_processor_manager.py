@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+import pytest
+
+from src.processors.manager import BUILTIN_PROCESSORS, PROCESSOR_MANAGER
+
+
+def test_processor_modules_are_imported_only_when_used():
+    code = (
+        "import sys; import src.processors.manager; "
+        "print(sorted(m for m in sys.modules if m.startswith('src.processors.')))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip().splitlines()[-1] == "['src.processors.manager']"
+
+
+@pytest.mark.parametrize("name", sorted(BUILTIN_PROCESSORS))
+def test_builtin_processors_resolve_to_their_class(name):
+    assert PROCESSOR_MANAGER.get_processor(name).__name__ == name
+
+
+def test_unknown_processor_is_rejected():
+    with pytest.raises(Exception, match="Unknown pre-processor 'Sharpen'"):
+        PROCESSOR_MANAGER.get_processor("Sharpen")
@@ -0,0 +1,51 @@
+import shutil
+from pathlib import Path
+
+from src.entry import TemplateCache, discover_work_units
+
+
+def test_identical_folders_share_one_template(tmp_path):
+    for name in ["class-a", "class-b", "class-c"]:
+        shutil.copytree(Path("samples", "sample1"), tmp_path / name)
+    # Same template.json, but a different marker image
+    marker = tmp_path / "class-c" / "omr_marker.jpg"
+    marker.write_bytes(marker.read_bytes() + b"\0")
+
+    template_cache = TemplateCache()
+    work_units = []
+    args = {"setLayout": False, "output_dir": str(tmp_path / "outputs")}
+    discover_work_units(tmp_path, tmp_path, args, template_cache, work_units)
+
+    template_indices = {
+        unit.directory.parent.name: unit.template_index for unit in work_units
+    }
+    # The marker of a reused template must still be excluded in every folder
+    assert all(len(unit.omr_files) == 1 for unit in work_units)
+    assert template_indices["class-a"] == template_indices["class-b"]
+    assert template_indices["class-c"] != template_indices["class-a"]
+    assert len(template_cache.templates) == 2
+
+
+def test_streamed_discovery_finds_the_same_sheets(tmp_path):
+    shutil.copytree(Path("samples", "sample1"), tmp_path / "class-a")
+    for name in ["extra.PNG", ".hidden.png", "notes.txt"]:
+        (tmp_path / "class-a" / "MobileCamera" / name).write_bytes(b"")
+
+    discovered = {}
+    for stream in [False, True]:
+        work_units = []
+        args = {
+            "setLayout": False,
+            "stream": stream,
+            "output_dir": str(tmp_path / "outputs"),
+        }
+        discover_work_units(tmp_path, tmp_path, args, TemplateCache(), work_units)
+        discovered[stream] = [
+            (unit.directory, sorted(unit.omr_files)) for unit in work_units
+        ]
+
+    assert discovered[True] == discovered[False]
+    assert [path.name for path in discovered[False][0][1]] == [
+        "extra.PNG",
+        "sheet1.jpg",
+    ]
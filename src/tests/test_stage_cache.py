@@ -0,0 +1,55 @@
+from argparse import Namespace
+from copy import deepcopy
+
+import cv2
+import numpy as np
+from dotmap import DotMap
+
+from src.core import ImageInstanceOps
+from src.defaults import CONFIG_DEFAULTS
+from src.processors.builtins import GaussianBlur
+from src.processors.CropPage import CropPage
+
+
+def test_downstream_change_reuses_the_cached_page(tmp_path, monkeypatch):
+    image = np.full((1000, 800), 30, dtype=np.uint8)
+    cv2.fillPoly(image, [np.int32([[80, 60], [560, 90], [540, 760], [70, 730]])], 230)
+    cv2.circle(image, (300, 400), 40, 0, -1)
+    file_path = tmp_path / "sheet.png"
+    cv2.imwrite(str(file_path), image)
+
+    config = deepcopy(CONFIG_DEFAULTS)
+    config.preprocessing.stage_cache_dir = str(tmp_path / "cache")
+    processor_args = {
+        "relative_dir": ".",
+        "image_instance_ops": DotMap({"tuning_config": config}),
+    }
+
+    def run(kernel_size):
+        template = Namespace(
+            pre_processors=[
+                CropPage(options={}, **processor_args),
+                GaussianBlur(
+                    options={"kSize": [kernel_size, kernel_size]}, **processor_args
+                ),
+            ]
+        )
+        return ImageInstanceOps(config).apply_preprocessors(file_path, None, template)
+
+    first = run(3)
+    crop_calls = []
+    original_apply_filter = CropPage.apply_filter
+
+    def apply_filter(self, *args):
+        crop_calls.append(args)
+        return original_apply_filter(self, *args)
+
+    monkeypatch.setattr(CropPage, "apply_filter", apply_filter)
+
+    assert np.array_equal(run(3), first)
+    blurred_more = run(7)
+    assert crop_calls == []
+
+    config.preprocessing.stage_cache_dir = ""
+    assert np.array_equal(run(7), blurred_more)
+    assert len(crop_calls) == 1
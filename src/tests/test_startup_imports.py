@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+# Only needed for debug windows/plots and rich console output
+DEFERRED_MODULES = ["matplotlib", "screeninfo", "rich"]
+
+
+def test_headless_startup_defers_optional_imports():
+    code = (
+        "import sys; import src.entry; "
+        f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "OMR_FAST_STARTUP": "1"},
+    ).stdout
+    assert output.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,173 @@
+"""
+Input adapters for files holding several sheets: multi-page TIFFs, PDFs and ZIPs.
+
+Each sheet inside a container is a ContainerPage identified as `container#page`
+(1-based page numbers, or the member name for ZIPs). Pages are decoded straight
+from the container when processed, nothing is extracted to disk.
+"""
+import hashlib
+import os
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.constants.common import IMAGE_EXTENSIONS
+from src.logger import logger
+
+TIFF_EXTENSIONS = frozenset({".tif", ".tiff"})
+CONTAINER_EXTENSIONS = frozenset({".pdf", ".zip"})
+# Resolution PDF pages are rasterized at
+PDF_RENDER_DPI = 200
+
+
+class ContainerPage:
+    """A sheet inside a container file, used wherever a sheet's file path is"""
+
+    def __init__(self, container, page):
+        self.container = Path(container)
+        self.page = page
+
+    @property
+    def name(self):
+        return f"{self.container.name}#{self.page}"
+
+    @property
+    def parent(self):
+        return self.container.parent
+
+    def __str__(self):
+        return f"{self.container}#{self.page}"
+
+    def __repr__(self):
+        return f"ContainerPage('{self}')"
+
+    def __eq__(self, other):
+        return isinstance(other, ContainerPage) and str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def read(self):
+        suffix = self.container.suffix.lower()
+        if suffix == ".zip":
+            data = open_zip(self.container).read(self.page)
+            return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if suffix == ".pdf":
+            return render_pdf_page(self.container, self.page - 1)
+        _ok, pages = cv2.imreadmulti(
+            str(self.container), self.page - 1, 1, flags=cv2.IMREAD_GRAYSCALE
+        )
+        return pages[0] if pages else None
+
+    def digest(self):
+        if self.container.suffix.lower() == ".zip":
+            data = open_zip(self.container).read(self.page)
+            return hashlib.sha1(data).hexdigest()
+        stat = self.container.stat()
+        container_digest = file_digest(self.container, stat.st_mtime_ns, stat.st_size)
+        return hashlib.sha1(f"{container_digest}#{self.page}".encode()).hexdigest()
+
+
+def is_sheet_file(file_name):
+    extension = os.path.splitext(file_name)[1].lower()
+    return extension in IMAGE_EXTENSIONS or extension in CONTAINER_EXTENSIONS
+
+
+def expand_sheet_file(file_path):
+    """Yields the sheets of an input file: the file itself, or its pages"""
+    suffix = file_path.suffix.lower()
+    if suffix in TIFF_EXTENSIONS:
+        page_count = cv2.imcount(str(file_path))
+        if page_count > 1:
+            for page in range(1, page_count + 1):
+                yield ContainerPage(file_path, page)
+            return
+    elif suffix == ".zip":
+        members = sorted(
+            member.filename
+            for member in open_zip(file_path).infolist()
+            if not member.is_dir()
+            and not any(
+                part.startswith(".") or part == "__MACOSX"
+                for part in member.filename.split("/")
+            )
+            and os.path.splitext(member.filename)[1].lower() in IMAGE_EXTENSIONS
+        )
+        for member in members:
+            yield ContainerPage(file_path, member)
+        return
+    elif suffix == ".pdf":
+        fitz = import_fitz()
+        if fitz is None:
+            logger.warning(
+                f"PyMuPDF is not installed; skipping PDF '{file_path}' (pip install pymupdf)"
+            )
+            return
+        with fitz.open(file_path) as document:
+            page_count = document.page_count
+        for page in range(1, page_count + 1):
+            yield ContainerPage(file_path, page)
+        return
+    yield file_path
+
+
+def read_sheet(sheet):
+    """Grayscale image of a sheet: an image path or a ContainerPage"""
+    if isinstance(sheet, ContainerPage):
+        return sheet.read()
+    return cv2.imread(str(sheet), cv2.IMREAD_GRAYSCALE)
+
+
+def get_output_name(sheet):
+    """File name for images saved for a sheet (marked sheets, stacks)"""
+    if not isinstance(sheet, ContainerPage):
+        return sheet.name
+    name = sheet.name.replace("/", "_")
+    if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+        name += ".png"
+    return name
+
+
+@lru_cache(maxsize=8)
+def open_zip_in_process(zip_path, _pid):
+    return zipfile.ZipFile(zip_path)
+
+
+def open_zip(zip_path):
+    # Handles are per process: a forked worker must not share the parent's file offset
+    return open_zip_in_process(Path(zip_path), os.getpid())
+
+
+@lru_cache(maxsize=32)
+def file_digest(file_path, _mtime_ns, _size):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def import_fitz():
+    try:
+        import fitz
+    except ImportError:
+        return None
+    return fitz
+
+
+def render_pdf_page(pdf_path, page_index):
+    fitz = import_fitz()
+    if fitz is None:
+        logger.error(f"PyMuPDF is not installed, cannot read '{pdf_path}'")
+        return None
+    with fitz.open(pdf_path) as document:
+        pixmap = document[page_index].get_pixmap(
+            dpi=PDF_RENDER_DPI, colorspace=fitz.csGRAY, alpha=False
+        )
+    image = np.frombuffer(pixmap.samples, np.uint8).reshape(
+        pixmap.height, pixmap.stride
+    )
+    return image[:, : pixmap.width].copy()
@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+import cv2
+
+from src.constants.image_processing import DEBUG_BUFFER_MAX_BYTES
+from src.logger import logger
+
+
+class DebugImageBuffer:
+    """Intermediate images of the sheet being processed, for the stacks saved with
+    outputs.save_image_level.
+
+    Images are stored as thumbnails no taller than `thumbnail_height`, up to
+    `max_bytes` per sheet. At level 0 nothing is stored or copied.
+    """
+
+    def __init__(self, level, thumbnail_height, max_bytes=DEBUG_BUFFER_MAX_BYTES):
+        self.level = int(level)
+        self.thumbnail_height = int(thumbnail_height)
+        self.max_bytes = max_bytes
+        self.images = defaultdict(list)
+        self.size = 0
+        self.is_full = False
+
+    def append(self, key, image):
+        if self.level < int(key):
+            return
+        height, width = image.shape[:2]
+        if height > self.thumbnail_height:
+            thumbnail = cv2.resize(
+                image,
+                (
+                    max(1, width * self.thumbnail_height // height),
+                    self.thumbnail_height,
+                ),
+                interpolation=cv2.INTER_AREA,
+            )
+        else:
+            thumbnail = image.copy()
+        if self.size + thumbnail.nbytes > self.max_bytes:
+            if not self.is_full:
+                logger.warning(
+                    f"Debug image buffer is full ({self.max_bytes // (1024 * 1024)}MB), skipping further stack images of this sheet"
+                )
+                self.is_full = True
+            return
+        self.images[key].append(thumbnail)
+        self.size += thumbnail.nbytes
+
+    def get(self, key):
+        return self.images.get(key, [])
+
+    def reset(self):
+        if self.size:
+            self.images.clear()
+            self.size = 0
+        self.is_full = False
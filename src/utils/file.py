@@ -1,12 +1,15 @@
 import argparse
+import csv
 import json
 import os
 from csv import QUOTE_NONNUMERIC
+from pathlib import Path
 from time import gmtime, strftime
 
 import pandas as pd
 
 from src.logger import logger
+from src.utils.containers import expand_sheet_file, is_sheet_file
 
 
 def load_json(path, **rest):
@@ -21,6 +24,78 @@ def load_json(path, **rest):
     return loaded
 
 
+def iter_csv_rows(csv_path, encoding="utf-8-sig"):
+    """Yield the rows of a CSV file one at a time, skipping blank lines."""
+    with open(csv_path, "r", encoding=encoding, newline="") as f:
+        for row in csv.reader(f):
+            if row:
+                yield row
+
+
+def write_rows_to_xlsx(output, sheets):
+    """Write (sheet_title, rows) pairs into an XLSX using openpyxl's write-only mode.
+
+    Rows are appended one at a time and flushed to temporary files by openpyxl,
+    so memory stays flat regardless of the number of rows.
+    `output` can be a path or a binary file object.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    try:
+        for title, rows in sheets:
+            worksheet = workbook.create_sheet(title=title)
+            for row in rows:
+                worksheet.append(row)
+        workbook.save(output)
+    except Exception:
+        # Finalize half-written sheets now rather than at garbage collection,
+        # when their temporary streams are already gone.
+        for worksheet in workbook.worksheets:
+            if getattr(worksheet, "_rows", None) is not None:
+                worksheet._rows.close()
+        raise
+
+
+def scan_directory(directory, excluded_files=frozenset()):
+    """Yields ("file", path) for each input file (images and sheet containers) and
+    ("dir", path) for each sub-directory of `directory`, in a single os.scandir pass"""
+    excluded_paths = {str(path) for path in excluded_files}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield "dir", Path(entry.path)
+            elif (
+                # Hidden files are skipped, as glob("*.png") did
+                not entry.name.startswith(".")
+                and is_sheet_file(entry.name)
+                and entry.path not in excluded_paths
+                and entry.is_file()
+            ):
+                yield "file", Path(entry.path)
+
+
+class DirectoryImages:
+    """The input sheets of a directory, re-scanned on each iteration instead of
+    being held in memory. Yields them in directory order, container pages in
+    page order."""
+
+    def __init__(self, directory, excluded_files=frozenset()):
+        self.directory = directory
+        self.excluded_files = excluded_files
+
+    def __iter__(self):
+        for kind, path in scan_directory(self.directory, self.excluded_files):
+            if kind == "file":
+                yield from expand_sheet_file(path)
+
+    def __bool__(self):
+        return next(iter(self), None) is not None
+
+    def __repr__(self):
+        return f"DirectoryImages('{self.directory}')"
+
+
 class Paths:
     def __init__(self, output_dir):
         self.output_dir = output_dir
@@ -67,7 +142,6 @@ def setup_outputs_for_template(paths, template):
         "file_id",
         "score",
     ] + template.grouped_output_columns
-    ns.OUTPUT_SET = []
     ns.files_obj = {}
     # Use UTC timestamp for deterministic file naming (also avoids timezone-dependent test failures).
     TIME_NOW = strftime("%Y%m%d_%H%M%S", gmtime())
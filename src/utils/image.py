@@ -7,15 +7,21 @@
 
 """
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 
 from src.logger import logger
 
-plt.rcParams["figure.figsize"] = (10.0, 8.0)
 CLAHE_HELPER = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(8, 8))
 
 
+def get_pyplot():
+    """matplotlib.pyplot, imported on first use as only the debug plots need it"""
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["figure.figsize"] = (10.0, 8.0)
+    return plt
+
+
 class ImageUtils:
     """A Static-only Class to hold common image processing utilities & wrappers over OpenCV functions"""
 
@@ -72,6 +78,14 @@ class ImageUtils:
     def normalize_util(img, alpha=0, beta=255):
         return cv2.normalize(img, alpha, beta, norm_type=cv2.NORM_MINMAX)
 
+    @staticmethod
+    def normalize_range_util(img, low, high, alpha=0, beta=255):
+        """normalize_util as if the minimum and maximum of `img` were `low` and
+        `high`, e.g. those of the larger image it is a part of"""
+        values = np.arange(low, high + 1, dtype=np.uint8)
+        table = ImageUtils.normalize_util(values, alpha, beta).ravel()
+        return cv2.LUT(img, np.pad(table, (low, 255 - high), mode="edge"))
+
     @staticmethod
     def auto_canny(image, sigma=0.93):
         # compute the median of the single channel pixel intensities
@@ -97,8 +111,34 @@ class ImageUtils:
         # apply gamma correction using the lookup table
         return cv2.LUT(image, table)
 
+    @staticmethod
+    def scale_matrix(from_size, to_size):
+        """3x3 matrix of the mapping cv2.resize does from (w, h) to (w, h)"""
+        scale_x = to_size[0] / from_size[0]
+        scale_y = to_size[1] / from_size[1]
+        # cv2.resize aligns pixel centres, not pixel corners
+        return np.array(
+            [
+                [scale_x, 0, 0.5 * scale_x - 0.5],
+                [0, scale_y, 0.5 * scale_y - 0.5],
+                [0, 0, 1],
+            ]
+        )
+
     @staticmethod
     def four_point_transform(image, pts):
+        transform_matrix, (
+            max_width,
+            max_height,
+        ) = ImageUtils.four_point_transform_matrix(pts)
+        warped = cv2.warpPerspective(image, transform_matrix, (max_width, max_height))
+
+        # return the warped image
+        return warped
+
+    @staticmethod
+    def four_point_transform_matrix(pts):
+        """Perspective matrix and output (w, h) of four_point_transform"""
         # obtain a consistent order of the points and unpack them
         # individually
         rect = ImageUtils.order_points(pts)
@@ -133,10 +173,7 @@ class ImageUtils:
         )
 
         transform_matrix = cv2.getPerspectiveTransform(rect, dst)
-        warped = cv2.warpPerspective(image, transform_matrix, (max_width, max_height))
-
-        # return the warped image
-        return warped
+        return transform_matrix, (max_width, max_height)
 
     @staticmethod
     def order_points(pts):
@@ -0,0 +1,81 @@
+import queue
+import threading
+
+import cv2
+
+from src.logger import logger
+
+
+def get_write_params(extension, quality):
+    """cv2.imwrite parameters applying `quality` (1-100) to lossy formats"""
+    extension = extension.lower()
+    if extension in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if extension == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    return []
+
+
+class ImageWriter:
+    """Encodes and writes images on background threads.
+
+    Images wait in a bounded queue: when the disk falls behind, submit() blocks
+    instead of holding more images in memory. With 0 threads, images are written
+    on the calling thread. Threads start with the first image and stop on close().
+    """
+
+    def __init__(self, threads=0, queue_size=None):
+        self.threads = int(threads)
+        self.queue = (
+            queue.Queue(maxsize=queue_size or 2 * self.threads)
+            if self.threads
+            else None
+        )
+        self.workers = []
+
+    def submit(self, path, image, params=()):
+        """Write `image` to `path`; the image must not be modified afterwards"""
+        if self.queue is None:
+            self.write(path, image, params)
+            return
+        if not self.workers:
+            self.start()
+        self.queue.put((path, image, params))
+
+    def start(self):
+        for _ in range(self.threads):
+            worker = threading.Thread(target=self.run, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, image, params = item
+            try:
+                self.write(path, image, params)
+            except Exception as error:
+                logger.error(f"Failed to write image '{path}': {error}")
+            finally:
+                self.queue.task_done()
+
+    @staticmethod
+    def write(path, image, params):
+        if not cv2.imwrite(path, image, params):
+            logger.error(f"Failed to write image '{path}'")
+
+    def flush(self):
+        """Wait until every submitted image is on disk"""
+        if self.queue is not None:
+            self.queue.join()
+
+    def close(self):
+        """Write the pending images and stop the threads"""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
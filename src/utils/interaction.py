@@ -1,24 +1,30 @@
+from collections import Counter
 from dataclasses import dataclass
+from functools import lru_cache
 
 import cv2
-from screeninfo import get_monitors
 
 from src.logger import logger
 from src.utils.image import ImageUtils
 
-try:
-    monitor_window = get_monitors()[0]
-    _DEFAULT_WINDOW_WIDTH = monitor_window.width
-    _DEFAULT_WINDOW_HEIGHT = monitor_window.height
-except Exception:
-    _DEFAULT_WINDOW_WIDTH = 1920
-    _DEFAULT_WINDOW_HEIGHT = 1080
+
+@lru_cache(maxsize=None)
+def get_screen_size():
+    """(width, height) of the first monitor, queried only once a window is shown"""
+    try:
+        from screeninfo import get_monitors
+
+        monitor_window = get_monitors()[0]
+        return monitor_window.width, monitor_window.height
+    except Exception:
+        return 1920, 1080
 
 
 @dataclass
 class ImageMetrics:
     # TODO: Move TEXT_SIZE, etc here and find a better class name
-    window_width, window_height = _DEFAULT_WINDOW_WIDTH, _DEFAULT_WINDOW_HEIGHT
+    # Set from get_screen_size() when the first window is shown
+    window_width, window_height = None, None
     # for positioning image windows
     window_x, window_y = 0, 0
     reset_pos = [0, 0]
@@ -68,6 +74,8 @@ class InteractionUtils:
             return
 
         h, w = img.shape[:2]
+        if image_metrics.window_width is None:
+            image_metrics.window_width, image_metrics.window_height = get_screen_size()
 
         # Set next window position
         margin = 25
@@ -102,6 +110,8 @@ class Stats:
     # veryBadPoints = []
     files_moved = 0
     files_not_moved = 0
+    # Sheets read by each escalation tier
+    tier_counts = Counter()
 
 
 def wait_q():
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+from src.logger import logger
+from src.utils.containers import ContainerPage
+
+# Bump when the meaning of cached images changes
+STAGE_CACHE_VERSION = 1
+
+
+class StageCache:
+    """On-disk cache of intermediate (preprocessed) images.
+
+    The image after preprocessor stage `k` is keyed by the hash of the input
+    file plus everything that can change stages 0..k: the processing size and
+    each stage's name, options and dependency files (markers, reference images).
+    Tuning later stages or the bubble detection therefore reuses the longest
+    unchanged prefix instead of re-decoding and re-warping every image.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_digest(file_path):
+        if isinstance(file_path, ContainerPage):
+            return file_path.digest()
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def stage_description(pre_processor):
+        dependencies = []
+        for path in pre_processor.exclude_files():
+            try:
+                stat = os.stat(path)
+                dependencies.append([str(path), stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                dependencies.append([str(path), None, None])
+        return [type(pre_processor).__name__, pre_processor.options, dependencies]
+
+    def stage_keys(self, file_path, tuning_config, pre_processors, extra=None):
+        """Cache key of the image after each preprocessor (same order as `pre_processors`)"""
+        dimensions = tuning_config.dimensions
+        digest = hashlib.sha1(
+            json.dumps(
+                [
+                    STAGE_CACHE_VERSION,
+                    self.file_digest(file_path),
+                    dimensions.processing_width,
+                    dimensions.processing_height,
+                    extra,
+                ],
+                default=str,
+            ).encode()
+        )
+        keys = []
+        for pre_processor in pre_processors:
+            digest.update(
+                json.dumps(
+                    self.stage_description(pre_processor), sort_keys=True, default=str
+                ).encode()
+            )
+            keys.append(digest.hexdigest())
+        return keys
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def load(self, key):
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+    def store(self, key, image):
+        if image.dtype not in (np.uint8, np.uint16):
+            # Not representable losslessly as PNG
+            return
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the target and rename, so readers never see partial files
+        temp_path = f"{path[:-4]}.{os.getpid()}.tmp.png"
+        try:
+            # Lossless and quick to write; the cache favours speed over size
+            cv2.imwrite(temp_path, image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            os.replace(temp_path, path)
+        except (OSError, cv2.error) as error:
+            logger.warning(f"Could not write stage cache '{path}': {error}")
+
+    def longest_prefix(self, keys):
+        """(number of stages already done, cached image after them) or (0, None)"""
+        for done in range(len(keys), 0, -1):
+            image = self.load(keys[done - 1])
+            if image is not None:
+                return done, image
+        return 0, None
@@ -10,7 +10,6 @@ import re
 
 import jsonschema
 from jsonschema import validate
-from rich.table import Table
 
 from src.logger import console, logger
 from src.schemas import SCHEMA_JSONS, SCHEMA_VALIDATORS
@@ -21,9 +20,7 @@ def validate_evaluation_json(json_data, evaluation_path):
     try:
         validate(instance=json_data, schema=SCHEMA_JSONS["evaluation"])
     except jsonschema.exceptions.ValidationError as _err:  # NOQA
-        table = Table(show_lines=True)
-        table.add_column("Key", style="cyan", no_wrap=True)
-        table.add_column("Error", style="magenta")
+        table = new_error_table()
 
         errors = sorted(
             SCHEMA_VALIDATORS["evaluation"].iter_errors(json_data),
@@ -50,9 +47,7 @@ def validate_template_json(json_data, template_path):
     try:
         validate(instance=json_data, schema=SCHEMA_JSONS["template"])
     except jsonschema.exceptions.ValidationError as _err:  # NOQA
-        table = Table(show_lines=True)
-        table.add_column("Key", style="cyan", no_wrap=True)
-        table.add_column("Error", style="magenta")
+        table = new_error_table()
 
         errors = sorted(
             SCHEMA_VALIDATORS["template"].iter_errors(json_data),
@@ -85,9 +80,7 @@ def validate_config_json(json_data, config_path):
     try:
         validate(instance=json_data, schema=SCHEMA_JSONS["config"])
     except jsonschema.exceptions.ValidationError as _err:  # NOQA
-        table = Table(show_lines=True)
-        table.add_column("Key", style="cyan", no_wrap=True)
-        table.add_column("Error", style="magenta")
+        table = new_error_table()
         errors = sorted(
             SCHEMA_VALIDATORS["config"].iter_errors(json_data),
             key=lambda e: e.path,
@@ -107,6 +100,16 @@ def validate_config_json(json_data, config_path):
         raise Exception(f"Provided config JSON is Invalid: '{config_path}'") from None
 
 
+def new_error_table():
+    # rich.table is only needed to report invalid files
+    from rich.table import Table
+
+    table = Table(show_lines=True)
+    table.add_column("Key", style="cyan", no_wrap=True)
+    table.add_column("Error", style="magenta")
+    return table
+
+
 def parse_validation_error(error):
     return (
         (error.path[0] if len(error.path) > 0 else "$root"),
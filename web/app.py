@@ -14,14 +14,17 @@ import sys
 import uuid
 import shutil
 import io
+import csv
 import json
+import tempfile
+import itertools
 from pathlib import Path
 from datetime import datetime
 
 # Add parent directory to path to import src modules
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
@@ -29,6 +32,7 @@ from werkzeug.utils import secure_filename
 from services.omr_service import OMRService
 from services.scanner_service import ScannerService
 from services.analysis_service import AnalysisService
+from src.utils.file import write_rows_to_xlsx
 
 # Configuration
 UPLOAD_FOLDER = Path(__file__).parent / 'uploads'
@@ -52,14 +56,156 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 omr_service = OMRService(UPLOAD_FOLDER, RESULTS_FOLDER)
 scanner_service = ScannerService(UPLOAD_FOLDER, socketio, omr_service=omr_service)
 analysis_service = AnalysisService(RESULTS_FOLDER)
+omr_service.add_session_listener(analysis_service.invalidate_session)
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _attachment_headers(download_name):
+    return {'Content-Disposition': f'attachment; filename="{download_name}"'}
+
+
+def stream_csv_response(header, rows, download_name):
+    """Stream CSV rows to the client as they are read (UTF-8 with BOM for Excel)."""
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        writer.writerow(header)
+        yield buf.getvalue().encode('utf-8-sig')
+        buf.seek(0)
+        buf.truncate()
+        for row in rows:
+            writer.writerow(row)
+            if buf.tell() >= STREAM_CHUNK_SIZE:
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode('utf-8')
+
+    return Response(
+        stream_with_context(generate()),
+        content_type='text/csv; charset=utf-8',
+        headers=_attachment_headers(download_name),
+    )
+
+
+def stream_xlsx_response(sheets, download_name):
+    """Build an XLSX in openpyxl write-only mode on disk and stream it in chunks.
+
+    Rows are consumed lazily from `sheets` ((title, rows) pairs), so memory stays
+    flat regardless of session size; the spooled file is removed once sent.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_rows_to_xlsx(tmp, sheets)
+    tmp.seek(0)
+
+    def generate():
+        try:
+            while True:
+                chunk = tmp.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            tmp.close()
+
+    return Response(
+        generate(),
+        mimetype=XLSX_MIMETYPE,
+        headers=_attachment_headers(download_name),
+    )
+
+
 # ==================== Static Routes ====================
 
+SCORE_SHEET_COLUMNS = [
+    ('student_id', 'Öğrenci No'),
+    ('student_name', 'Ad Soyad'),
+    ('tc_kimlik', 'TC Kimlik'),
+    ('correct_count', 'Doğru'),
+    ('wrong_count', 'Yanlış'),
+    ('empty_count', 'Boş'),
+    ('score', 'Puan'),
+    ('answers', 'Cevaplar'),
+]
+
+CHEATING_SHEET_COLUMNS = [
+    ('student_a', 'Öğrenci 1'),
+    ('student_b', 'Öğrenci 2'),
+    ('score_a', 'Puan 1'),
+    ('score_b', 'Puan 2'),
+    ('gbt_z', 'Z-Skoru'),
+    ('w_agreements', 'Ortak Yanlış'),
+    ('agreements', 'Ortak Cevap'),
+    ('wrongs_a', 'Yanlış 1'),
+    ('wrongs_b', 'Yanlış 2'),
+    ('wesolowsky', 'Wesolowsky Skoru'),
+    ('k_index_ab', 'K-İndeks (1→2)'),
+    ('k_index_ba', 'K-İndeks (2→1)'),
+]
+
+LEGACY_CHEATING_RENAMES = {
+    'student1_id': 'Öğrenci 1',
+    'student2_id': 'Öğrenci 2',
+    'similarity_ratio': 'Harpp-Hogan İndeksi',
+    'common_wrong_answers': 'Ortak Yanlış',
+    'details': 'Detaylar',
+}
+LEGACY_CHEATING_DROPPED = {'student1_file', 'student2_file', 'pearson_correlation', 'student_a', 'student_b'}
+
+
+def _xlsx_cell(value):
+    """openpyxl only accepts scalars; flatten anything else to text."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _score_sheet_rows(results):
+    first = results[0] if results else {}
+    present = [(key, title) for key, title in SCORE_SHEET_COLUMNS if key in first]
+    yield [title for _, title in present]
+    for result in results:
+        yield [_xlsx_cell(result.get(key)) for key, _ in present]
+
+
+def _score_summary_rows(results):
+    """Yield 'Öğrenci No;puan1;puan2;...' lines from the per-question points, one per student."""
+    yield ['Özet']
+    for result in results:
+        student_id = result.get('student_id', '')
+        per_question_scores = result.get('question_points', [])
+        score_str = ';'.join(str(int(s) if s == int(s) else s) for s in per_question_scores)
+        yield [f"{student_id};{score_str}"]
+
+
+def _cheating_sheet_rows(results):
+    if not results:
+        yield ['Durum']
+        yield ['Şüpheli kopya tespit edilmedi']
+        return
+
+    if 'gbt_z' in results[0]:
+        present = [(key, title) for key, title in CHEATING_SHEET_COLUMNS if key in results[0]]
+        yield [title for _, title in present]
+        for result in sorted(results, key=lambda r: r.get('gbt_z', 0.0), reverse=True):
+            yield [_xlsx_cell(result.get(key)) for key, _ in present]
+        return
+
+    # Legacy format
+    keys = [key for key in results[0] if key not in LEGACY_CHEATING_DROPPED]
+    yield [LEGACY_CHEATING_RENAMES.get(key, key) for key in keys]
+    for result in results:
+        yield [_xlsx_cell(result.get(key)) for key in keys]
+
+
 @app.route('/')
 def index():
     return send_from_directory('static', 'index.html')
@@ -188,18 +334,11 @@ def get_results(session_id):
 
 @app.route('/api/results/<session_id>/csv', methods=['GET'])
 def download_csv(session_id):
-    """Download results as CSV"""
+    """Download results as CSV (streamed row by row)"""
     try:
         kind = request.args.get("kind")
-        df = omr_service.read_results_dataframe(session_id, kind)
-        csv_text = df.to_csv(index=False)
-        buf = io.BytesIO(csv_text.encode("utf-8-sig"))
-        return send_file(
-            buf,
-            mimetype="text/csv; charset=utf-8",
-            as_attachment=True,
-            download_name=f"results_{session_id}.csv",
-        )
+        header, rows = omr_service.iter_results_rows(session_id, kind)
+        return stream_csv_response(header, rows, f"results_{session_id}.csv")
     except FileNotFoundError:
         return jsonify({'error': 'Results not found'}), 404
 
@@ -216,26 +355,32 @@ def get_cheating_report(session_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/results/<session_id>/item-statistics', methods=['GET'])
+def get_item_statistics(session_id):
+    """Get item statistics (difficulty, discrimination, distractors), also during processing"""
+    try:
+        return jsonify(omr_service.get_item_statistics(session_id))
+    except FileNotFoundError:
+        return jsonify({'error': 'Item statistics not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/results/<session_id>/excel', methods=['GET'])
 def download_excel(session_id):
-    """Download results as Excel (XLSX)."""
+    """Download results as Excel (XLSX), written in openpyxl write-only mode."""
     try:
         kind = request.args.get("kind")
-        df = omr_service.read_results_dataframe(session_id, kind)
+        header, rows = omr_service.iter_results_rows(session_id, kind)
 
         try:
             import openpyxl  # noqa: F401
         except Exception:
             return jsonify({'error': 'Excel export requires openpyxl. Install web/requirements.txt.'}), 500
 
-        buf = io.BytesIO()
-        df.to_excel(buf, index=False, engine="openpyxl")
-        buf.seek(0)
-        return send_file(
-            buf,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=f"results_{session_id}.xlsx",
+        return stream_xlsx_response(
+            [("Sheet1", itertools.chain([header], rows))],
+            f"results_{session_id}.xlsx",
         )
     except FileNotFoundError:
         return jsonify({'error': 'Results not found'}), 404
@@ -447,13 +592,12 @@ def download_scores_excel(session_id):
         return jsonify({'error': 'answer_key required'}), 400
 
     try:
-        import pandas as pd
-
         # Calculate scores
         score_result = analysis_service.calculate_scores(
             session_id=session_id,
             answer_key=data['answer_key'],
-            scoring=data.get('scoring')
+            scoring=data.get('scoring'),
+            include_question_points=True
         )
 
         # Also run cheating detection automatically
@@ -468,112 +612,13 @@ def download_scores_excel(session_id):
             answer_key=data['answer_key']
         )
 
-        # Create scores DataFrame
-        df_scores = pd.DataFrame(score_result['results'])
-        df_scores = df_scores.rename(columns={
-            'student_id': 'Öğrenci No',
-            'student_name': 'Ad Soyad',
-            'tc_kimlik': 'TC Kimlik',
-            'correct_count': 'Doğru',
-            'wrong_count': 'Yanlış',
-            'empty_count': 'Boş',
-            'score': 'Puan',
-            'answers': 'Cevaplar',
-            'file_name': 'Dosya'
-        })
-        cols = ['Öğrenci No', 'Ad Soyad', 'TC Kimlik', 'Doğru', 'Yanlış', 'Boş', 'Puan', 'Cevaplar']
-        df_scores = df_scores[[c for c in cols if c in df_scores.columns]]
-
-        # Create score summary sheet (Öğrenci No;Soru1Puan;Soru2Puan;...)
-        # Get per-question scores for each student
-        answer_key = data['answer_key']
-        scoring = data.get('scoring', {})
-        correct_pts = scoring.get('correct_points', 1.0) if scoring else 1.0
-        wrong_pts = scoring.get('wrong_points', 0.0) if scoring else 0.0
-        empty_pts = scoring.get('empty_points', 0.0) if scoring else 0.0
-        
-        score_summary_data = []
-        for result in score_result['results']:
-            student_id = result.get('student_id', '')
-            answers = result.get('answers', '')
-            question_cols = score_result.get('question_columns', [])
-            
-            per_question_scores = []
-            for i, answer in enumerate(answers):
-                q_num = i + 1
-                correct_answer = str(answer_key.get(str(q_num), answer_key.get(q_num, ''))).strip().upper()
-                
-                if answer in ('-', '', ' ', '*'):
-                    per_question_scores.append(empty_pts)
-                elif answer.upper() == correct_answer:
-                    per_question_scores.append(correct_pts)
-                else:
-                    per_question_scores.append(wrong_pts)
-            
-            # Format as: Ogrenci No;puan1;puan2;puan3;...
-            score_str = ';'.join(str(int(s) if s == int(s) else s) for s in per_question_scores)
-            summary_line = f"{student_id};{score_str}"
-            score_summary_data.append({'Özet': summary_line})
-        
-        df_summary = pd.DataFrame(score_summary_data)
-
-        # Create cheating DataFrame
-        df_cheating = pd.DataFrame(cheating_result['results'])
-        if not df_cheating.empty:
-            # Check if advanced metrics exist
-            if 'gbt_z' in df_cheating.columns:
-                df_cheating = df_cheating.rename(columns={
-                    'student_a': 'Öğrenci 1',
-                    'student_b': 'Öğrenci 2',
-                    'score_a': 'Puan 1',
-                    'score_b': 'Puan 2',
-                    'gbt_z': 'Z-Skoru',
-                    'w_agreements': 'Ortak Yanlış',
-                    'agreements': 'Ortak Cevap',
-                    'wrongs_a': 'Yanlış 1',
-                    'wrongs_b': 'Yanlış 2',
-                    'wesolowsky': 'Wesolowsky Skoru',
-                    'k_index_ab': 'K-İndeks (1→2)',
-                    'k_index_ba': 'K-İndeks (2→1)'
-                })
-                # Select all available columns in order
-                cols = ['Öğrenci 1', 'Öğrenci 2', 'Puan 1', 'Puan 2', 
-                        'Z-Skoru', 'Ortak Yanlış', 'Ortak Cevap',
-                        'Yanlış 1', 'Yanlış 2', 'Wesolowsky Skoru',
-                        'K-İndeks (1→2)', 'K-İndeks (2→1)']
-                cols = [c for c in cols if c in df_cheating.columns]
-                df_cheating = df_cheating[cols]
-                if 'Z-Skoru' in df_cheating.columns:
-                    df_cheating = df_cheating.sort_values(by='Z-Skoru', ascending=False)
-            else:
-                # Legacy format
-                df_cheating = df_cheating.rename(columns={
-                    'student1_id': 'Öğrenci 1',
-                    'student2_id': 'Öğrenci 2',
-                    'similarity_ratio': 'Harpp-Hogan İndeksi',
-                    'common_wrong_answers': 'Ortak Yanlış',
-                    'details': 'Detaylar'
-                })
-                # Remove unnecessary columns
-                cols_to_drop = ['student1_file', 'student2_file', 'pearson_correlation', 
-                               'student_a', 'student_b']
-                df_cheating = df_cheating.drop(columns=[c for c in cols_to_drop if c in df_cheating.columns], errors='ignore')
-        else:
-            df_cheating = pd.DataFrame({'Durum': ['Şüpheli kopya tespit edilmedi']})
-
-        # Write to Excel with multiple sheets
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df_scores.to_excel(writer, sheet_name='Puanlar', index=False)
-            df_summary.to_excel(writer, sheet_name='Puan Özeti', index=False)
-            df_cheating.to_excel(writer, sheet_name='Kopya Tespit', index=False)
-        buf.seek(0)
-
-        return send_file(
-            buf,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'sonuclar_{session_id[:8]}.xlsx'
+        return stream_xlsx_response(
+            [
+                ('Puanlar', _score_sheet_rows(score_result['results'])),
+                ('Puan Özeti', _score_summary_rows(score_result['results'])),
+                ('Kopya Tespit', _cheating_sheet_rows(cheating_result['results'])),
+            ],
+            f'sonuclar_{session_id[:8]}.xlsx',
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -592,12 +637,14 @@ def detect_cheating(session_id):
     try:
         threshold = float(data.get('threshold', 1.0))
         min_shared_errors = int(data.get('min_shared_errors', 3))
+        top_k = int(data['top_k']) if data.get('top_k') else None
 
         result = analysis_service.detect_cheating(
             session_id=session_id,
             threshold=threshold,
             min_shared_errors=min_shared_errors,
-            answer_key=answer_key
+            answer_key=answer_key,
+            top_k=top_k
         )
         return jsonify(result)
     except FileNotFoundError as e:
@@ -606,6 +653,43 @@ def detect_cheating(session_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/analysis/cheating/exam', methods=['POST'])
+def detect_cheating_across_sessions():
+    """Detect potential cheating across several sessions of one exam"""
+    data = request.get_json() or {}
+    session_ids = data.get('session_ids') or []
+    if not isinstance(session_ids, list) or not session_ids:
+        return jsonify({'error': 'session_ids required'}), 400
+
+    answer_key = data.get('answer_key')
+    if answer_key:
+        answer_key = {int(k): v for k, v in answer_key.items()}
+
+    try:
+        top_k = int(data['top_k']) if data.get('top_k') else None
+        result = analysis_service.detect_cheating_across_sessions(
+            session_ids=[str(s) for s in session_ids],
+            min_shared_errors=int(data.get('min_shared_errors', 3)),
+            answer_key=answer_key,
+            top_k=top_k,
+            cross_session_only=bool(data.get('cross_session_only', False))
+        )
+        return jsonify(result)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/analysis/cheating/exam/<report_id>', methods=['GET'])
+def get_exam_cheating_report(report_id):
+    """Get a saved cross-session cheating report"""
+    report = analysis_service.load_exam_report(report_id)
+    if report is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(report)
+
+
 @app.route('/api/analysis/cheating/<session_id>/excel', methods=['POST'])
 def download_cheating_excel(session_id):
     """Download cheating detection results as Excel"""
@@ -616,12 +700,14 @@ def download_cheating_excel(session_id):
         
         threshold = float(data.get('threshold', 1.0))
         min_shared_errors = int(data.get('min_shared_errors', 3))
+        top_k = int(data['top_k']) if data.get('top_k') else None
 
         result = analysis_service.detect_cheating(
             session_id=session_id,
             threshold=threshold,
             min_shared_errors=min_shared_errors,
-            answer_key=data.get('answer_key')
+            answer_key=data.get('answer_key'),
+            top_k=top_k
         )
         
         df = pd.DataFrame(result['results'])
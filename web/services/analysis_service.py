@@ -3,9 +3,15 @@ Analysis Service for OMRChecker
 Provides answer key management, scoring, and cheating detection
 """
 
+import hashlib
 import json
+import os
 import re
+import threading
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
+from datetime import datetime
 from itertools import combinations
 from pathlib import Path
 from typing import Any, Dict, List, Optional
@@ -17,14 +23,18 @@ try:
 except ImportError:
     HAS_SCIPY = False
 
-# Import CheatingDetector
+# Import CheatingDetector and the compiled scoring engine
 try:
-    from src.cheating_analysis import CheatingDetector
+    from src.cheating_analysis import REPORT_CRITERIA, CheatingDetector
+    from src.evaluation import CompiledEvaluation
+    from src.item_statistics import ItemStatistics
 except ImportError:
     # Handle case where src is not directly importable (e.g. running standalone)
     import sys
     sys.path.append(str(Path(__file__).parent.parent.parent))
-    from src.cheating_analysis import CheatingDetector
+    from src.cheating_analysis import REPORT_CRITERIA, CheatingDetector
+    from src.evaluation import CompiledEvaluation
+    from src.item_statistics import ItemStatistics
 
 
 @dataclass
@@ -41,6 +51,24 @@ class StudentResult:
     score: float = 0.0
 
 
+@dataclass
+class ScoreSheet:
+    """Column-wise scores of one session; per-student fields are row-aligned"""
+    question_cols: List[str]
+    file_names: List[str]
+    student_ids: List[str]
+    student_names: List[str]
+    tc_kimlik: List[str]
+    display_ids: List[str]
+    answers: List[str]
+    correct_counts: Any  # np.ndarray (students,)
+    wrong_counts: Any
+    empty_counts: Any
+    scores: List[float]
+    question_points: Any  # np.ndarray (students, questions)
+    item_statistics: Any  # ItemStatistics over the whole session
+
+
 @dataclass
 class CheatingPair:
     """A pair of students with suspicious similarity"""
@@ -61,6 +89,11 @@ class AnalysisService:
         self.results_folder = Path(results_folder)
         self.answer_keys_folder = self.results_folder / "_answer_keys"
         self.answer_keys_folder.mkdir(parents=True, exist_ok=True)
+        self.exam_reports_folder = self.results_folder / "_exam_reports"
+        # Scores/analysis per (kind, session, results CSV version, parameter hash)
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.analysis_workers = int(os.environ.get("OMR_ANALYSIS_WORKERS", "0") or 0)
 
     def save_answer_key(
         self,
@@ -126,28 +159,46 @@ class AnalysisService:
         self,
         session_id: str,
         answer_key: Dict[str, str],
-        scoring: Optional[Dict[str, float]] = None
+        scoring: Optional[Dict[str, float]] = None,
+        include_question_points: bool = False
     ) -> Dict[str, Any]:
-        """Calculate scores for a session based on answer key"""
-        import pandas as pd
+        """Calculate scores for a session based on answer key
 
+        With include_question_points, every result also carries the points
+        earned per question (same order as question_columns).
+        Results are cached per answer key, scoring and results CSV version;
+        treat the returned dict as read-only.
+        """
         # Default scoring
         if scoring is None:
             scoring = {"correct_points": 1.0, "wrong_points": 0.0, "empty_points": 0.0}
 
-        correct_pts = scoring.get("correct_points", 1.0)
-        wrong_pts = scoring.get("wrong_points", 0.0)
-        empty_pts = scoring.get("empty_points", 0.0)
+        csv_path = self._latest_results_csv(session_id)
+        cache_key = self._cache_key("scores", session_id, csv_path, answer_key, scoring)
+        cached = self._cache_get(cache_key)
+        if cached is None:
+            cached = self._calculate_scores(session_id, csv_path, answer_key, scoring)
+            self._cache_put(cache_key, cached)
 
-        # Load session results
-        session_folder = self.results_folder / session_id
-        results_dir = session_folder / "Results"
+        if include_question_points:
+            return cached
+        return {
+            **cached,
+            "results": [
+                {k: v for k, v in result.items() if k != "question_points"}
+                for result in cached["results"]
+            ]
+        }
 
-        csv_files = list(results_dir.glob("Results_*.csv")) if results_dir.exists() else []
-        if not csv_files:
-            raise FileNotFoundError(f"No results found for session {session_id}")
+    def _calculate_scores(
+        self,
+        session_id: str,
+        csv_path: Path,
+        answer_key: Dict[str, str],
+        scoring: Dict[str, float]
+    ) -> Dict[str, Any]:
+        import pandas as pd
 
-        csv_path = max(csv_files, key=lambda p: p.stat().st_mtime)
         df = pd.read_csv(csv_path, dtype=str, na_filter=False)
 
         # Find question columns (q1, q2, ... or Q1, Q2, ...)
@@ -165,118 +216,55 @@ class AnalysisService:
                 if match:
                     answer_key_nums.add(int(match.group()))
 
-        question_cols = []
-        for q_col in all_question_cols:
-            q_num = self._extract_question_number(q_col)
-            if q_num in answer_key_nums:
-                question_cols.append(q_col)
-
+        question_cols = [
+            q_col for q_col in all_question_cols
+            if self._extract_question_number(q_col) in answer_key_nums
+        ]
         if not question_cols:
             question_cols = all_question_cols
 
-        # Find file/ID column and student info columns
-        file_col = self._find_file_column(df.columns.tolist())
-        student_cols = self._find_student_columns(df.columns.tolist())
-
-        results = []
-        for _, row in df.iterrows():
-            file_name = row.get(file_col, "") if file_col else ""
-            student_id = self._extract_student_id(file_name, row, student_cols)
-            student_name = self._extract_student_name(row, student_cols)
-            
-            # TC Kimlik
-            tc_kimlik = ""
-            if student_cols.get("tc_kimlik"):
-                tc_kimlik = str(row.get(student_cols["tc_kimlik"], "")).strip()
-                if tc_kimlik in ("nan", "None"):
-                    tc_kimlik = ""
-
-            correct = 0
-            wrong = 0
-            empty = 0
-            answers_str = ""
-
-            for q_col in question_cols:
-                # Extract question number from column name
-                q_num = self._extract_question_number(q_col)
-                student_answer = str(row.get(q_col, "")).strip().upper()
-                correct_answer = str(answer_key.get(str(q_num), answer_key.get(q_col, ""))).strip().upper()
-
-                if not student_answer or student_answer in ("", "*", "-", " "):
-                    empty += 1
-                    answers_str += "-"
-                elif student_answer == correct_answer:
-                    correct += 1
-                    answers_str += student_answer
-                else:
-                    wrong += 1
-                    answers_str += student_answer  # Tüm cevaplar büyük harf
-
-            score = (correct * correct_pts) + (wrong * wrong_pts) + (empty * empty_pts)
-
-            results.append(StudentResult(
-                file_name=file_name,
-                student_id=student_id,
-                student_name=student_name,
-                tc_kimlik=tc_kimlik,
-                answers=answers_str,
-                correct_count=correct,
-                wrong_count=wrong,
-                empty_count=empty,
-                score=score
-            ))
+        sheet = self._score_sheet(df, question_cols, answer_key, scoring)
+
+        results = [
+            StudentResult(
+                file_name=sheet.file_names[i],
+                student_id=sheet.student_ids[i],
+                student_name=sheet.student_names[i],
+                tc_kimlik=sheet.tc_kimlik[i],
+                answers=sheet.answers[i],
+                correct_count=int(sheet.correct_counts[i]),
+                wrong_count=int(sheet.wrong_counts[i]),
+                empty_count=int(sheet.empty_counts[i]),
+                score=sheet.scores[i]
+            )
+            for i in range(len(sheet.student_ids))
+        ]
+        result_dicts = [asdict(r) for r in results]
+        for result, points in zip(result_dicts, sheet.question_points.tolist()):
+            result["question_points"] = points
 
         # Sort by score descending
-        results.sort(key=lambda x: (-x.score, x.student_id))
+        order = sorted(range(len(results)), key=lambda i: (-results[i].score, results[i].student_id))
+        results = [results[i] for i in order]
+        result_dicts = [result_dicts[i] for i in order]
 
-        # Run Advanced Cheating Analysis
-        # We need to construct the DataFrame expected by CheatingDetector or pass the one we have
-        # CheatingDetector expects a DataFrame with columns matching the questions
+        # Run Advanced Cheating Analysis on the same frame, labelled with the IDs found above
         try:
-            # We already have df with question columns
-            # But df has string answers. CheatingDetector handles strings.
-            # We need to pass the answer key and question columns order
-            
-            # Map answer key (e.g. {"1": "A"}) to column names (e.g. "q1") for CheatingDetector
-            detector_key = {}
-            for q_col in question_cols:
-                q_num = self._extract_question_number(q_col)
-                # Check both string and int keys
-                if str(q_num) in answer_key:
-                    detector_key[q_col] = answer_key[str(q_num)]
-                elif q_num in answer_key:
-                    detector_key[q_col] = answer_key[q_num]
-            
-            # Set index to student IDs for meaningful reporting
-            # We need to extract IDs consistent with the results loop above
-            # or just use the ones we already found?
-            # Creating a fresh ID list from DF to be safe
-            display_ids = []
-            file_col = self._find_file_column(df.columns.tolist())
-            student_cols = self._find_student_columns(df.columns.tolist())
-            
-            for _, row in df.iterrows():
-                file_name = row.get(file_col, "") if file_col else ""
-                s_id = self._extract_student_id(file_name, row, student_cols)
-                s_name = self._extract_student_name(row, student_cols)
-                if s_name:
-                    display_ids.append(f"{s_id} ({s_name})")
-                else:
-                    display_ids.append(s_id)
-            
-            df.index = display_ids
+            detector_key = self._map_detector_key(answer_key, question_cols)
+            df.index = sheet.display_ids
             
             detector = CheatingDetector(df, detector_key, question_cols)
-            analysis_results = detector.analyze()
+            analysis_results = detector.analyze(**REPORT_CRITERIA, workers=self.analysis_workers)
             
             cheating_report = {
                 "session_id": session_id,
+                "total_pairs_checked": detector.pairs_checked,
                 "pairs": analysis_results
             }
             
             cheating_report_path = self.results_folder / session_id / 'cheating_report.json'
             with open(cheating_report_path, 'w', encoding='utf-8') as f:
-                json.dump(cheating_report, f, ensure_ascii=False, indent=2)
+                json.dump(cheating_report, f, ensure_ascii=False, separators=(',', ':'))
                 
         except Exception as e:
             print(f"Cheating analysis failed during scoring: {e}")
@@ -291,17 +279,80 @@ class AnalysisService:
             "total_questions": len(question_cols),
             "question_columns": question_cols,
             "scoring": scoring,
-            "results": [asdict(r) for r in results],
-            "statistics": self._calculate_statistics(results),
+            "results": result_dicts,
+            "statistics": self._calculate_statistics(results, sheet.item_statistics),
             "cheating_report_url": f"/api/results/{session_id}/cheating_report"
         }
 
+    def _score_sheet(
+        self,
+        df,
+        question_cols: List[str],
+        answer_key: Dict[str, str],
+        scoring: Dict[str, float]
+    ) -> "ScoreSheet":
+        """Score every student column-wise: normalize answers once, compare to the key vector"""
+        import numpy as np
+
+        correct_pts = scoring.get("correct_points", 1.0)
+        wrong_pts = scoring.get("wrong_points", 0.0)
+        empty_pts = scoring.get("empty_points", 0.0)
+
+        answers = np.char.upper(np.char.strip(df[question_cols].to_numpy(dtype=str)))
+        key_answers = [
+            str(answer_key.get(str(self._extract_question_number(q_col)), answer_key.get(q_col, ""))).strip().upper()
+            for q_col in question_cols
+        ]
+        compiled = CompiledEvaluation.from_answer_key(
+            question_cols,
+            key_answers,
+            {"correct": correct_pts, "incorrect": wrong_pts, "unmarked": empty_pts},
+            empty_values=("", "*", "-"),
+        )
+        _scores, question_points, codes = compiled.score(answers)
+        verdict_kinds = compiled.verdict_kinds(codes)
+
+        empty = verdict_kinds == CompiledEvaluation.VERDICT_UNMARKED
+        correct = verdict_kinds == CompiledEvaluation.VERDICT_CORRECT
+        wrong = verdict_kinds == CompiledEvaluation.VERDICT_INCORRECT
+
+        correct_counts = correct.sum(axis=1)
+        wrong_counts = wrong.sum(axis=1)
+        empty_counts = empty.sum(axis=1)
+        # Tüm cevaplar büyük harf, boşlar "-"
+        answer_strings = ["".join(row) for row in np.where(empty, "-", answers).tolist()]
+
+        scores = [
+            (correct * correct_pts) + (wrong * wrong_pts) + (empty * empty_pts)
+            for correct, wrong, empty in zip(correct_counts.tolist(), wrong_counts.tolist(), empty_counts.tolist())
+        ]
+        item_statistics = ItemStatistics(question_cols)
+        item_statistics.update_batch(answers, scores, correct, empty)
+
+        identities = self._student_identities(df)
+        return ScoreSheet(
+            question_cols=question_cols,
+            file_names=identities["file_names"],
+            student_ids=identities["student_ids"],
+            student_names=identities["student_names"],
+            tc_kimlik=identities["tc_kimlik"],
+            display_ids=identities["display_ids"],
+            answers=answer_strings,
+            correct_counts=correct_counts,
+            wrong_counts=wrong_counts,
+            empty_counts=empty_counts,
+            scores=scores,
+            question_points=question_points,
+            item_statistics=item_statistics,
+        )
+
     def detect_cheating(
         self,
         session_id: str,
         threshold: float = 1.0,  # Harpp-Hogan için varsayılan 1.0
         min_shared_errors: int = 3,  # En az 3 ortak yanlış
-        answer_key: Dict[int, str] = None
+        answer_key: Dict[int, str] = None,
+        top_k: Optional[int] = None  # En şüpheli K çift (None = hepsi)
     ) -> Dict[str, Any]:
         """Detect potential cheating using Harpp-Hogan Index and Weighted Error Similarity
         
@@ -317,15 +368,14 @@ class AnalysisService:
         """
         import pandas as pd
 
-        # Load session results
-        session_folder = self.results_folder / session_id
-        results_dir = session_folder / "Results"
-
-        csv_files = list(results_dir.glob("Results_*.csv")) if results_dir.exists() else []
-        if not csv_files:
-            raise FileNotFoundError(f"No results found for session {session_id}")
+        csv_path = self._latest_results_csv(session_id)
+        cache_key = self._cache_key(
+            "cheating", session_id, csv_path, answer_key, (threshold, min_shared_errors, top_k)
+        )
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-        csv_path = max(csv_files, key=lambda p: p.stat().st_mtime)
         df = pd.read_csv(csv_path, dtype=str, na_filter=False)
 
         # Find question columns
@@ -334,92 +384,34 @@ class AnalysisService:
             raise ValueError("No question columns found in results")
 
         # Map answer key
-        detector_key = {}
-        if answer_key:
-            for q_col in question_cols:
-                q_num = self._extract_question_number(q_col)
-                if str(q_num) in answer_key:
-                    detector_key[q_col] = answer_key[str(q_num)]
-                elif q_num in answer_key:
-                    detector_key[q_col] = answer_key[q_num]
+        detector_key = self._map_detector_key(answer_key, question_cols)
 
         # Set index to student IDs for meaningful reporting
-        display_ids = []
-        file_col = self._find_file_column(df.columns.tolist())
-        student_cols = self._find_student_columns(df.columns.tolist())
-        
-        for _, row in df.iterrows():
-            file_name = row.get(file_col, "") if file_col else ""
-            s_id = self._extract_student_id(file_name, row, student_cols)
-            s_name = self._extract_student_name(row, student_cols)
-            if s_name:
-                display_ids.append(f"{s_id} ({s_name})")
-            else:
-                display_ids.append(s_id)
-        
-        df.index = display_ids
+        df.index = self._display_ids(df)
 
         # Use the new CheatingDetector
-        try:
-            detector = CheatingDetector(df, detector_key, question_cols)
-            analysis_results = detector.analyze()
-        except NameError:
-             # Fallback if import failed
-             from src.cheating_analysis import CheatingDetector
-             detector = CheatingDetector(df, detector_key, question_cols)
-             analysis_results = detector.analyze()
-
-        # Filter results based on thresholds
-        # Note: New analysis returns metrics like k_index_ab, gbt_z, etc.
-        # We need to adapt the filtering logic to these new metrics OR just return everything
-        # For compatibility with legacy filtering expectations (threshold, min_shared), 
-        # we can map GBT-Z or K-Index to "suspicion". 
-        
-        # However, the user wants the "Advanced" results. 
-        # So we should return the raw analysis_results but perhaps filter the "suspicious_pairs" count using the new metrics.
-        
-        # Filter for "Significant" pairs to report count
-        suspicious_count = 0
-        filtered_results = []
-        
-        for pair in analysis_results:
-            shared_errors = pair.get('w_agreements', 0)
-            
-            # First check: Must have at least min_shared_errors common wrong answers
-            # This is the primary filter - high correct answer agreement is normal for good students
-            if shared_errors < min_shared_errors:
-                continue  # Skip this pair - not enough shared errors
-            
-            is_suspicious = False
-            
-            # Criteria for suspicion in new system:
-            # 1. High Z-Score (GBT) > 3.0 (strong statistical evidence)
-            # 2. Low K-Index (< 0.01) indicating unusual match pattern
-            # Both require min_shared_errors to have already passed above
-            
-            if pair.get('gbt_z', 0) > 3.0:
-                is_suspicious = True
-            elif pair.get('k_index_ab', 1.0) < 0.01 or pair.get('k_index_ba', 1.0) < 0.01:
-                is_suspicious = True
-                
-            if is_suspicious:
-                suspicious_count += 1
-            
-            # Add compatibility fields
-            pair['similarity_ratio'] = pair.get('gbt_z', 0)  # Proxy
-            pair['common_wrong_answers'] = shared_errors
-            pair['student1_id'] = pair.get('student_a')
-            pair['student2_id'] = pair.get('student_b')
-            
-            # Only add if actually suspicious (meets thresholds)
-            if is_suspicious:
-                filtered_results.append(pair)
+        # Criteria for suspicion in new system (on top of min_shared_errors, the
+        # primary filter - high correct answer agreement is normal for good students):
+        # 1. High Z-Score (GBT) > 3.0 (strong statistical evidence)
+        # 2. Low K-Index (< 0.01) indicating unusual match pattern
+        # Pairs are filtered while tiles are scored, so only suspicious ones are built.
+        detector = CheatingDetector(df, detector_key, question_cols)
+        filtered_results = detector.analyze(
+            min_shared_errors=min_shared_errors,
+            min_gbt_z=3.0,
+            max_k_index=0.01,
+            top_k=top_k,
+            workers=self.analysis_workers,
+        )
+
+        self._add_compat_fields(filtered_results)
+        suspicious_count = len(filtered_results)
 
-        return {
+        result = {
             "success": True,
             "session_id": session_id,
             "total_students": len(df),
-            "total_pairs_checked": len(analysis_results),
+            "total_pairs_checked": detector.pairs_checked,
             "suspicious_pairs": suspicious_count,
             "thresholds": {
                 "harpp_hogan": threshold,
@@ -428,6 +420,200 @@ class AnalysisService:
             "has_answer_key": bool(detector_key),
             "results": filtered_results
         }
+        self._cache_put(cache_key, result)
+        return result
+
+    def detect_cheating_across_sessions(
+        self,
+        session_ids: List[str],
+        min_shared_errors: int = 3,
+        answer_key: Dict[int, str] = None,
+        top_k: Optional[int] = None,
+        cross_session_only: bool = False
+    ) -> Dict[str, Any]:
+        """Detect copying across all sessions (rooms/scanners) of one exam.
+
+        All sessions are stacked into one response matrix, so option
+        probabilities are estimated over the whole cohort and pairs from
+        different rooms are compared too. Every reported pair carries the
+        session it came from (session_a/session_b). The merged report is saved
+        under _exam_reports and can be fetched again by its report_id.
+        """
+        import pandas as pd
+
+        session_ids = list(dict.fromkeys(session_ids or []))
+        if len(session_ids) < 1:
+            raise ValueError("At least one session_id is required")
+
+        frames = []
+        groups: List[str] = []
+        sessions_summary = []
+        for session_id in session_ids:
+            df = self._load_session_results(session_id)
+            question_cols = self._find_question_columns(df.columns.tolist())
+            if not question_cols:
+                raise ValueError(f"No question columns found in results of session {session_id}")
+
+            # Same question under a common name in every session (q1, Q1 -> q1)
+            frame = df[question_cols].rename(
+                columns={col: f"q{self._extract_question_number(col)}" for col in question_cols}
+            )
+            frame.index = self._display_ids(df)
+            frames.append(frame)
+            groups.extend([session_id] * len(frame))
+            sessions_summary.append({"session_id": session_id, "total_students": len(frame)})
+
+        combined = pd.concat(frames, sort=False).fillna("")
+        question_cols = self._find_question_columns(combined.columns.tolist())
+        detector_key = self._map_detector_key(answer_key, question_cols)
+
+        detector = CheatingDetector(combined, detector_key, question_cols, groups=groups)
+        flagged = detector.analyze(
+            min_shared_errors=min_shared_errors,
+            min_gbt_z=3.0,
+            max_k_index=0.01,
+            top_k=top_k,
+            workers=self.analysis_workers,
+            cross_group_only=cross_session_only,
+        )
+
+        self._add_compat_fields(flagged)
+        for pair in flagged:
+            pair['session_a'] = pair.pop('group_a')
+            pair['session_b'] = pair.pop('group_b')
+
+        report_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        report = {
+            "success": True,
+            "report_id": report_id,
+            "session_ids": session_ids,
+            "sessions": sessions_summary,
+            "total_students": len(combined),
+            "total_pairs_checked": detector.pairs_checked,
+            "suspicious_pairs": len(flagged),
+            "cross_session_pairs": sum(1 for pair in flagged if pair['session_a'] != pair['session_b']),
+            "thresholds": {
+                "min_shared_errors": min_shared_errors,
+                "cross_session_only": cross_session_only
+            },
+            "has_answer_key": bool(detector_key),
+            "results": flagged
+        }
+
+        self.exam_reports_folder.mkdir(parents=True, exist_ok=True)
+        with open(self.exam_reports_folder / f"{report_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, separators=(',', ':'))
+
+        return report
+
+    def load_exam_report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Load a saved cross-session cheating report"""
+        report_path = self.exam_reports_folder / f"{Path(report_id).name}.json"
+        if not report_path.exists():
+            return None
+        with open(report_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _latest_results_csv(self, session_id: str) -> Path:
+        """Newest Results_*.csv of a session"""
+        results_dir = self.results_folder / session_id / "Results"
+        csv_files = list(results_dir.glob("Results_*.csv")) if results_dir.exists() else []
+        if not csv_files:
+            raise FileNotFoundError(f"No results found for session {session_id}")
+        return max(csv_files, key=lambda p: p.stat().st_mtime)
+
+    def _load_session_results(self, session_id: str):
+        """Load the newest Results_*.csv of a session as strings"""
+        import pandas as pd
+
+        return pd.read_csv(self._latest_results_csv(session_id), dtype=str, na_filter=False)
+
+    # ---- Result cache ----
+
+    _CACHE_MAX_ENTRIES = 64
+
+    @staticmethod
+    def _cache_key(kind: str, session_id: str, csv_path: Path, answer_key: Optional[Dict], params: Any) -> tuple:
+        """(kind, session, results file version, hash of answer key + parameters)"""
+        stat = csv_path.stat()
+        normalized_key = {str(k): v for k, v in (answer_key or {}).items()}
+        digest = hashlib.sha1(
+            json.dumps([normalized_key, params], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return (kind, session_id, csv_path.name, stat.st_mtime_ns, stat.st_size, digest)
+
+    def _cache_get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._cache_lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key: tuple, value: Dict[str, Any]) -> None:
+        with self._cache_lock:
+            # Older versions of this session's results can't be hit again
+            stale = [k for k in self._cache if k[1] == key[1] and k[2:5] != key[2:5]]
+            for k in stale:
+                del self._cache[k]
+            self._cache[key] = value
+            while len(self._cache) > self._CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def invalidate_session(self, session_id: str) -> None:
+        """Drop cached scores/analysis of a session (e.g. after it was reprocessed)"""
+        with self._cache_lock:
+            for key in [k for k in self._cache if k[1] == session_id]:
+                del self._cache[key]
+
+    def _map_detector_key(self, answer_key: Optional[Dict], question_cols: List[str]) -> Dict[str, str]:
+        """Map answer key (e.g. {"1": "A"}) to column names (e.g. "q1") for CheatingDetector"""
+        detector_key = {}
+        if answer_key:
+            for q_col in question_cols:
+                q_num = self._extract_question_number(q_col)
+                # Check both string and int keys
+                if str(q_num) in answer_key:
+                    detector_key[q_col] = answer_key[str(q_num)]
+                elif q_num in answer_key:
+                    detector_key[q_col] = answer_key[q_num]
+        return detector_key
+
+    def _display_ids(self, df) -> List[str]:
+        """Student IDs (with name when known) used to label cheating pairs"""
+        return self._student_identities(df)["display_ids"]
+
+    def _student_identities(self, df) -> Dict[str, List[str]]:
+        """File name, student ID, name, TC Kimlik and display ID of every row, in one pass"""
+        columns = df.columns.tolist()
+        file_col = self._find_file_column(columns)
+        student_cols = self._find_student_columns(columns)
+        tc_col = student_cols.get("tc_kimlik")
+
+        identities = {key: [] for key in ("file_names", "student_ids", "student_names", "tc_kimlik", "display_ids")}
+        for row in df.to_dict("records"):
+            file_name = row.get(file_col, "") if file_col else ""
+            s_id = self._extract_student_id(file_name, row, student_cols)
+            s_name = self._extract_student_name(row, student_cols)
+            tc_kimlik = str(row.get(tc_col, "")).strip() if tc_col else ""
+            if tc_kimlik in ("nan", "None"):
+                tc_kimlik = ""
+
+            identities["file_names"].append(file_name)
+            identities["student_ids"].append(s_id)
+            identities["student_names"].append(s_name)
+            identities["tc_kimlik"].append(tc_kimlik)
+            identities["display_ids"].append(f"{s_id} ({s_name})" if s_name else s_id)
+        return identities
+
+    @staticmethod
+    def _add_compat_fields(pairs: List[Dict[str, Any]]) -> None:
+        """Add the legacy field names the frontend and Excel exports still read"""
+        for pair in pairs:
+            pair['similarity_ratio'] = pair.get('gbt_z', 0)  # Proxy
+            pair['common_wrong_answers'] = pair.get('w_agreements', 0)
+            pair['student1_id'] = pair.get('student_a')
+            pair['student2_id'] = pair.get('student_b')
+
     def _calculate_answer_frequencies(self, students: List[Dict], num_questions: int) -> List[Dict[str, float]]:
         """Calculate how frequently each answer is given for each question"""
         freq = [{} for _ in range(num_questions)]
@@ -638,13 +824,17 @@ class AnalysisService:
         
         return ""
 
-    def _calculate_statistics(self, results: List[StudentResult]) -> Dict[str, Any]:
-        """Calculate statistics for score results"""
+    def _calculate_statistics(
+        self,
+        results: List[StudentResult],
+        item_statistics: Optional["ItemStatistics"] = None
+    ) -> Dict[str, Any]:
+        """Calculate statistics for score results (plus item analysis when given)"""
         if not results:
             return {}
 
         scores = [r.score for r in results]
-        return {
+        statistics = {
             "average_score": sum(scores) / len(scores),
             "max_score": max(scores),
             "min_score": min(scores),
@@ -652,3 +842,8 @@ class AnalysisService:
             "total_wrong": sum(r.wrong_count for r in results),
             "total_empty": sum(r.empty_count for r in results)
         }
+        if item_statistics is not None:
+            snapshot = item_statistics.snapshot()
+            statistics["score_variance"] = snapshot["score_variance"]
+            statistics["items"] = snapshot["items"]
+        return statistics
@@ -8,17 +8,20 @@ import os
 import sys
 import json
 import shutil
+import itertools
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.entry import entry_point, process_dir
-from src.cheating_analysis import CheatingDetector
+from src.cheating_analysis import REPORT_CRITERIA, CheatingDetector
 from src.evaluation import EvaluationConfig
+from src.item_statistics import live_statistics_under, unregister_live_statistics_under
 from src.template import Template
+from src.utils.file import iter_csv_rows
 from src.utils.parsing import open_config_with_defaults
 
 
@@ -34,6 +37,19 @@ class OMRService:
         self.results_folder = Path(results_folder)
         self.samples_folder = Path(__file__).parent.parent.parent / 'samples'
         self.default_template_id = os.environ.get("OMR_WEB_DEFAULT_TEMPLATE", "kapadokya")
+        self.analysis_workers = int(os.environ.get("OMR_ANALYSIS_WORKERS", "0") or 0)
+        self._session_listeners: List[Callable[[str], None]] = []
+
+    def add_session_listener(self, callback: Callable[[str], None]) -> None:
+        """Call `callback(session_id)` whenever a session's results are (re)generated."""
+        self._session_listeners.append(callback)
+
+    def _notify_session_changed(self, session_id: str) -> None:
+        for callback in self._session_listeners:
+            try:
+                callback(session_id)
+            except Exception as e:
+                print(f"Session listener failed for {session_id}: {e}")
         
     def process_session(self, session_id: str, template_id: Optional[str] = None) -> Dict[str, Any]:
         """Process all images in a session folder"""
@@ -64,8 +80,12 @@ class OMRService:
             'setLayout': False,
         }
         
+        # Statistics of an earlier run of this session are replaced by this one's
+        unregister_live_statistics_under(output_folder)
+
         try:
             entry_point(session_folder, args)
+            self._notify_session_changed(session_id)
             
             # Collect results
             results = self._collect_results(session_id, output_folder)
@@ -115,6 +135,20 @@ class OMRService:
         with open(results_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
+    def get_item_statistics(self, session_id: str) -> Dict[str, Any]:
+        """Item statistics maintained while the session's sheets are graded.
+
+        Only available for sessions graded with an evaluation.json in this process;
+        each processed sub-directory is reported separately.
+        """
+        found = live_statistics_under(self.results_folder / session_id)
+        if not found:
+            raise FileNotFoundError(f"No item statistics for session {session_id}")
+        return {
+            directory or '.': item_statistics.snapshot()
+            for directory, item_statistics in found.items()
+        }
+
     def get_csv_path(self, session_id: str) -> Path:
         """Get path to the primary CSV results file (prefers Results/*.csv)."""
         result_folder = self.results_folder / session_id
@@ -150,37 +184,66 @@ class OMRService:
             pass
         return df
 
-    def read_results_dataframe(self, session_id: str, kind: Optional[str] = None):
-        """Read a session CSV into a pandas DataFrame (strings) with internal columns stripped."""
-        import pandas as pd
+    def iter_results_rows(self, session_id: str, kind: Optional[str] = None) -> Tuple[List[str], Iterator[List[str]]]:
+        """Return (header, rows) for a session CSV without loading it into memory.
 
+        Paths are resolved eagerly so a missing session raises FileNotFoundError
+        before any row is produced; the rows themselves are read lazily from disk.
+        Internal columns are stripped. "all"/"combined" concatenates the results,
+        errors and multimarked CSVs over the union of their headers, prepending a
+        "kind" column.
+        """
         kind = (kind or "").strip().lower()
 
         if kind in {"all", "combined"}:
-            result_folder = self.results_folder / session_id
-            csv_map = self._find_csv_files(result_folder)
-            ordered = [("results", csv_map.get("results")), ("errors", csv_map.get("errors")), ("multimarked", csv_map.get("multimarked"))]
-
-            frames = []
-            for csv_kind, path in ordered:
+            csv_map = self._find_csv_files(self.results_folder / session_id)
+            parts = []
+            for csv_kind in ("results", "errors", "multimarked"):
+                path = csv_map.get(csv_kind)
                 if not path:
                     continue
-                df_part = pd.read_csv(path, dtype=str, na_filter=False)
-                if len(df_part) == 0:
+                rows = iter_csv_rows(path)
+                header = next(rows, None)
+                first_row = next(rows, None)
+                if header is None or first_row is None:
                     continue
-                df_part.insert(0, "kind", csv_kind)
-                frames.append(df_part)
+                parts.append((csv_kind, header, itertools.chain([first_row], rows)))
 
-            if not frames:
+            if not parts:
                 raise FileNotFoundError(f"No CSV results found for session {session_id}")
 
-            df = pd.concat(frames, ignore_index=True)
-            return self._strip_internal_columns(df)
+            columns: List[str] = []
+            for _, header, _ in parts:
+                columns.extend(c for c in self._public_columns(header) if c not in columns)
+
+            def combined_rows():
+                for csv_kind, header, rows in parts:
+                    positions = {c: i for i, c in enumerate(header)}
+                    for row in rows:
+                        yield [csv_kind] + [
+                            row[positions[c]] if c in positions and positions[c] < len(row) else ""
+                            for c in columns
+                        ]
+
+            return ["kind"] + columns, combined_rows()
 
         csv_path = self.get_csv_path_by_kind(session_id, kind) if kind else self.get_csv_path(session_id)
-        df = pd.read_csv(csv_path, dtype=str, na_filter=False)
-        return self._strip_internal_columns(df)
-    
+        rows = iter_csv_rows(csv_path)
+        header = next(rows, None) or []
+        public = set(self._public_columns(header))
+        keep = [i for i, c in enumerate(header) if c in public]
+
+        def stripped_rows():
+            for row in rows:
+                yield [row[i] if i < len(row) else "" for i in keep]
+
+        return [header[i] for i in keep], stripped_rows()
+
+    @staticmethod
+    def _public_columns(header: List[str]) -> List[str]:
+        """Columns of a CSV header minus internal ones (see _strip_internal_columns)."""
+        return [c for c in header if c.lower() not in ("input_path", "output_path")]
+
     def list_templates(self) -> List[Dict[str, Any]]:
         """List available templates"""
         templates = []
@@ -712,16 +775,14 @@ class OMRService:
         }
         
         detector = CheatingDetector(df, answer_key, questions)
-        analysis_results = detector.analyze()
-        
-        # Determine "suspicious" pairs (e.g., p-value < 0.05 or Z > 3)
-        # We'll just save everything, and let frontend filter, 
-        # BUT we might want to sort/summarize here
-        
+        # Only pairs the frontend could flag are persisted (it filters them further)
+        analysis_results = detector.analyze(**REPORT_CRITERIA, workers=self.analysis_workers)
+
         report = {
             "session_id": session_id,
+            "total_pairs_checked": detector.pairs_checked,
             "pairs": analysis_results
         }
-        
+
         with open(output_folder / 'cheating_report.json', 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+            json.dump(report, f, ensure_ascii=False, separators=(',', ':'))